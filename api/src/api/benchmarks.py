@@ -0,0 +1,118 @@
+"""
+Throughput benchmarks against the configured Couchbase cluster.
+
+Run from the api directory with the usual COUCHBASE_* environment variables set:
+
+    python -m api.benchmarks shift-writes --days 10
+
+The solver benchmark runs in-process and needs no cluster:
+
+    python -m api.benchmarks solver-scaling --employees 500 --days 28 --max-workers 16
+"""
+import argparse
+from datetime import date, timedelta
+import random
+import time
+
+from .clients.scheduling import SchedulingClient, daily_shift_docs
+from .planning.parallel import MAX_WORKERS, shutdown_pool, solve_multi_start, warm_pool
+from .utils import log
+from . import conf
+
+logger = log.get_logger(__name__)
+
+BENCH_EMPLOYEES = [f"BENCH{i:03d}" for i in range(5)]
+
+
+def _connect() -> SchedulingClient:
+    cb_conf = conf.get_couchbase_conf()
+    db = SchedulingClient(
+        url=cb_conf.url,
+        username=cb_conf.username,
+        password=cb_conf.password,
+        bucket_name=cb_conf.bucket,
+        scope=cb_conf.scope
+    )
+    db.connect()
+    return db
+
+
+def _report(label: str, count: int, seconds: float) -> None:
+    print(f"{label:<12} {count:>7} shifts in {seconds:8.3f} s  ({count / seconds:10.1f} shifts/s)")
+
+
+def bench_shift_writes(days: int) -> None:
+    """Compare one-by-one shift upserts with the batched bulk path for the same docs."""
+    db = _connect()
+    first_day = date(2099, 1, 1)
+    docs = [doc for i in range(days) for doc in daily_shift_docs(first_day + timedelta(days=i), BENCH_EMPLOYEES)]
+
+    try:
+        started = time.perf_counter()
+        for doc in docs:
+            db.shifts.upsert(doc["shift_id"], doc)
+        _report("sequential", len(docs), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        result = db.create_shifts(docs)
+        _report("bulk", len(docs), time.perf_counter() - started)
+        if result.failed:
+            print(f"{len(result.failed)} bulk writes failed, first error: {result.failed[0].error}")
+    finally:
+        db.shifts.remove_multi([doc["shift_id"] for doc in docs])
+        db.close()
+
+
+def bench_solver_scaling(employees: int, days: int, budget: float, max_workers: int) -> None:
+    """Solve the same synthetic horizon with 1, 2, 4 ... max_workers parallel restarts."""
+    rng = random.Random(0)
+    certifications = ["chemical_handling", "fire_safety", "forklift", "packaging_systems", "first_aid", "cpr"]
+    first_day = date(2099, 1, 5)
+    horizon = [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
+    roster = [
+        {
+            "employee_number": f"BENCH{i:04d}",
+            "certifications": rng.sample(certifications, 2),
+            "known_absences": [day for day in horizon if rng.random() < 0.05],
+        }
+        for i in range(employees)
+    ]
+
+    # Start the worker processes up front so their startup isn't timed
+    warm_pool()
+    counts = sorted({1, *(2 ** i for i in range(1, max_workers.bit_length())), max_workers})
+    try:
+        for workers in counts:
+            started = time.perf_counter()
+            solution = solve_multi_start(roster, horizon, time_budget=budget, seed=1, workers=workers)
+            seconds = time.perf_counter() - started
+            print(f"{workers:>3} workers  cost {solution.cost:12.4f}  {len(solution.unfilled_keys()):>4} unfilled  "
+                  f"{seconds:7.3f} s  ({workers / seconds:6.2f} restarts/s)")
+    finally:
+        shutdown_pool()
+
+
+def main():
+    log.init(conf.get_log_level())
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    shift_writes = subparsers.add_parser("shift-writes", help="Shift write throughput, sequential vs bulk")
+    shift_writes.add_argument("--days", type=int, default=10, help="Number of days of shifts to write")
+
+    solver_scaling = subparsers.add_parser("solver-scaling", help="Multi-start solver quality and throughput by worker count")
+    solver_scaling.add_argument("--employees", type=int, default=500, help="Number of synthetic employees")
+    solver_scaling.add_argument("--days", type=int, default=28, help="Number of days to staff")
+    solver_scaling.add_argument("--budget", type=float, default=1.0, help="Seconds each restart may search")
+    solver_scaling.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="Largest number of parallel restarts")
+
+    args = parser.parse_args()
+    if args.benchmark == "shift-writes":
+        bench_shift_writes(args.days)
+    elif args.benchmark == "solver-scaling":
+        bench_solver_scaling(args.employees, args.days, args.budget, args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,526 @@
 from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+from enum import Enum
+import base64
+import copy
+import json
+import threading
 import time
 from couchbase.cluster import Cluster
-from couchbase.options import ClusterOptions, QueryOptions
+from couchbase.options import ClusterOptions, InsertOptions, MutateInOptions, QueryOptions, RemoveOptions
 from couchbase.auth import PasswordAuthenticator
-from couchbase.exceptions import DocumentNotFoundException
+from couchbase.exceptions import (
+    CasMismatchException, DocumentExistsException, DocumentNotFoundException,
+    RequestCanceledException, ServiceUnavailableException, TimeoutException
+)
+import couchbase.subdocument as SD
 import uuid
 
-from ..models import EmployeeInput
+from ..models import BulkItemResult, BulkWriteResult
 from ..utils import log
+from ..utils.cache import DocumentCache
+from ..utils.metrics import QueryMetrics
 
 logger = log.get_logger(__name__)
 
+class ConcurrentUpdateError(Exception):
+    """Raised when a document changed since the CAS the caller expected."""
+    pass
+
+
+class ClientState(str, Enum):
+    UNINITIALIZED = "uninitialized"
+    CONNECTING = "connecting"  # One thread is connecting, the others wait for it
+    READY = "ready"
+    DEGRADED = "degraded"  # The last attempt failed, calls fail fast until the retry interval passed
+
+
+class ShiftConflictError(Exception):
+    """Raised when a shift would overlap another shift of the same employee."""
+    pass
+
+
+class ServiceUnavailableError(Exception):
+    """Raised instead of waiting when the database isn't ready to serve requests."""
+    pass
+
+
+DEFAULT_RULES = {
+    "max_days_per_week": 3,
+    "preferred_balance": 0.2
+}
+
+# SDK errors meaning the cluster can't be reached, which put a ready client back in DEGRADED
+CONNECTION_ERRORS = (RequestCanceledException, ServiceUnavailableException, TimeoutException)
+
+# Origin of the epoch-minute shift times, see shift_minutes
+EPOCH = datetime(1970, 1, 1)
+
+# Longest a shift may last; window queries bound the indexed start by this much before the window
+MAX_SHIFT_LENGTH = timedelta(days=1)
+
+# Document in the rules collection recording the last demo data seeding
+SEED_STATE_KEY = "seed_state"
+
+# Number of documents sent per multi-upsert call
+BULK_BATCH_SIZE = 500
+
+# Working hours covered by the daily shift pattern (start hours)
+DAILY_SHIFT_HOURS = range(8, 16)
+
+
+# Roles that can be staffed in a shift, and how many employees each can have per hour
+SHIFT_ROLES = ["cleaning", "line1", "line2", "packing", "inventory"]
+MAX_ROLE_SLOTS = 2
+
+# Certifications qualifying an employee for a role, any one of them will do; roles
+# that aren't listed can be staffed by anyone
+ROLE_CERTIFICATIONS = {
+    "cleaning": ["chemical_handling", "fire_safety"],
+    "packing": ["packaging_systems"],
+    "inventory": ["forklift"],
+}
+
+
+def eligible_roles(certifications: List[str]) -> List[str]:
+    """Get the roles an employee with the given certifications can be scheduled for."""
+    return [
+        role for role in SHIFT_ROLES
+        if role not in ROLE_CERTIFICATIONS or set(ROLE_CERTIFICATIONS[role]) & set(certifications)
+    ]
+
+
+def shift_key(date: str, hour: int, role: str, slot: int) -> str:
+    """
+    Build the deterministic key of a shift slot.
+
+    Args:
+        date: The date in ISO format (YYYY-MM-DD)
+        hour: The start hour
+        role: The shift type (cleaning, line1 etc.)
+        slot: Index among the shifts with the same role in that hour
+    """
+    return f"shift::{date}::{hour:02d}::{role}::{slot}"
+
+
+def parse_shift_key(key: str) -> Optional[tuple[str, int, str, int]]:
+    """Parse a key from shift_key into (date, hour, role, slot), or None for other (legacy uuid) keys."""
+    parts = key.split("::")
+    if len(parts) != 5 or parts[0] != "shift":
+        return None
+    return parts[1], int(parts[2]), parts[3], int(parts[4])
+
+
+def parse_shift_time(value: str) -> tuple[str, int]:
+    """
+    Split a shift time ("YYYY-MM-DD HH-MM") into its date and hour.
+
+    Raises:
+        ValueError: If the time isn't in that format
+    """
+    try:
+        date, time_of_day = value.split(" ")
+        hour, _minute = time_of_day.split("-")
+        return date, int(hour)
+    except ValueError:
+        raise ValueError(f"Invalid shift time {value!r}, expected 'YYYY-MM-DD HH-MM'")
+
+
+def shift_minutes(value: str) -> int:
+    """
+    Convert a shift time ("YYYY-MM-DD HH-MM") to minutes since the Unix epoch.
+
+    Raises:
+        ValueError: If the time isn't in that format
+    """
+    try:
+        moment = datetime.strptime(value, "%Y-%m-%d %H-%M")
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid shift time {value!r}, expected 'YYYY-MM-DD HH-MM'")
+    return int((moment - EPOCH).total_seconds()) // 60
+
+
+def minutes_to_shift_time(minutes: int) -> str:
+    """Convert minutes since the Unix epoch back to a shift time ("YYYY-MM-DD HH-MM")."""
+    return (EPOCH + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H-%M")
+
+
+def shift_interval_fields(start: str, end: str) -> Dict[str, int]:
+    """
+    Get the epoch-minute fields stored alongside a shift's display times.
+
+    Raises:
+        ValueError: If a time is invalid, the shift doesn't end after it starts or lasts longer than MAX_SHIFT_LENGTH
+    """
+    start_minute, end_minute = shift_minutes(start), shift_minutes(end)
+    if end_minute <= start_minute:
+        raise ValueError(f"Shift must end after it starts, got {start} to {end}")
+    if end_minute - start_minute > MAX_SHIFT_LENGTH.total_seconds() // 60:
+        raise ValueError(f"Shift can't last longer than {MAX_SHIFT_LENGTH // timedelta(hours=1)} hours, got {start} to {end}")
+    return {"start_minute": start_minute, "end_minute": end_minute}
+
+
+def with_interval_fields(updates: Dict[str, Any], current: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Add the epoch-minute fields of a shift update, derived from the resulting display times.
+
+    Args:
+        updates: The fields to update, minute fields given in them are ignored
+        current: The stored shift, needed when the update changes only one of start and end
+
+    Raises:
+        ValueError: If a time is invalid or the shift wouldn't end after it starts
+    """
+    updates = {field: value for field, value in updates.items() if field not in ("start_minute", "end_minute")}
+    if "start" not in updates and "end" not in updates:
+        return updates
+    shift = {**(current or {}), **updates}
+    return {**updates, **shift_interval_fields(shift["start"], shift["end"])}
+
+
+def day_shift_keys(date: str) -> List[str]:
+    """Get the keys of every shift slot of a day, ordered by hour."""
+    return [
+        shift_key(date, hour, role, slot)
+        for hour in DAILY_SHIFT_HOURS
+        for role in SHIFT_ROLES
+        for slot in range(MAX_ROLE_SLOTS)
+    ]
+
+
+def shift_slot_keys(start: str, type: str) -> List[str]:
+    """
+    Get the candidate keys for a new shift, in the order slots are filled.
+
+    Raises:
+        ValueError: If the shift doesn't fit the day's slot grid
+    """
+    date, hour = parse_shift_time(start)
+    if type not in SHIFT_ROLES:
+        raise ValueError(f"Unknown shift type {type!r}, expected one of {', '.join(SHIFT_ROLES)}")
+    if hour not in DAILY_SHIFT_HOURS:
+        raise ValueError(f"Shifts must start between {DAILY_SHIFT_HOURS[0]:02d}-00 and {DAILY_SHIFT_HOURS[-1]:02d}-00")
+    return [shift_key(date, hour, type, slot) for slot in range(MAX_ROLE_SLOTS)]
+
+
+def check_shift_slot(shift_id: str, updates: Dict[str, Any]) -> None:
+    """
+    Check that updates don't move a shift out of the slot its key names.
+
+    Raises:
+        ValueError: If the start date/hour or type no longer match the key
+    """
+    parsed = parse_shift_key(shift_id)
+    if not parsed:
+        return
+    date, hour, role, _slot = parsed
+    if "start" in updates and parse_shift_time(updates["start"]) != (date, hour):
+        raise ValueError("A shift's start date and hour can't change, delete it and create a new one")
+    if "type" in updates and updates["type"] != role:
+        raise ValueError("A shift's type can't change, delete it and create a new one")
+
+
+def new_shift_doc(employee_number: str, start: str, end: str, type: str, shift_id: str = None) -> Dict[str, Any]:
+    """
+    Build a new shift document, with a fresh uuid unless a key is given.
+
+    Raises:
+        ValueError: If the times are invalid, see shift_interval_fields
+    """
+    return {
+        "shift_id": shift_id or str(uuid.uuid1()),
+        "employee_number": employee_number,
+        "start": start,
+        "end": end,
+        **shift_interval_fields(start, end),
+        "type": type,
+        "score": -1
+    }
+
+
+def daily_shift_roles(hour: int) -> List[str]:
+    """
+    Get the roles staffed during an hour of the daily shift pattern, one per employee slot.
+
+    - 2 employees on line1, 2 on line2 and 1 on packing
+    - First hour (08:00): cleaning instead of line1
+    - Two hours after lunch (13:00): inventory instead of line2
+    """
+    if hour == 8:
+        return ["cleaning", "line1", "line2", "line2", "packing"]
+    if hour == 13:
+        return ["inventory", "line1", "line1", "line2", "packing"]
+    return ["line1", "line1", "line2", "line2", "packing"]
+
+
+# Number of employees working each hour of the daily shift pattern
+DAILY_POSITIONS = len(daily_shift_roles(DAILY_SHIFT_HOURS[0]))
+
+
+def daily_position_keys(date: str, position: int) -> List[str]:
+    """Get the shift keys of one position of the daily shift pattern, one per hour."""
+    keys = []
+    for hour in DAILY_SHIFT_HOURS:
+        roles = daily_shift_roles(hour)
+        keys.append(shift_key(date, hour, roles[position], roles[:position].count(roles[position])))
+    return keys
+
+
+def daily_shift_docs(date: str, employee_numbers: List[Optional[str]]) -> List[Dict[str, Any]]:
+    """
+    Build the shift documents for a day of the daily shift pattern.
+
+    Shifts get deterministic slot keys, so storing the same day again replaces
+    its shifts instead of duplicating them.
+
+    Args:
+        date: The date in ISO format (YYYY-MM-DD)
+        employee_numbers: Employee numbers to assign, one per position; None leaves
+            a position unstaffed
+
+    Returns:
+        The shift documents, not yet stored
+    """
+    if len(employee_numbers) < DAILY_POSITIONS:
+        raise ValueError(f"Need at least {DAILY_POSITIONS} employee numbers to create shifts")
+
+    docs = []
+    for hour in DAILY_SHIFT_HOURS:
+        start_time = f"{date} {hour:02d}-00"
+        end_time = f"{date} {hour+1:02d}-00"
+        roles = daily_shift_roles(hour)
+        for position, role in enumerate(roles):
+            if employee_numbers[position] is None:
+                continue
+            key = shift_key(date, hour, role, roles[:position].count(role))
+            docs.append(new_shift_doc(employee_numbers[position], start_time, end_time, role, key))
+    return docs
+
+
+def query_index_statements(client) -> List[str]:
+    """
+    Get the CREATE INDEX statements for the secondary indexes the client's queries rely on.
+
+    Args:
+        client: A scheduling client, used for the bucket, scope and collection names
+    """
+    keyspace = f"`{client.bucket_name}`.`{client.scope_name}`"
+    return [
+        f"CREATE INDEX idx_shifts_window IF NOT EXISTS ON {keyspace}.`{client.shifts_coll}`(`start`, `end`)",
+        f"CREATE INDEX idx_shifts_employee IF NOT EXISTS ON {keyspace}.`{client.shifts_coll}`(employee_number, `start`, `end`)",
+        f"CREATE INDEX idx_schedules_date IF NOT EXISTS ON {keyspace}.`{client.schedules_coll}`(date)",
+        # Covers both the employee listing and the roster query
+        f"CREATE INDEX idx_employees_roster IF NOT EXISTS ON {keyspace}.`{client.employees_coll}`"
+        f"(employee_number, name, first_line_support_count, known_absences)",
+        # Covers the planning roster query
+        f"CREATE INDEX idx_employees_planning IF NOT EXISTS ON {keyspace}.`{client.employees_coll}`"
+        f"(employee_number, certifications, known_absences)",
+    ]
+
+
+def shift_window_bound(start: str) -> Optional[str]:
+    """
+    Get the earliest start ("YYYY-MM-DD HH-MM") of a shift that can still end after
+    `start`, or None if `start` isn't a shift time or date.
+    """
+    for length, time_format in ((16, "%Y-%m-%d %H-%M"), (10, "%Y-%m-%d")):
+        try:
+            moment = datetime.strptime(start[:length], time_format)
+        except ValueError:
+            continue
+        return (moment - MAX_SHIFT_LENGTH).strftime("%Y-%m-%d %H-%M")
+    return None
+
+
+def shift_filter_clause(
+    start: str = None,
+    end: str = None,
+    employee_number: str = None,
+    type: str = None
+) -> tuple[str, Dict[str, Any]]:
+    """
+    Build the WHERE clause and named parameters for filtering shifts (aliased `s`).
+
+    Shifts overlapping the [start, end) window match. Bounds use the shift time format
+    ("YYYY-MM-DD HH-MM"); a bare date is the start of that day.
+
+    Since no shift lasts longer than MAX_SHIFT_LENGTH, a shift ending after `start`
+    starts at most that long before it; that bound on the leading `start` key keeps
+    window scans of idx_shifts_window from walking all earlier history.
+    """
+    conditions = []
+    named_params = {}
+
+    if start:
+        conditions.append("s.`end` > $start")
+        named_params["start"] = start
+        start_bound = shift_window_bound(start)
+        if start_bound:
+            conditions.append("s.`start` >= $start_bound")
+            named_params["start_bound"] = start_bound
+    if end:
+        conditions.append("s.`start` < $end")
+        named_params["end"] = end
+    if employee_number:
+        conditions.append("s.employee_number = $employee_number")
+        named_params["employee_number"] = employee_number
+    if type:
+        conditions.append("s.`type` = $type")
+        named_params["type"] = type
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where_clause, named_params
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of the last row on a page as an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a pagination cursor back into its sort key values.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def _limit_clause(limit: Optional[int], named_params: Dict[str, Any]) -> str:
+    if not limit:
+        return ""
+    named_params["limit"] = limit
+    return "LIMIT $limit"
+
+
+def employees_query(client, limit: int = None, after: str = None) -> tuple[str, Dict[str, Any]]:
+    """Build the employee listing query, keyset-paginated on employee_number."""
+    named_params = {}
+    where_clause = "WHERE e.employee_number IS NOT MISSING"
+    if after:
+        (named_params["after_number"],) = decode_cursor(after, 1)
+        where_clause += " AND e.employee_number > $after_number"
+
+    query = f"""
+    SELECT e.name, e.employee_number
+    FROM {client.bucket_name}.{client.scope_name}.{client.employees_coll} e
+    {where_clause}
+    ORDER BY e.employee_number ASC
+    {_limit_clause(limit, named_params)}
+    """
+    return query, named_params
+
+
+def roster_query(client) -> tuple[str, Dict[str, Any]]:
+    """
+    Build the roster query, answered from idx_employees_roster alone (covering index).
+
+    Only indexed fields may be referenced here, otherwise the query has to fetch
+    every employee document.
+    """
+    query = f"""
+    SELECT e.employee_number, e.name,
+           IFMISSINGORNULL(e.first_line_support_count, 0) AS first_line_support_count,
+           IFMISSINGORNULL(e.known_absences, []) AS known_absences
+    FROM {client.bucket_name}.{client.scope_name}.{client.employees_coll} e
+    WHERE e.employee_number IS NOT MISSING
+    ORDER BY e.employee_number ASC
+    """
+    return query, {}
+
+
+def planning_roster_query(client) -> tuple[str, Dict[str, Any]]:
+    """Build the query for the fields the shift solver needs, answered from idx_employees_planning alone."""
+    query = f"""
+    SELECT e.employee_number,
+           IFMISSINGORNULL(e.certifications, []) AS certifications,
+           IFMISSINGORNULL(e.known_absences, []) AS known_absences
+    FROM {client.bucket_name}.{client.scope_name}.{client.employees_coll} e
+    WHERE e.employee_number IS NOT MISSING
+    ORDER BY e.employee_number ASC
+    """
+    return query, {}
+
+
+def employee_cursor(row: Dict[str, Any]) -> str:
+    return encode_cursor(row["employee_number"])
+
+
+def schedules_query(
+    client,
+    start_date: str = None,
+    end_date: str = None,
+    limit: int = None,
+    after: str = None
+) -> tuple[str, Dict[str, Any]]:
+    """Build the schedule listing query, keyset-paginated on date."""
+    conditions = []
+    named_params = {}
+
+    if start_date:
+        conditions.append("s.date >= $start_date")
+        named_params["start_date"] = start_date
+    if end_date:
+        conditions.append("s.date <= $end_date")
+        named_params["end_date"] = end_date
+    if after:
+        (named_params["after_date"],) = decode_cursor(after, 1)
+        conditions.append("s.date > $after_date")
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    query = f"""
+    SELECT s.*
+    FROM {client.bucket_name}.{client.scope_name}.{client.schedules_coll} s
+    {where_clause}
+    ORDER BY s.date ASC
+    {_limit_clause(limit, named_params)}
+    """
+    return query, named_params
+
+
+def schedule_cursor(row: Dict[str, Any]) -> str:
+    return encode_cursor(row["date"])
+
+
+def shifts_query(
+    client,
+    start: str = None,
+    end: str = None,
+    employee_number: str = None,
+    type: str = None,
+    limit: int = None,
+    after: str = None,
+    with_cas: bool = False
+) -> tuple[str, Dict[str, Any]]:
+    """Build the shift listing query, keyset-paginated on (start, shift_id); with_cas adds each shift's CAS as `cas`."""
+    where_clause, named_params = shift_filter_clause(start, end, employee_number, type)
+    if after:
+        named_params["after_start"], named_params["after_id"] = decode_cursor(after, 2)
+        keyset = "(s.`start` > $after_start OR (s.`start` = $after_start AND s.shift_id > $after_id))"
+        where_clause = f"{where_clause} AND {keyset}" if where_clause else f"WHERE {keyset}"
+
+    query = f"""
+    SELECT s.*{", META(s).cas AS cas" if with_cas else ""}
+    FROM {client.bucket_name}.{client.scope_name}.{client.shifts_coll} s
+    {where_clause}
+    ORDER BY s.`start` ASC, s.shift_id ASC
+    {_limit_clause(limit, named_params)}
+    """
+    return query, named_params
+
+
+def shift_cursor(row: Dict[str, Any]) -> str:
+    return encode_cursor(row["start"], row["shift_id"])
+
+
 class SchedulingClient:
     def __init__(
         self,
@@ -22,7 +532,10 @@ class SchedulingClient:
         employees_coll: str = "employees",
         schedules_coll: str = "schedules",
         shifts_coll: str = "shifts",
-        rules_coll: str = "rules"
+        rules_coll: str = "rules",
+        cache_size: int = 1024,
+        cache_ttl: float = 5.0,
+        reconnect_interval: float = 30.0
     ):
         self.url = url
         self.username = username
@@ -41,30 +554,128 @@ class SchedulingClient:
         self.shifts = None
         self.rules = None
         self._is_query_service_ready = False
+        # Initialization state machine, see _ensure_ready
+        self.reconnect_interval = reconnect_interval
+        self._state = ClientState.UNINITIALIZED
+        self._state_changed = threading.Condition()
+        self._retry_at = 0.0
+        self._initialized = False
+        # Read-through cache of employee and rules documents, keyed by (collection, key)
+        self._doc_cache = DocumentCache(max_size=cache_size, ttl=cache_ttl)
+        self._query_metrics = QueryMetrics()
 
     def connect(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
         """
-        Establish connection to Couchbase database.
+        Establish connection to Couchbase database and initialize the collections,
+        waiting for the database if it isn't up yet, e.g. at startup.
+
+        Each attempt is one single-flight connection attempt, see _ensure_ready; other
+        callers keep failing fast between the attempts.
 
         Args:
-            max_retries: Maximum number of retry attempts.
-            initial_delay: Initial delay between retries in seconds.
-            max_delay: Maximum delay between retries in seconds.
-        """
-        auth = PasswordAuthenticator(self.username, self.password)
-        options = ClusterOptions(auth)
+            max_retries: Maximum number of attempts.
+            initial_delay: Initial delay between attempts in seconds.
+            max_delay: Maximum delay between attempts in seconds.
 
-        self.cluster = Cluster(self.url, options)
+        Raises:
+            ServiceUnavailableError: If the database couldn't be reached
+        """
         delay = initial_delay
-        connected = False
+        for attempt in range(1, max_retries + 1):
+            try:
+                self._ensure_ready(force=True)
+                return
+            except ServiceUnavailableError:
+                if attempt == max_retries:
+                    logger.error(f"Failed to connect after {max_retries} attempts")
+                    raise
+                logger.info(f"Retrying in {delay:.1f} seconds...")
+                time.sleep(delay)
+                # Exponential backoff with a cap
+                delay = min(max_delay, delay * 1.5)
+
+    @property
+    def state(self) -> ClientState:
+        return self._state
+
+    def _ensure_ready(self, force: bool = False) -> None:
+        """
+        Make sure the client is connected and initialized, shared by all methods.
+
+        Single-flight: the first caller that finds the client uninitialized (or degraded
+        past its retry interval) makes one connection attempt, while concurrent callers
+        wait for its outcome rather than starting their own. A failed attempt leaves the
+        client DEGRADED, and callers fail fast until the retry interval has passed.
+
+        Args:
+            force: Attempt to connect even if the retry interval hasn't passed yet
+
+        Raises:
+            ServiceUnavailableError: If the database isn't available
+        """
+        if self._state is ClientState.READY:
+            return
+
+        with self._state_changed:
+            while self._state is ClientState.CONNECTING:
+                self._state_changed.wait()
+
+            if self._state is ClientState.READY:
+                return
+            if self._state is ClientState.DEGRADED and not force and time.monotonic() < self._retry_at:
+                raise ServiceUnavailableError("Database is unavailable, waiting before reconnecting")
 
+            self._state = ClientState.CONNECTING
+
+        try:
+            if not self.scope and not self._open(max_retries=1):
+                raise Exception("Failed to connect to cluster")
+            if not self._initialized:
+                self.init(max_retries=1)
+            # Also the probe of a reconnect, see _record_failure
+            self.await_up(max_retries=1)
+        except Exception as e:
+            with self._state_changed:
+                self._state = ClientState.DEGRADED
+                self._retry_at = time.monotonic() + self.reconnect_interval
+                self._state_changed.notify_all()
+            logger.error(f"Couchbase unavailable, retrying in {self.reconnect_interval:.0f} seconds at the earliest: {str(e)}")
+            raise ServiceUnavailableError("Database is unavailable") from e
+
+        with self._state_changed:
+            self._state = ClientState.READY
+            self._state_changed.notify_all()
+
+    def _record_failure(self, error: Exception) -> None:
+        """
+        Take a ready client back to DEGRADED after an error meaning the cluster can't be
+        reached, so the next call probes the connection again instead of every call
+        running into timeouts.
+        """
+        if not isinstance(error, CONNECTION_ERRORS):
+            return
+        with self._state_changed:
+            if self._state is not ClientState.READY:
+                return
+            self._state = ClientState.DEGRADED
+            self._retry_at = time.monotonic()
+            self._is_query_service_ready = False
+        logger.warning(f"Lost the Couchbase connection, reconnecting on the next call: {str(error)}")
+
+    def _open(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> bool:
+        """Open the cluster and wait for the bucket, returning whether it succeeded."""
+        if not self.cluster:
+            auth = PasswordAuthenticator(self.username, self.password)
+            options = ClusterOptions(auth)
+            self.cluster = Cluster(self.url, options)
+
+        delay = initial_delay
         for attempt in range(1, max_retries + 1):
             try:
                 self.bucket = self.cluster.bucket(self.bucket_name)
                 self.scope = self.bucket.scope(self.scope_name)
-                connected = True
                 logger.info(f"Connected to Couchbase database with bucket and scope on attempt {attempt}")
-                break
+                return True
             except Exception as bucket_err:
                 logger.warning(f"Bucket or scope not ready yet (attempt {attempt}/{max_retries}): {str(bucket_err)}")
                 if attempt < max_retries:
@@ -75,51 +686,23 @@ class SchedulingClient:
                 else:
                     logger.error(f"Failed to connect after {max_retries} attempts")
 
-        if connected:
-            try:
-                self.init()
-            except Exception as col_err:
-                logger.warning(f"Collections not ready yet: {str(col_err)}")
+        return False
 
     def init(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
         """
         Create the collections if they don't exist.
 
+        Runs as part of _ensure_ready, which makes sure only one thread does this at a time.
+
         Args:
             max_retries: Maximum number of retry attempts.
             initial_delay: Initial delay between retries in seconds.
             max_delay: Maximum delay between retries in seconds.
         """
-        # Add retry mechanism around cluster connection
-        connection_delay = initial_delay
-        connection_attempts = 0
-
-        while not self.cluster and connection_attempts < max_retries:
-            try:
-                self.connect()
-                logger.info("Successfully connected to cluster")
-            except Exception as e:
-                connection_attempts += 1
-                logger.warning(f"Failed to connect to cluster (attempt {connection_attempts}/{max_retries}): {str(e)}")
-                if connection_attempts < max_retries:
-                    logger.info(f"Retrying connection in {connection_delay:.1f} seconds...")
-                    time.sleep(connection_delay)
-                    # Exponential backoff with a cap
-                    connection_delay = min(max_delay, connection_delay * 1.5)
-                else:
-                    logger.error(f"Failed to connect to cluster after {max_retries} attempts")
-                    raise
-
         delay = initial_delay
 
         for attempt in range(1, max_retries + 1):
             try:
-                # Ensure we have bucket and scope
-                if not self.bucket:
-                    self.bucket = self.cluster.bucket(self.bucket_name)
-                if not self.scope:
-                    self.scope = self.bucket.scope(self.scope_name)
-
                 collection_manager = self.bucket.collections()
 
                 # Create collections if they don't exist
@@ -142,6 +725,9 @@ class SchedulingClient:
                 # Initialize default rules if not exists
                 self._init_default_rules()
 
+                self._ensure_indexes()
+
+                self._initialized = True
                 logger.info(f"Collections initialized successfully on attempt {attempt}")
                 break
 
@@ -162,21 +748,176 @@ class SchedulingClient:
             rules_key = "system_rules"
             existing_rules = self.rules.get(rules_key)
             if not existing_rules.value:
-                default_rules = {
-                    "max_days_per_week": 3,
-                    "preferred_balance": 0.2
-                }
-                self.rules.upsert(rules_key, default_rules)
+                self.rules.upsert(rules_key, dict(DEFAULT_RULES))
+                self._doc_cache.invalidate((self.rules_coll, rules_key))
                 logger.info("Initialized default scheduling rules")
         except Exception:
             # Rules don't exist, create them
-            default_rules = {
-                "max_days_per_week": 3,
-                "preferred_balance": 0.2
-            }
-            self.rules.upsert("system_rules", default_rules)
+            self.rules.upsert("system_rules", dict(DEFAULT_RULES))
+            self._doc_cache.invalidate((self.rules_coll, "system_rules"))
             logger.info("Initialized default scheduling rules")
 
+    def _cached_read(self, collection, coll_name: str, key: str, probe_path: str) -> Optional[tuple[Dict[str, Any], int]]:
+        """
+        Get a document's content through the document cache.
+
+        Fresh entries are served without a round trip. Stale entries are revalidated
+        with a sub-document lookup that only returns the CAS, and re-read in full only
+        if the document changed since it was cached.
+
+        Args:
+            collection: The collection to read from
+            coll_name: The collection name, part of the cache key
+            key: The document key
+            probe_path: A path present in the document, used for the CAS lookup
+
+        Returns:
+            A copy of the document content and its CAS, or None if it doesn't exist
+        """
+        cache_key = (coll_name, key)
+        entry = self._doc_cache.get(cache_key)
+
+        try:
+            if entry and not entry.is_fresh:
+                if collection.lookup_in(key, [SD.exists(probe_path)]).cas == entry.cas:
+                    self._doc_cache.refresh(cache_key)
+                else:
+                    entry = None
+
+            if not entry:
+                result = collection.get(key)
+                if not result or not hasattr(result, 'value') or not result.value:
+                    return None
+                self._doc_cache.put(cache_key, result.value, result.cas)
+                return copy.deepcopy(result.value), result.cas
+        except DocumentNotFoundException:
+            self._doc_cache.invalidate(cache_key)
+            return None
+        except Exception as e:
+            self._record_failure(e)
+            raise
+
+        return copy.deepcopy(entry.value), entry.cas
+
+    def _cached_get(self, collection, coll_name: str, key: str, probe_path: str) -> Optional[Dict[str, Any]]:
+        """Get a document's content through the document cache, see _cached_read."""
+        found = self._cached_read(collection, coll_name, key, probe_path)
+        return found[0] if found else None
+
+    @staticmethod
+    def _mutate_fields(collection, key: str, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Write top-level fields of a document with a single sub-document mutation.
+
+        Args:
+            collection: The collection holding the document
+            key: The document key
+            updates: The field values to write
+            cas: Optional CAS the document must still have
+
+        Returns:
+            The document's new CAS, or None if it doesn't exist
+
+        Raises:
+            ConcurrentUpdateError: If the document's CAS no longer matches `cas`
+        """
+        if not updates:
+            raise ValueError("No fields to update")
+
+        specs = [SD.upsert(field, value) for field, value in updates.items()]
+        options = MutateInOptions(cas=cas) if cas else MutateInOptions()
+        try:
+            result = collection.mutate_in(key, specs, options)
+            return result.cas
+        except DocumentNotFoundException:
+            return None
+        except CasMismatchException:
+            raise ConcurrentUpdateError(f"Document {key} was modified concurrently")
+
+    def _invalidate_employee(self, employee_number: str) -> None:
+        self._doc_cache.invalidate((self.employees_coll, employee_number))
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Get the document cache's size and hit/miss counters."""
+        return self._doc_cache.stats()
+
+    def _run_query(
+        self,
+        name: str,
+        query: str,
+        named_params: Dict[str, Any] = None,
+        prepared: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Run a N1QL query and record its latency and row count.
+
+        Queries run as prepared statements by default; the statement text only depends
+        on which filters are used, so the query service prepares each variant once and
+        reuses its plan afterwards.
+
+        Args:
+            name: The statement name the metrics are recorded under
+            query: The statement text, with $named parameters
+            named_params: The parameter values
+            prepared: Whether to prepare the statement, DDL can't be
+        """
+        options = QueryOptions(adhoc=not prepared, named_parameters=named_params or {})
+        started = time.perf_counter()
+        rows = []
+        try:
+            rows = [row for row in self.cluster.query(query, options)]
+        except Exception as e:
+            self._query_metrics.record(name, (time.perf_counter() - started) * 1000, len(rows), failed=True)
+            self._record_failure(e)
+            raise
+        self._query_metrics.record(name, (time.perf_counter() - started) * 1000, len(rows))
+        return rows
+
+    def query_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get per-statement call counts, row counts and latencies."""
+        return self._query_metrics.snapshot()
+
+    def _upsert_batches(self, collection, docs: Dict[str, Dict[str, Any]], batch_size: int, label: str) -> BulkWriteResult:
+        """
+        Upsert documents by key in batches of multi-upserts.
+
+        A failing document doesn't stop the rest of the batch; failures are reported
+        per document in the result instead.
+        """
+        keys = list(docs)
+        results = []
+        for offset in range(0, len(keys), batch_size):
+            batch = {key: docs[key] for key in keys[offset:offset + batch_size]}
+            try:
+                outcome = collection.upsert_multi(batch)
+                errors = outcome.exceptions or {}
+            except Exception as e:
+                logger.exception(f"Failed to store {label} batch")
+                self._record_failure(e)
+                errors = {key: e for key in batch}
+
+            results.extend(
+                BulkItemResult(id=key, success=key not in errors, error=str(errors[key]) if key in errors else None)
+                for key in batch
+            )
+
+        result = BulkWriteResult(results=results)
+        if result.failed:
+            logger.warning(f"Stored {len(result.succeeded)} {label}, {len(result.failed)} failed")
+        else:
+            logger.info(f"Stored {len(result.succeeded)} {label}")
+        return result
+
+    def _ensure_indexes(self) -> None:
+        """Create the secondary indexes used by the queries if they don't exist."""
+        for statement in query_index_statements(self):
+            try:
+                self._run_query("create_index", statement, prepared=False)
+            except Exception as e:
+                logger.warning(f"Failed to create index, queries may fall back to scans: {str(e)}")
+                return
+        logger.info("Query indexes are in place")
+
     def await_up(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
         """
         Wait until the Couchbase query service is available by running a simple query in a loop.
@@ -190,9 +931,6 @@ class SchedulingClient:
         if self._is_query_service_ready:
             return
 
-        if not self.cluster:
-            self.connect()
-
         delay = initial_delay
         for attempt in range(1, max_retries + 1):
             try:
@@ -207,6 +945,8 @@ class SchedulingClient:
                 logger.info("Couchbase query service is ready")
                 return
             except Exception:
+                if attempt == max_retries:
+                    break
                 logger.warning(
                     f"Attempt {attempt}/{max_retries}: Couchbase query service not available yet. "
                     f"Retrying in {delay:.1f} seconds..."
@@ -233,13 +973,13 @@ class SchedulingClient:
         Returns:
             The employee number
         """
-        if not self.employees:
-            self.init()
+        self._ensure_ready()
 
         # known_absences = known_absences or []
 
         try:
             self.employees.upsert(employee_number, data)
+            self._invalidate_employee(employee_number)
             logger.info(f"Created employee with number: {employee_number}")
             return employee_number
         except Exception:
@@ -256,76 +996,96 @@ class SchedulingClient:
         Returns:
             The employee details or None if not found
         """
-        if not self.employees:
-            self.init()
+        self._ensure_ready()
 
         try:
-            result = self.employees.get(employee_number)
+            return self._cached_get(self.employees, self.employees_coll, employee_number, "name")
+        except Exception as e:
+            logger.warning(f"Failed to get employee: {str(e)}")
+            return None
 
-            if not result or not hasattr(result, 'value') or not result.value:
-                return None
+    def get_employee_with_cas(self, employee_number: str) -> tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Get an employee and the CAS to pass back for an optimistic update.
 
-            return result.value
-        except DocumentNotFoundException:
-            return None
+        Args:
+            employee_number: The employee number
+
+        Returns:
+            The employee details and CAS, or (None, None) if not found
+        """
+        self._ensure_ready()
+
+        try:
+            return self._cached_read(self.employees, self.employees_coll, employee_number, "name") or (None, None)
         except Exception as e:
             logger.warning(f"Failed to get employee: {str(e)}")
-            return None
+            return None, None
 
-    def get_employees(self) -> List[Dict[str, Any]]:
+    def get_employees(self, limit: int = None, after: str = None) -> List[Dict[str, Any]]:
         """
-        Get all employees.
+        Get employees ordered by employee number.
+
+        Args:
+            limit: Optional maximum number of employees to return
+            after: Optional cursor of the last employee on the previous page
 
         Returns:
             List of employees
         """
-        if not self.employees:
-            self.init()
-
-        # Make sure the query service is available
-        self.await_up()
+        self._ensure_ready()
 
+        query, named_params = employees_query(self, limit, after)
         try:
-            query = f"""
-            SELECT e.name, e.employee_number
-            FROM {self.bucket_name}.{self.scope_name}.{self.employees_coll} e
-            """
-
-            result = self.cluster.query(query)
-            return [row for row in result]
+            return self._run_query("employees", query, named_params)
         except Exception:
             logger.exception("Failed to get employees.")
             raise
 
-    def update_employee(self, employee_number: str, updates: Dict[str, Any]) -> bool:
+    def get_roster(self) -> List[Dict[str, Any]]:
+        """
+        Get the fields of every employee needed for scheduling analysis, with one index-only scan.
+
+        Returns:
+            List of employees with name, employee_number, first_line_support_count and known_absences
         """
-        Update an employee.
+        self._ensure_ready()
+
+        query, named_params = roster_query(self)
+        try:
+            return self._run_query("roster", query, named_params)
+        except Exception:
+            logger.exception("Failed to get roster.")
+            raise
+
+    def update_employee(self, employee_number: str, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Update an employee's fields in place, without reading the document first.
 
         Args:
             employee_number: The employee number
             updates: The fields to update
+            cas: Optional CAS the employee must still have (optimistic concurrency)
 
         Returns:
-            True if the update was successful, False otherwise
+            The employee's new CAS if the update was successful, None otherwise
+
+        Raises:
+            ConcurrentUpdateError: If the employee changed since `cas`
         """
-        if not self.employees:
-            self.init()
+        self._ensure_ready()
 
         try:
-            employee = self.get_employee(employee_number)
-            if not employee:
-                return False
-
-            # Update employee fields
-            for key, value in updates.items():
-                employee[key] = value
-
-            self.employees.upsert(employee_number, employee)
-            logger.info(f"Updated employee {employee_number}")
-            return True
+            new_cas = self._mutate_fields(self.employees, employee_number, updates, cas)
+            self._invalidate_employee(employee_number)
+            if new_cas:
+                logger.info(f"Updated employee {employee_number}")
+            return new_cas
+        except ConcurrentUpdateError:
+            raise
         except Exception:
             logger.exception("Failed to update employee")
-            return False
+            return None
 
     def delete_employee(self, employee_number: str) -> bool:
         """
@@ -337,8 +1097,7 @@ class SchedulingClient:
         Returns:
             True if the employee was deleted, False otherwise
         """
-        if not self.employees:
-            self.init()
+        self._ensure_ready()
 
         try:
             employee = self.get_employee(employee_number)
@@ -346,6 +1105,7 @@ class SchedulingClient:
                 return False
 
             self.employees.remove(employee_number)
+            self._invalidate_employee(employee_number)
             logger.info(f"Deleted employee {employee_number}")
             return True
         except Exception:
@@ -364,8 +1124,7 @@ class SchedulingClient:
         Returns:
             The schedule ID (date string)
         """
-        if not self.schedules:
-            self.init()
+        self._ensure_ready()
 
         doc = {
             "date": date_str,
@@ -373,11 +1132,16 @@ class SchedulingClient:
         }
 
         try:
+            # The upsert may replace an existing assignment for the same date
+            previous = self.get_schedule(date_str)
+
             self.schedules.upsert(date_str, doc)
             logger.info(f"Created schedule for date: {date_str}")
 
-            # Update employee's first-line support count
-            self._update_employee_counts()
+            # Move the first-line support count to the new assignee
+            if previous:
+                self._adjust_support_count(previous.get("first_line_support"), -1)
+            self._adjust_support_count(employee_number, 1)
 
             return date_str
         except Exception:
@@ -394,8 +1158,7 @@ class SchedulingClient:
         Returns:
             The schedule details or None if not found
         """
-        if not self.schedules:
-            self.init()
+        self._ensure_ready()
 
         try:
             result = self.schedules.get(date_str)
@@ -410,47 +1173,30 @@ class SchedulingClient:
             logger.warning(f"Failed to get schedule: {str(e)}")
             return None
 
-    def get_schedules(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+    def get_schedules(
+        self,
+        start_date: str = None,
+        end_date: str = None,
+        limit: int = None,
+        after: str = None
+    ) -> List[Dict[str, Any]]:
         """
         Get schedules within a date range.
 
         Args:
             start_date: Optional start date in ISO format (inclusive)
             end_date: Optional end date in ISO format (inclusive)
+            limit: Optional maximum number of schedules to return
+            after: Optional cursor of the last schedule on the previous page
 
         Returns:
             List of schedules
         """
-        if not self.schedules:
-            self.init()
-
-        # Make sure the query service is available
-        self.await_up()
+        self._ensure_ready()
 
+        query, named_params = schedules_query(self, start_date, end_date, limit, after)
         try:
-            where_clause = ""
-            named_params = {}
-
-            if start_date and end_date:
-                where_clause = "WHERE s.date >= $start_date AND s.date <= $end_date"
-                named_params = {"start_date": start_date, "end_date": end_date}
-            elif start_date:
-                where_clause = "WHERE s.date >= $start_date"
-                named_params = {"start_date": start_date}
-            elif end_date:
-                where_clause = "WHERE s.date <= $end_date"
-                named_params = {"end_date": end_date}
-
-            query = f"""
-            SELECT s.*
-            FROM {self.bucket_name}.{self.scope_name}.{self.schedules_coll} s
-            {where_clause}
-            ORDER BY s.date ASC
-            """
-
-            options = QueryOptions(named_parameters=named_params) if named_params else None
-            result = self.cluster.query(query, options)
-            return [row for row in result]
+            return self._run_query("schedules", query, named_params)
         except Exception:
             logger.exception("Failed to get schedules.")
             raise
@@ -466,20 +1212,22 @@ class SchedulingClient:
         Returns:
             True if the update was successful, False otherwise
         """
-        if not self.schedules:
-            self.init()
+        self._ensure_ready()
 
         try:
             schedule = self.get_schedule(date_str)
             if not schedule:
                 return False
 
+            previous_employee = schedule.get("first_line_support")
             schedule["first_line_support"] = employee_number
             self.schedules.upsert(date_str, schedule)
             logger.info(f"Updated schedule for date {date_str}")
 
             # Update employee counts
-            self._update_employee_counts()
+            if previous_employee != employee_number:
+                self._adjust_support_count(previous_employee, -1)
+                self._adjust_support_count(employee_number, 1)
 
             return True
         except Exception:
@@ -496,8 +1244,7 @@ class SchedulingClient:
         Returns:
             True if the schedule was deleted, False otherwise
         """
-        if not self.schedules:
-            self.init()
+        self._ensure_ready()
 
         try:
             schedule = self.get_schedule(date_str)
@@ -508,43 +1255,83 @@ class SchedulingClient:
             logger.info(f"Deleted schedule for date {date_str}")
 
             # Update employee counts
-            self._update_employee_counts()
+            self._adjust_support_count(schedule.get("first_line_support"), -1)
 
             return True
         except Exception:
             logger.exception("Failed to delete schedule")
             return False
 
-    def _update_employee_counts(self) -> None:
-        """Update first-line support counts for all employees."""
-        if not self.employees or not self.schedules:
-            self.init()
+    def create_employees(self, docs: Dict[str, Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> BulkWriteResult:
+        """
+        Store many employee documents using batched multi-upserts.
+
+        Args:
+            docs: Employee documents by employee number
+            batch_size: Number of documents per multi-upsert call
+
+        Returns:
+            Per-employee write results
+        """
+        self._ensure_ready()
+
+        result = self._upsert_batches(self.employees, docs, batch_size, "employees")
+        for employee_number in docs:
+            self._invalidate_employee(employee_number)
+        return result
+
+    def _adjust_support_count(self, employee_number: Optional[str], delta: int) -> None:
+        """
+        Atomically adjust an employee's first-line support count.
+
+        Args:
+            employee_number: The employee number, ignored if empty
+            delta: The amount to add (negative to subtract)
+        """
+        if not employee_number or not delta:
+            return
+
+        self._ensure_ready()
+
+        spec = SD.increment("first_line_support_count", delta) if delta > 0 \
+            else SD.decrement("first_line_support_count", -delta)
 
         try:
-            # Reset all counts
-            employees = self.get_employees()
-            for emp in employees:
-                emp["first_line_support_count"] = 0
-                self.employees.upsert(emp["employee_number"], emp)
-
-            # Count schedules for each employee
-            schedules = self.get_schedules()
-            emp_counts = {}
-
-            for schedule in schedules:
-                emp_id = schedule["first_line_support"]
-                emp_counts[emp_id] = emp_counts.get(emp_id, 0) + 1
-
-            # Update employees with counts
-            for emp_id, count in emp_counts.items():
-                emp = self.get_employee(emp_id)
-                if emp:
-                    emp["first_line_support_count"] = count
-                    self.employees.upsert(emp_id, emp)
-
-            logger.info("Updated employee first-line support counts")
+            self.employees.mutate_in(employee_number, [spec])
+            self._invalidate_employee(employee_number)
+        except DocumentNotFoundException:
+            logger.warning(f"Cannot adjust support count, employee {employee_number} not found")
         except Exception:
-            logger.exception("Failed to update employee counts")
+            logger.exception(f"Failed to adjust support count for employee {employee_number}")
+
+    def recount_employee_counts(self) -> Dict[str, int]:
+        """
+        Recompute first-line support counts for all employees from the schedules.
+
+        This is a maintenance operation for repairing counters that drifted, e.g. after
+        a failed write. Regular schedule writes keep the counts up to date incrementally.
+
+        Returns:
+            The recomputed counts by employee number
+        """
+        self._ensure_ready()
+
+        # Count schedules for each employee
+        emp_counts = {emp["employee_number"]: 0 for emp in self.get_employees()}
+        for schedule in self.get_schedules():
+            emp_id = schedule["first_line_support"]
+            emp_counts[emp_id] = emp_counts.get(emp_id, 0) + 1
+
+        # Only touch the count field, leaving the rest of the document intact
+        for emp_id, count in emp_counts.items():
+            try:
+                self.employees.mutate_in(emp_id, [SD.upsert("first_line_support_count", count)])
+                self._invalidate_employee(emp_id)
+            except DocumentNotFoundException:
+                logger.warning(f"Schedules reference unknown employee {emp_id}")
+
+        logger.info("Recounted employee first-line support counts")
+        return emp_counts
 
     # Rules methods
     def get_rules(self) -> Dict[str, Any]:
@@ -554,89 +1341,145 @@ class SchedulingClient:
         Returns:
             The rules
         """
-        if not self.rules:
-            self.init()
+        self._ensure_ready()
 
         try:
-            result = self.rules.get("system_rules")
-            if not result or not hasattr(result, 'value') or not result.value:
+            rules = self._cached_get(self.rules, self.rules_coll, "system_rules", "max_days_per_week")
+            if not rules:
                 # Initialize default rules if not found
                 self._init_default_rules()
-                result = self.rules.get("system_rules")
+                rules = self._cached_get(self.rules, self.rules_coll, "system_rules", "max_days_per_week")
 
-            return result.value
-        except DocumentNotFoundException:
-            # Initialize default rules without logging warning when document not found
-            self._init_default_rules()
-            try:
-                result = self.rules.get("system_rules")
-                return result.value
-            except Exception:
-                # Fallback to default rules
-                return {
-                    "max_days_per_week": 3,
-                    "preferred_balance": 0.2
-                }
+            # Fallback to default rules
+            return rules or dict(DEFAULT_RULES)
         except Exception as e:
             logger.warning(f"Failed to get rules: {str(e)}")
             # Return default rules
-            return {
-                "max_days_per_week": 3,
-                "preferred_balance": 0.2
-            }
+            return dict(DEFAULT_RULES)
 
-    def update_rules(self, updates: Dict[str, Any]) -> bool:
+    def update_rules(self, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
         """
-        Update the scheduling system rules.
+        Update the scheduling system rules in place, without reading them first.
 
         Args:
-            updates: The rule fields to update
+            updates: The rule fields to update, None values are ignored
+            cas: Optional CAS the rules must still have (optimistic concurrency)
 
         Returns:
-            True if the update was successful, False otherwise
+            The rules' new CAS if the update was successful, None otherwise
+
+        Raises:
+            ConcurrentUpdateError: If the rules changed since `cas`
         """
-        if not self.rules:
-            self.init()
+        self._ensure_ready()
 
-        try:
-            current_rules = self.get_rules()
+        # Only update provided fields
+        updates = {key: value for key, value in updates.items() if value is not None}
 
-            # Update rule fields
-            for key, value in updates.items():
-                if value is not None:  # Only update provided fields
-                    current_rules[key] = value
+        try:
+            new_cas = self._mutate_fields(self.rules, "system_rules", updates, cas)
+            if new_cas is None and cas is None:
+                # Rules document is missing, recreate the defaults and apply on top
+                self._init_default_rules()
+                new_cas = self._mutate_fields(self.rules, "system_rules", updates)
 
-            self.rules.upsert("system_rules", current_rules)
-            logger.info("Updated scheduling rules")
-            return True
+            self._doc_cache.invalidate((self.rules_coll, "system_rules"))
+            if new_cas:
+                logger.info("Updated scheduling rules")
+            return new_cas
+        except ConcurrentUpdateError:
+            raise
         except Exception:
             logger.exception("Failed to update rules")
-            return False
+            return None
 
-    def create_shift(self, employee_number: str, start: str, end: str, type: str) -> str:
-        if not self.shifts:
-            self.init()
+    def get_seed_state(self) -> Optional[Dict[str, Any]]:
+        """Get the record of the last demo data seeding, or None if it never ran."""
+        self._ensure_ready()
 
-        doc = {
-            "shift_id": str(uuid.uuid1()),
-            "employee_number": employee_number,
-            "start": start,
-            "end": end,
-            "type": type,
-            "score": -1
-        }
+        try:
+            return self.rules.get(SEED_STATE_KEY).value
+        except DocumentNotFoundException:
+            return None
+
+    def set_seed_state(self, state: Dict[str, Any]) -> None:
+        """Record a completed demo data seeding."""
+        self._ensure_ready()
+
+        self.rules.upsert(SEED_STATE_KEY, state)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> Optional[int]:
+        """
+        Try to take a cluster-wide lease, so only one process runs some work at a time.
+
+        The lease is a document that expires by itself, so a crashed holder can't keep it.
+
+        Args:
+            name: The lease name
+            owner: Identifies the holder, stored in the lease document
+            ttl: Seconds until the lease expires unless released before
+
+        Returns:
+            The CAS of the lease document to release it with, None if someone else holds it
+        """
+        self._ensure_ready()
 
         try:
-            self.shifts.upsert(doc["shift_id"], doc)
-            logger.info(f"Created shift with id: {doc['shift_id']}")
-            return doc["shift_id"]
-        except Exception:
-            logger.exception("Failed to create shift")
-            raise
+            result = self.rules.insert(f"lease::{name}", {"owner": owner}, InsertOptions(expiry=timedelta(seconds=ttl)))
+            return result.cas
+        except DocumentExistsException:
+            return None
+
+    def release_lease(self, name: str, cas: int) -> None:
+        """
+        Release a lease taken with acquire_lease.
+
+        Args:
+            name: The lease name
+            cas: The CAS acquire_lease returned; if the lease expired and was taken
+                by someone else since, it is left alone
+        """
+        self._ensure_ready()
+
+        try:
+            self.rules.remove(f"lease::{name}", RemoveOptions(cas=cas))
+        except (CasMismatchException, DocumentNotFoundException):
+            logger.warning(f"Lease {name} expired before it was released")
+
+    def create_shift(self, employee_number: str, start: str, end: str, type: str) -> str:
+        """
+        Create a shift in the first free slot for its hour and type.
+
+        Args:
+            employee_number: The employee number
+            start: Start time ("YYYY-MM-DD HH-MM")
+            end: End time ("YYYY-MM-DD HH-MM")
+            type: The shift type (cleaning, line1 etc.)
+
+        Returns:
+            The shift id (its slot key)
+
+        Raises:
+            ValueError: If the shift doesn't fit the slot grid or all its slots are taken
+        """
+        self._ensure_ready()
+
+        for key in shift_slot_keys(start, type):
+            doc = new_shift_doc(employee_number, start, end, type, key)
+            try:
+                self.shifts.insert(key, doc)
+                logger.info(f"Created shift with id: {key}")
+                return key
+            except DocumentExistsException:
+                continue
+            except Exception:
+                logger.exception("Failed to create shift")
+                raise
+
+        raise ValueError(f"All {type} slots starting {start} are taken")
 
     def get_shift(self, shift_id) -> Optional[Dict[str, Any]]:
-        if not self.shifts:
-            self.init()
+        self._ensure_ready()
 
         try:
             result = self.shifts.get(shift_id)
@@ -650,122 +1493,154 @@ class SchedulingClient:
         except Exception as e:
             logger.warning(f"Failed")
 
-    def get_shifts(self) -> List[Dict[str, Any]]:
+    def get_day_shifts(self, date: str) -> List[Dict[str, Any]]:
         """
-        Get schedules within a date range.
+        Get a day's shifts with a multi-get of its slot keys, without the query service.
 
         Args:
-            start_date: Optional start date in ISO format (inclusive)
-            end_date: Optional end date in ISO format (inclusive)
+            date: The date in ISO format (YYYY-MM-DD)
 
         Returns:
-            List of schedules
+            List of shifts ordered by start time
         """
-        if not self.shifts:
-            self.init()
+        self._ensure_ready()
 
-        # Make sure the query service is available
-        self.await_up()
+        keys = day_shift_keys(date)
+        result = self.shifts.get_multi(keys)
 
-        try:
-            named_params = {}
+        for key, error in (result.exceptions or {}).items():
+            if not isinstance(error, DocumentNotFoundException):
+                logger.warning(f"Failed to get shift {key}: {str(error)}")
+
+        found = result.results or {}
+        return [found[key].value for key in keys if key in found]
+
+    def get_shifts(
+        self,
+        start: str = None,
+        end: str = None,
+        employee_number: str = None,
+        type: str = None,
+        limit: int = None,
+        after: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get shifts, optionally within a time window and for one employee or shift type.
 
-            query = f"""
-            SELECT s.*
-            FROM {self.bucket_name}.{self.scope_name}.{self.shifts_coll} s
-            """
+        Args:
+            start: Optional window start ("YYYY-MM-DD HH-MM" or "YYYY-MM-DD"), shifts ending after it match
+            end: Optional window end, shifts starting before it match
+            employee_number: Optional employee number
+            type: Optional shift type (cleaning, line1 etc.)
+            limit: Optional maximum number of shifts to return
+            after: Optional cursor of the last shift on the previous page
 
-            options = QueryOptions(named_parameters=named_params) if named_params else None
-            result = self.cluster.query(query, options)
-            return [row for row in result]
+        Returns:
+            List of shifts ordered by start time
+        """
+        self._ensure_ready()
+
+        query, named_params = shifts_query(self, start, end, employee_number, type, limit, after)
+        try:
+            return self._run_query("shifts", query, named_params)
         except Exception:
-            logger.exception("Failed to get schedules.")
+            logger.exception("Failed to get shifts.")
             raise
 
-    def update_shift(self, shift_id, updates: Dict[str, Any]) -> bool:
-        if not self.shifts:
-            self.init()
+    def update_shift(self, shift_id: str, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Update a shift's fields in place, only reading the document first when the
+        update changes one of its start and end.
 
-        try:
-            shift = self.get_shift(shift_id)
-            if not shift:
-                return False
+        Args:
+            shift_id: The shift id
+            updates: The fields to update
+            cas: Optional CAS the shift must still have (optimistic concurrency)
 
-            # Update employee fields
-            for key, value in updates.items():
-                shift[key] = value
+        Returns:
+            The shift's new CAS if the update was successful, None otherwise
 
-            self.shifts.upsert(shift_id, shift)
-            logger.info(f"Updated shift {shift_id}")
-            return True
+        Raises:
+            ConcurrentUpdateError: If the shift changed since `cas`
+            ValueError: If the updates would move the shift to another slot, or its times are invalid
+        """
+        self._ensure_ready()
+
+        check_shift_slot(shift_id, updates)
+        current = None
+        if ("start" in updates) != ("end" in updates):
+            # Changing one end of the shift, check it against the stored other one
+            current = self.get_shift(shift_id)
+            if current is None:
+                return None
+        updates = with_interval_fields(updates, current)
+
+        try:
+            new_cas = self._mutate_fields(self.shifts, shift_id, updates, cas)
+            if new_cas:
+                logger.info(f"Updated shift {shift_id}")
+            return new_cas
+        except ConcurrentUpdateError:
+            raise
         except Exception:
-            logger.exception("Failed to update employee")
-            return False
+            logger.exception("Failed to update shift")
+            return None
 
     def delete_shift(self, shift_id):
-        if not self.shifts:
-            self.init()
+        self._ensure_ready()
 
         try:
             shift = self.get_shift(shift_id)
             if not shift:
                 return False
 
-            self.employees.remove(shift_id)
+            self.shifts.remove(shift_id)
             logger.info(f"Deleted shift {shift_id}")
             return True
         except Exception:
             logger.exception("Failed to delete shift")
             return False
 
-    def create_daily_shifts(self, date: str, employee_numbers: List[str]) -> None:
-        """
-        Create shifts for a day with the following pattern:
-        - Hours from 08:00 to 16:00
-        - For each hour:
-          - 2 employees on line1
-          - 2 employees on line2
-          - 1 employee on packing
-        - Special cases:
-          - First hour (08:00): 1 employee on cleaning instead of line1
-          - Two hours after lunch (13:00): 1 employee on inventory instead of line1
-        """
-        if len(employee_numbers) < 5:
-            raise ValueError("Need at least 5 employee numbers to create shifts")
-
-        # Create shifts for each hour
-        for hour in range(8, 16):
-            start_time = f"{date} {hour:02d}-00"
-            end_time = f"{date} {hour+1:02d}-00"
-            
-            # Special cases
-            if hour == 8:  # First hour
-                # Cleaning instead of line1
-                self.create_shift(employee_numbers[0], start_time, end_time, "cleaning")
-                self.create_shift(employee_numbers[1], start_time, end_time, "line1")
-                self.create_shift(employee_numbers[2], start_time, end_time, "line2")
-                self.create_shift(employee_numbers[3], start_time, end_time, "line2")
-            elif hour == 13:  # Two hours after lunch
-                # Inventory instead of line1
-                self.create_shift(employee_numbers[0], start_time, end_time, "inventory")
-                self.create_shift(employee_numbers[1], start_time, end_time, "line1")
-                self.create_shift(employee_numbers[2], start_time, end_time, "line1")
-                self.create_shift(employee_numbers[3], start_time, end_time, "line2")
-            else:
-                # Normal pattern
-                self.create_shift(employee_numbers[0], start_time, end_time, "line1")
-                self.create_shift(employee_numbers[1], start_time, end_time, "line1")
-                self.create_shift(employee_numbers[2], start_time, end_time, "line2")
-                self.create_shift(employee_numbers[3], start_time, end_time, "line2")
-            
-            # Packing shift for each hour
-            self.create_shift(employee_numbers[4], start_time, end_time, "packing")
+    def create_shifts(self, docs: List[Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> BulkWriteResult:
+        """
+        Store many shift documents using batched multi-upserts.
+
+        A failing document doesn't stop the rest of the batch; failures are reported
+        per shift in the result instead.
+
+        Args:
+            docs: Shift documents, each with a shift_id
+            batch_size: Number of documents per multi-upsert call
+
+        Returns:
+            Per-shift write results
+        """
+        self._ensure_ready()
+
+        return self._upsert_batches(self.shifts, {doc["shift_id"]: doc for doc in docs}, batch_size, "shifts")
+
+    def create_daily_shifts(self, date: str, employee_numbers: List[str]) -> BulkWriteResult:
+        """
+        Create shifts for a day following the daily shift pattern, see daily_shift_roles.
+
+        Args:
+            date: The date in ISO format (YYYY-MM-DD)
+            employee_numbers: Employee numbers to assign, one per slot (at least 5)
+
+        Returns:
+            Per-shift write results
+        """
+        return self.create_shifts(daily_shift_docs(date, employee_numbers))
 
     def close(self) -> None:
         """Close the database connection."""
-        if self.cluster:
-            self.cluster = None
-            logger.info("Database connection closed")
+        with self._state_changed:
+            self._state = ClientState.UNINITIALIZED
+            self._initialized = False
+            self.scope = None
+            if self.cluster:
+                self.cluster = None
+                logger.info("Database connection closed")
 
     def __enter__(self):
         self.connect()
@@ -0,0 +1,1686 @@
+from typing import AsyncIterator, Iterable, List, Optional, Dict, Any
+import asyncio
+from collections import defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+import copy
+import time
+from acouchbase.cluster import Cluster
+from couchbase.options import ClusterOptions, MutateInOptions, QueryOptions
+from couchbase.auth import PasswordAuthenticator
+from couchbase.exceptions import CasMismatchException, DocumentExistsException, DocumentNotFoundException
+from couchbase.n1ql import QueryScanConsistency
+import couchbase.subdocument as SD
+
+from .scheduling import (
+    CONNECTION_ERRORS, DEFAULT_RULES, BULK_BATCH_SIZE, ClientState, ConcurrentUpdateError, ServiceUnavailableError,
+    ShiftConflictError,
+    check_shift_slot, daily_shift_docs, day_shift_keys, minutes_to_shift_time, new_shift_doc, query_index_statements,
+    shift_interval_fields, shift_slot_keys,
+    employees_query, planning_roster_query, roster_query, schedules_query, shifts_query
+)
+from ..models import BulkItemResult, BulkWriteResult
+from ..planning.availability import AvailabilityIndex
+from ..planning.intervals import EmployeeIntervals, IntervalIndex, shift_interval
+from ..utils import log
+from ..utils.cache import DocumentCache
+from ..utils.metrics import QueryMetrics
+
+logger = log.get_logger(__name__)
+
+# Number of locks the employees' overlap checks and shift writes are spread over, see _interval_locks
+INTERVAL_LOCK_STRIPES = 64
+
+class AsyncSchedulingClient:
+    """
+    Asyncio variant of SchedulingClient built on the SDK's acouchbase API.
+
+    Exposes the same employee, schedule, shift and rules methods as coroutines, so
+    request handlers can await database I/O without blocking the event loop.
+
+    Connecting follows the same state machine as SchedulingClient, see _ensure_ready:
+    a burst of requests shares one connection attempt, and while the database is
+    down methods raise ServiceUnavailableError instead of each waiting for timeouts.
+    """
+
+    def __init__(
+        self,
+        url: str = None,
+        username: str = None,
+        password: str = None,
+        bucket_name: str = None,
+        scope: str = "_default",
+        employees_coll: str = "employees",
+        schedules_coll: str = "schedules",
+        shifts_coll: str = "shifts",
+        rules_coll: str = "rules",
+        cache_size: int = 1024,
+        cache_ttl: float = 5.0,
+        availability_ttl: float = 60.0,
+        intervals_ttl: float = 30.0,
+        reconnect_interval: float = 30.0
+    ):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.bucket_name = bucket_name
+        self.scope_name = scope
+        self.employees_coll = employees_coll
+        self.schedules_coll = schedules_coll
+        self.shifts_coll = shifts_coll
+        self.rules_coll = rules_coll
+        self.cluster = None
+        self.bucket = None
+        self.scope = None
+        self.employees = None
+        self.schedules = None
+        self.shifts = None
+        self.rules = None
+        self._is_query_service_ready = False
+        self._init_lock = asyncio.Lock()
+        # Initialization state machine, see _ensure_ready
+        self.reconnect_interval = reconnect_interval
+        self._state = ClientState.UNINITIALIZED
+        self._attempt: Optional[asyncio.Future] = None
+        self._retry_at = 0.0
+        # Read-through cache of employee and rules documents, keyed by (collection, key)
+        self._doc_cache = DocumentCache(max_size=cache_size, ttl=cache_ttl)
+        self._query_metrics = QueryMetrics()
+        # Absence and eligibility bitsets of the roster, see get_availability
+        self._availability = AvailabilityIndex(ttl=availability_ttl)
+        # Shift intervals by employee for the overlap checks, see _employee_intervals
+        self._intervals = IntervalIndex(ttl=intervals_ttl)
+        self._interval_stripes = [asyncio.Lock() for _ in range(INTERVAL_LOCK_STRIPES)]
+
+    async def connect(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
+        """
+        Establish connection to Couchbase database and initialize the collections,
+        waiting for the database if it isn't up yet.
+
+        Each attempt is one single-flight connection attempt, see _ensure_ready; other
+        callers keep failing fast between the attempts.
+
+        Args:
+            max_retries: Maximum number of attempts.
+            initial_delay: Initial delay between attempts in seconds.
+            max_delay: Maximum delay between attempts in seconds.
+
+        Raises:
+            ServiceUnavailableError: If the database couldn't be reached
+        """
+        delay = initial_delay
+        for attempt in range(1, max_retries + 1):
+            try:
+                await self._ensure_ready(force=True)
+                return
+            except ServiceUnavailableError:
+                if attempt == max_retries:
+                    logger.error(f"Failed to connect after {max_retries} attempts")
+                    raise
+                logger.info(f"Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                # Exponential backoff with a cap
+                delay = min(max_delay, delay * 1.5)
+
+    @property
+    def state(self) -> ClientState:
+        return self._state
+
+    async def _ensure_ready(self, force: bool = False) -> None:
+        """
+        Make sure the client is connected and initialized, shared by all methods.
+
+        Single-flight: the first caller that finds the client uninitialized (or degraded
+        past its retry interval) starts one connection attempt, and concurrent callers
+        await that attempt rather than starting their own. A failed attempt leaves the
+        client DEGRADED, and callers fail fast until the retry interval has passed.
+
+        Args:
+            force: Attempt to connect even if the retry interval hasn't passed yet
+
+        Raises:
+            ServiceUnavailableError: If the database isn't available
+        """
+        if self._state is ClientState.READY:
+            return
+
+        if self._state is not ClientState.CONNECTING:
+            if self._state is ClientState.DEGRADED and not force and time.monotonic() < self._retry_at:
+                raise ServiceUnavailableError("Database is unavailable, waiting before reconnecting")
+            self._state = ClientState.CONNECTING
+            self._attempt = asyncio.ensure_future(self._connect_once())
+
+        # Shielded, so a caller going away doesn't cancel the attempt the others await
+        await asyncio.shield(self._attempt)
+
+    async def _connect_once(self) -> None:
+        """Make one connection attempt for _ensure_ready, leaving the client READY or DEGRADED."""
+        ready = False
+        try:
+            if not self.scope and not await self._open(max_retries=1):
+                raise Exception("Failed to connect to cluster")
+            await self.init(max_retries=1)
+            # Also the probe of a reconnect, see _record_failure
+            await self.await_up(max_retries=1)
+            ready = True
+        except Exception as e:
+            logger.error(f"Couchbase unavailable, retrying in {self.reconnect_interval:.0f} seconds at the earliest: {str(e)}")
+            raise ServiceUnavailableError("Database is unavailable") from e
+        finally:
+            if ready:
+                self._state = ClientState.READY
+            else:
+                self._state = ClientState.DEGRADED
+                self._retry_at = time.monotonic() + self.reconnect_interval
+
+    def _record_failure(self, error: BaseException) -> None:
+        """
+        Take a ready client back to DEGRADED after an error meaning the cluster can't be
+        reached, so the next call probes the connection again instead of every call
+        running into timeouts.
+        """
+        if not isinstance(error, CONNECTION_ERRORS) or self._state is not ClientState.READY:
+            return
+        self._state = ClientState.DEGRADED
+        self._retry_at = time.monotonic()
+        self._is_query_service_ready = False
+        logger.warning(f"Lost the Couchbase connection, reconnecting on the next call: {str(error)}")
+
+    async def _open(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> bool:
+        """Open the cluster and wait for the bucket, returning whether it succeeded."""
+        auth = PasswordAuthenticator(self.username, self.password)
+        options = ClusterOptions(auth)
+
+        if not self.cluster:
+            cluster = Cluster(self.url, options)
+            await cluster.on_connect()
+            self.cluster = cluster
+
+        delay = initial_delay
+        for attempt in range(1, max_retries + 1):
+            try:
+                bucket = self.cluster.bucket(self.bucket_name)
+                await bucket.on_connect()
+                self.bucket = bucket
+                self.scope = self.bucket.scope(self.scope_name)
+                logger.info(f"Connected to Couchbase database with bucket and scope on attempt {attempt}")
+                return True
+            except Exception as bucket_err:
+                logger.warning(f"Bucket or scope not ready yet (attempt {attempt}/{max_retries}): {str(bucket_err)}")
+                if attempt < max_retries:
+                    logger.info(f"Retrying in {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
+                    # Exponential backoff with a cap
+                    delay = min(max_delay, delay * 1.5)
+                else:
+                    logger.error(f"Failed to connect after {max_retries} attempts")
+
+        return False
+
+    async def init(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
+        """
+        Create the collections if they don't exist.
+
+        Runs as part of _ensure_ready; concurrent callers also wait for a single
+        initialization instead of each running their own.
+
+        Args:
+            max_retries: Maximum number of retry attempts.
+            initial_delay: Initial delay between retries in seconds.
+            max_delay: Maximum delay between retries in seconds.
+        """
+        async with self._init_lock:
+            if self.employees:
+                return
+
+            if not self.scope and not await self._open(max_retries, initial_delay, max_delay):
+                raise Exception("Failed to connect to cluster")
+
+            delay = initial_delay
+            for attempt in range(1, max_retries + 1):
+                try:
+                    collection_manager = self.bucket.collections()
+
+                    # Create collections if they don't exist
+                    for coll in [self.employees_coll, self.schedules_coll, self.shifts_coll, self.rules_coll]:
+                        try:
+                            await collection_manager.create_collection(self.scope_name, coll)
+                            logger.info(f"Created collection: {coll}")
+                        except Exception as e:
+                            if "already exists" in str(e):
+                                pass
+                            else:
+                                logger.warning(f"Error creating collection {coll}: {str(e)}")
+
+                    # Get collection references
+                    self.employees = self.scope.collection(self.employees_coll)
+                    self.schedules = self.scope.collection(self.schedules_coll)
+                    self.shifts = self.scope.collection(self.shifts_coll)
+                    self.rules = self.scope.collection(self.rules_coll)
+
+                    # Initialize default rules if not exists
+                    await self._init_default_rules()
+
+                    await self._ensure_indexes()
+
+                    logger.info(f"Collections initialized successfully on attempt {attempt}")
+                    break
+
+                except Exception as e:
+                    logger.warning(f"Error initializing collections (attempt {attempt}/{max_retries}): {str(e)}")
+                    if attempt < max_retries:
+                        logger.info(f"Retrying in {delay:.1f} seconds...")
+                        await asyncio.sleep(delay)
+                        # Exponential backoff with a cap
+                        delay = min(max_delay, delay * 1.5)
+                    else:
+                        logger.error(f"Failed to initialize collections after {max_retries} attempts")
+                        raise
+
+    async def connect_until_ready(self, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
+        """
+        Keep connecting with exponential backoff until KV, collections and query are all ready.
+
+        Meant to run as a background task, so startup doesn't wait for the cluster. Each
+        attempt is one single-flight connection attempt, see _ensure_ready.
+
+        Args:
+            initial_delay: Initial delay between attempts in seconds.
+            max_delay: Maximum delay between attempts in seconds.
+        """
+        delay = initial_delay
+        attempt = 1
+        while True:
+            try:
+                await self._ensure_ready(force=True)
+                logger.info(f"Connected to Couchbase and ready on attempt {attempt}")
+                await self._load_availability()
+                return
+            except ServiceUnavailableError:
+                logger.warning(f"Couchbase not ready yet (attempt {attempt}). Retrying in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                # Exponential backoff with a cap
+                delay = min(max_delay, delay * 1.5)
+                attempt += 1
+
+    def readiness(self) -> Dict[str, bool]:
+        """Get which parts of the database connection are ready: KV, collections and query, none while degraded."""
+        connected = self._state is ClientState.READY
+        return {
+            "kv": connected and self.scope is not None,
+            "collections": connected and self.employees is not None,
+            "query": connected and self._is_query_service_ready,
+        }
+
+    async def _require_collections(self) -> None:
+        await self._ensure_ready()
+        if not self.employees:
+            raise ServiceUnavailableError("Database collections are not ready yet")
+
+    async def _require_query_service(self) -> None:
+        await self._require_collections()
+        if not self._is_query_service_ready:
+            raise ServiceUnavailableError("Database query service is not ready yet")
+
+    async def _init_default_rules(self) -> None:
+        """Initialize default rules if they don't exist."""
+        try:
+            await self.rules.get("system_rules")
+        except DocumentNotFoundException:
+            await self.rules.upsert("system_rules", dict(DEFAULT_RULES))
+            self._doc_cache.invalidate((self.rules_coll, "system_rules"))
+            logger.info("Initialized default scheduling rules")
+
+    async def _ensure_indexes(self) -> None:
+        """Create the secondary indexes used by the queries if they don't exist."""
+        for statement in query_index_statements(self):
+            try:
+                await self._query("create_index", statement, prepared=False)
+            except Exception as e:
+                logger.warning(f"Failed to create index, queries may fall back to scans: {str(e)}")
+                return
+        logger.info("Query indexes are in place")
+
+    async def await_up(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
+        """
+        Wait until the Couchbase query service is available by running a simple query in a loop.
+
+        Args:
+            max_retries: Maximum number of retry attempts.
+            initial_delay: Initial delay between retries in seconds.
+            max_delay: Maximum delay between retries in seconds.
+        """
+        # If we already know the service is ready, skip the check
+        if self._is_query_service_ready:
+            return
+
+        # A single attempt at opening the cluster, the retries below are the whole budget
+        if not self.cluster and not await self._open(max_retries=1):
+            raise Exception("Failed to connect to cluster")
+
+        delay = initial_delay
+        for attempt in range(1, max_retries + 1):
+            try:
+                # Try a simple query that doesn't depend on any collections
+                await self._query("ping", "SELECT 1", prepared=False)
+
+                # If we got here, the query service is ready
+                self._is_query_service_ready = True
+                logger.info("Couchbase query service is ready")
+                return
+            except Exception:
+                if attempt == max_retries:
+                    break
+                logger.warning(
+                    f"Attempt {attempt}/{max_retries}: Couchbase query service not available yet. "
+                    f"Retrying in {delay:.1f} seconds..."
+                )
+                await asyncio.sleep(delay)
+                # Exponential backoff with a cap
+                delay = min(max_delay, delay * 1.5)
+
+        # If we've exhausted all retries
+        raise Exception(f"Couchbase query service not available after {max_retries} attempts")
+
+    async def _stream(
+        self,
+        name: str,
+        query: str,
+        named_params: Dict[str, Any] = None,
+        prepared: bool = True,
+        consistent: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run a N1QL query, yielding rows as the query cursor produces them.
+
+        Queries run as prepared statements by default; the statement text only depends
+        on which filters are used, so each variant is planned once by the query service.
+        With `consistent` the query waits for the indexes to include every write made
+        before it. Latency (until the last row) and row count are recorded under `name`.
+        """
+        consistency = {"scan_consistency": QueryScanConsistency.REQUEST_PLUS} if consistent else {}
+        options = QueryOptions(adhoc=not prepared, named_parameters=named_params or {}, **consistency)
+        started = time.perf_counter()
+        rows = 0
+        failed = False
+        try:
+            async for row in self.cluster.query(query, options):
+                rows += 1
+                yield row
+        except Exception as e:
+            failed = True
+            self._record_failure(e)
+            raise
+        finally:
+            self._query_metrics.record(name, (time.perf_counter() - started) * 1000, rows, failed=failed)
+
+    async def _query(
+        self,
+        name: str,
+        query: str,
+        named_params: Dict[str, Any] = None,
+        prepared: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Run a N1QL query and collect its rows without blocking the event loop."""
+        return [row async for row in self._stream(name, query, named_params, prepared)]
+
+    def query_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get per-statement call counts, row counts and latencies."""
+        return self._query_metrics.snapshot()
+
+    @staticmethod
+    async def _get_value(collection, key: str) -> Optional[Dict[str, Any]]:
+        """Get a document's content, or None if it doesn't exist."""
+        try:
+            result = await collection.get(key)
+        except DocumentNotFoundException:
+            return None
+
+        if not result or not hasattr(result, 'value') or not result.value:
+            return None
+
+        return result.value
+
+    async def _cached_read(self, collection, coll_name: str, key: str, probe_path: str) -> Optional[tuple[Dict[str, Any], int]]:
+        """
+        Get a document's content through the document cache.
+
+        Fresh entries are served without a round trip. Stale entries are revalidated
+        with a sub-document lookup that only returns the CAS, and re-read in full only
+        if the document changed since it was cached.
+
+        Args:
+            collection: The collection to read from
+            coll_name: The collection name, part of the cache key
+            key: The document key
+            probe_path: A path present in the document, used for the CAS lookup
+
+        Returns:
+            A copy of the document content and its CAS, or None if it doesn't exist
+        """
+        cache_key = (coll_name, key)
+        entry = self._doc_cache.get(cache_key)
+
+        try:
+            if entry and not entry.is_fresh:
+                if (await collection.lookup_in(key, [SD.exists(probe_path)])).cas == entry.cas:
+                    self._doc_cache.refresh(cache_key)
+                else:
+                    entry = None
+
+            if not entry:
+                result = await collection.get(key)
+                if not result or not hasattr(result, 'value') or not result.value:
+                    return None
+                self._doc_cache.put(cache_key, result.value, result.cas)
+                return copy.deepcopy(result.value), result.cas
+        except DocumentNotFoundException:
+            self._doc_cache.invalidate(cache_key)
+            return None
+        except Exception as e:
+            self._record_failure(e)
+            raise
+
+        return copy.deepcopy(entry.value), entry.cas
+
+    async def _cached_get(self, collection, coll_name: str, key: str, probe_path: str) -> Optional[Dict[str, Any]]:
+        """Get a document's content through the document cache, see _cached_read."""
+        found = await self._cached_read(collection, coll_name, key, probe_path)
+        return found[0] if found else None
+
+    @staticmethod
+    async def _mutate_fields(collection, key: str, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Write top-level fields of a document with a single sub-document mutation.
+
+        Args:
+            collection: The collection holding the document
+            key: The document key
+            updates: The field values to write
+            cas: Optional CAS the document must still have
+
+        Returns:
+            The document's new CAS, or None if it doesn't exist
+
+        Raises:
+            ConcurrentUpdateError: If the document's CAS no longer matches `cas`
+        """
+        if not updates:
+            raise ValueError("No fields to update")
+
+        specs = [SD.upsert(field, value) for field, value in updates.items()]
+        options = MutateInOptions(cas=cas) if cas else MutateInOptions()
+        try:
+            result = await collection.mutate_in(key, specs, options)
+            return result.cas
+        except DocumentNotFoundException:
+            return None
+        except CasMismatchException:
+            raise ConcurrentUpdateError(f"Document {key} was modified concurrently")
+
+    def _invalidate_employee(self, employee_number: str) -> None:
+        self._doc_cache.invalidate((self.employees_coll, employee_number))
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Get the document cache's size and hit/miss counters."""
+        return self._doc_cache.stats()
+
+    # Employee methods
+    async def create_employee(self, employee_number: str, data: dict) -> str:
+        """
+        Create a new employee.
+
+        Args:
+            employee_number: The employee number (unique identifier)
+            data: The employee document
+
+        Returns:
+            The employee number
+        """
+        await self._require_collections()
+
+        try:
+            await self.employees.upsert(employee_number, data)
+            self._invalidate_employee(employee_number)
+            self._availability.put(employee_number, data)
+            logger.info(f"Created employee with number: {employee_number}")
+            return employee_number
+        except Exception:
+            logger.exception("Failed to create employee")
+            raise
+
+    async def create_employees(self, docs: Dict[str, Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> BulkWriteResult:
+        """
+        Store many employee documents with concurrent upserts, a batch at a time.
+
+        Args:
+            docs: Employee documents by employee number
+            batch_size: Number of upserts in flight at once
+
+        Returns:
+            Per-employee write results
+        """
+        await self._require_collections()
+
+        result = await self._upsert_batches(self.employees, docs, batch_size, "employees")
+        for employee_number in docs:
+            self._invalidate_employee(employee_number)
+        for employee_number in result.succeeded:
+            self._availability.put(employee_number, docs[employee_number])
+        return result
+
+    async def get_employees_by_number(self, employee_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get several employees at once with concurrent (cached) gets.
+
+        Args:
+            employee_numbers: The employee numbers
+
+        Returns:
+            The employees that exist, by employee number
+        """
+        await self._require_collections()
+
+        numbers = list(dict.fromkeys(employee_numbers))
+        results = await asyncio.gather(
+            *(self._cached_get(self.employees, self.employees_coll, number, "name") for number in numbers),
+            return_exceptions=True
+        )
+
+        employees = {}
+        for number, result in zip(numbers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to get employee {number}: {str(result)}")
+            elif result:
+                employees[number] = result
+        return employees
+
+    async def get_employee(self, employee_number: str) -> Optional[Dict[str, Any]]:
+        """
+        Get an employee by employee number.
+
+        Args:
+            employee_number: The employee number
+
+        Returns:
+            The employee details or None if not found
+        """
+        await self._require_collections()
+
+        try:
+            return await self._cached_get(self.employees, self.employees_coll, employee_number, "name")
+        except Exception as e:
+            logger.warning(f"Failed to get employee: {str(e)}")
+            return None
+
+    async def get_employee_with_cas(self, employee_number: str) -> tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Get an employee and the CAS to pass back for an optimistic update.
+
+        Args:
+            employee_number: The employee number
+
+        Returns:
+            The employee details and CAS, or (None, None) if not found
+        """
+        await self._require_collections()
+
+        try:
+            return await self._cached_read(self.employees, self.employees_coll, employee_number, "name") or (None, None)
+        except Exception as e:
+            logger.warning(f"Failed to get employee: {str(e)}")
+            return None, None
+
+    async def get_employees(self, limit: int = None, after: str = None) -> List[Dict[str, Any]]:
+        """
+        Get employees ordered by employee number.
+
+        Args:
+            limit: Optional maximum number of employees to return
+            after: Optional cursor of the last employee on the previous page
+
+        Returns:
+            List of employees
+        """
+        return [row async for row in self.stream_employees(limit, after)]
+
+    async def stream_employees(self, limit: int = None, after: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Like get_employees, but yields employees as the query produces them."""
+        # Fail fast if the collections or the query service aren't available
+        await self._require_query_service()
+
+        query, named_params = employees_query(self, limit, after)
+        try:
+            async for row in self._stream("employees", query, named_params):
+                yield row
+        except Exception:
+            logger.exception("Failed to get employees.")
+            raise
+
+    async def get_roster(self) -> List[Dict[str, Any]]:
+        """
+        Get the fields of every employee needed for scheduling analysis, with one index-only scan.
+
+        Returns:
+            List of employees with name, employee_number, first_line_support_count and known_absences
+        """
+        # Fail fast if the collections or the query service aren't available
+        await self._require_query_service()
+
+        query, named_params = roster_query(self)
+        try:
+            return await self._query("roster", query, named_params)
+        except Exception:
+            logger.exception("Failed to get roster.")
+            raise
+
+    async def get_planning_roster(self) -> List[Dict[str, Any]]:
+        """
+        Get the fields of every employee the shift solver needs, with one index-only scan.
+
+        Returns:
+            List of employees with employee_number, certifications and known_absences
+        """
+        # Fail fast if the collections or the query service aren't available
+        await self._require_query_service()
+
+        query, named_params = planning_roster_query(self)
+        try:
+            return await self._query("planning_roster", query, named_params)
+        except Exception:
+            logger.exception("Failed to get planning roster.")
+            raise
+
+    async def _load_availability(self) -> None:
+        """Build the availability index from the planning roster."""
+        try:
+            self._availability.build(await self.get_planning_roster())
+            logger.info("Built the availability index")
+        except Exception as e:
+            logger.warning(f"Failed to build the availability index: {str(e)}")
+
+    async def get_availability(self, start: str, end: str, role: Optional[str] = None) -> Dict[str, int]:
+        """
+        Get who can work within a window, from the availability index.
+
+        The index is rebuilt first when it is older than its TTL, to pick up employee
+        writes made by other processes.
+
+        Args:
+            start: First date (YYYY-MM-DD)
+            end: Last date, included
+            role: Optional role the employees must be eligible for
+
+        Returns:
+            Bitmap of the available days in the window by employee number, see AvailabilityIndex.available
+        """
+        if self._availability.is_stale:
+            await self._require_query_service()
+            await self._load_availability()
+
+        return self._availability.available(start, end, role)
+
+    async def update_employee(self, employee_number: str, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Update an employee's fields in place, without reading the document first.
+
+        Args:
+            employee_number: The employee number
+            updates: The fields to update
+            cas: Optional CAS the employee must still have (optimistic concurrency)
+
+        Returns:
+            The employee's new CAS if the update was successful, None otherwise
+
+        Raises:
+            ConcurrentUpdateError: If the employee changed since `cas`
+        """
+        await self._require_collections()
+
+        try:
+            new_cas = await self._mutate_fields(self.employees, employee_number, updates, cas)
+            self._invalidate_employee(employee_number)
+            if new_cas:
+                self._availability.update(employee_number, updates)
+                logger.info(f"Updated employee {employee_number}")
+            return new_cas
+        except ConcurrentUpdateError:
+            raise
+        except Exception:
+            logger.exception("Failed to update employee")
+            return None
+
+    async def delete_employee(self, employee_number: str) -> bool:
+        """
+        Delete an employee.
+
+        Args:
+            employee_number: The employee number
+
+        Returns:
+            True if the employee was deleted, False otherwise
+        """
+        await self._require_collections()
+
+        try:
+            await self.employees.remove(employee_number)
+            self._invalidate_employee(employee_number)
+            self._availability.remove(employee_number)
+            logger.info(f"Deleted employee {employee_number}")
+            return True
+        except DocumentNotFoundException:
+            return False
+        except Exception:
+            logger.exception("Failed to delete employee")
+            return False
+
+    # Schedule methods
+    async def create_schedule(self, date_str: str, employee_number: str) -> str:
+        """
+        Create a schedule entry.
+
+        Args:
+            date_str: The date in ISO format (YYYY-MM-DD)
+            employee_number: The employee number for first-line support
+
+        Returns:
+            The schedule ID (date string)
+        """
+        await self._require_collections()
+
+        doc = {
+            "date": date_str,
+            "first_line_support": employee_number
+        }
+
+        try:
+            # The upsert may replace an existing assignment for the same date
+            previous = await self.get_schedule(date_str)
+
+            await self.schedules.upsert(date_str, doc)
+            logger.info(f"Created schedule for date: {date_str}")
+
+            # Move the first-line support count to the new assignee
+            if previous:
+                await self._adjust_support_count(previous.get("first_line_support"), -1)
+            await self._adjust_support_count(employee_number, 1)
+
+            return date_str
+        except Exception:
+            logger.exception("Failed to create schedule")
+            raise
+
+    async def get_schedule(self, date_str: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a schedule by date.
+
+        Args:
+            date_str: The date in ISO format (YYYY-MM-DD)
+
+        Returns:
+            The schedule details or None if not found
+        """
+        await self._require_collections()
+
+        try:
+            return await self._get_value(self.schedules, date_str)
+        except Exception as e:
+            logger.warning(f"Failed to get schedule: {str(e)}")
+            return None
+
+    async def get_schedules(
+        self,
+        start_date: str = None,
+        end_date: str = None,
+        limit: int = None,
+        after: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get schedules within a date range.
+
+        Args:
+            start_date: Optional start date in ISO format (inclusive)
+            end_date: Optional end date in ISO format (inclusive)
+            limit: Optional maximum number of schedules to return
+            after: Optional cursor of the last schedule on the previous page
+
+        Returns:
+            List of schedules
+        """
+        return [row async for row in self.stream_schedules(start_date, end_date, limit, after)]
+
+    async def stream_schedules(
+        self,
+        start_date: str = None,
+        end_date: str = None,
+        limit: int = None,
+        after: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Like get_schedules, but yields schedules as the query produces them."""
+        # Fail fast if the collections or the query service aren't available
+        await self._require_query_service()
+
+        query, named_params = schedules_query(self, start_date, end_date, limit, after)
+        try:
+            async for row in self._stream("schedules", query, named_params):
+                yield row
+        except Exception:
+            logger.exception("Failed to get schedules.")
+            raise
+
+    async def update_schedule(self, date_str: str, employee_number: str) -> bool:
+        """
+        Update a schedule entry.
+
+        Args:
+            date_str: The date in ISO format (YYYY-MM-DD)
+            employee_number: The new employee number for first-line support
+
+        Returns:
+            True if the update was successful, False otherwise
+        """
+        await self._require_collections()
+
+        try:
+            schedule = await self.get_schedule(date_str)
+            if not schedule:
+                return False
+
+            previous_employee = schedule.get("first_line_support")
+            schedule["first_line_support"] = employee_number
+            await self.schedules.upsert(date_str, schedule)
+            logger.info(f"Updated schedule for date {date_str}")
+
+            # Update employee counts
+            if previous_employee != employee_number:
+                await self._adjust_support_count(previous_employee, -1)
+                await self._adjust_support_count(employee_number, 1)
+
+            return True
+        except Exception:
+            logger.exception("Failed to update schedule")
+            return False
+
+    async def delete_schedule(self, date_str: str) -> bool:
+        """
+        Delete a schedule entry.
+
+        Args:
+            date_str: The date in ISO format (YYYY-MM-DD)
+
+        Returns:
+            True if the schedule was deleted, False otherwise
+        """
+        await self._require_collections()
+
+        try:
+            schedule = await self.get_schedule(date_str)
+            if not schedule:
+                return False
+
+            await self.schedules.remove(date_str)
+            logger.info(f"Deleted schedule for date {date_str}")
+
+            # Update employee counts
+            await self._adjust_support_count(schedule.get("first_line_support"), -1)
+
+            return True
+        except Exception:
+            logger.exception("Failed to delete schedule")
+            return False
+
+    async def _adjust_support_count(self, employee_number: Optional[str], delta: int) -> None:
+        """
+        Atomically adjust an employee's first-line support count.
+
+        Args:
+            employee_number: The employee number, ignored if empty
+            delta: The amount to add (negative to subtract)
+        """
+        if not employee_number or not delta:
+            return
+
+        spec = SD.increment("first_line_support_count", delta) if delta > 0 \
+            else SD.decrement("first_line_support_count", -delta)
+
+        try:
+            await self.employees.mutate_in(employee_number, [spec])
+            self._invalidate_employee(employee_number)
+        except DocumentNotFoundException:
+            logger.warning(f"Cannot adjust support count, employee {employee_number} not found")
+        except Exception:
+            logger.exception(f"Failed to adjust support count for employee {employee_number}")
+
+    async def recount_employee_counts(self) -> Dict[str, int]:
+        """
+        Recompute first-line support counts for all employees from the schedules.
+
+        Returns:
+            The recomputed counts by employee number
+        """
+        await self._require_collections()
+
+        emp_counts = {emp["employee_number"]: 0 for emp in await self.get_employees()}
+        for schedule in await self.get_schedules():
+            emp_id = schedule["first_line_support"]
+            emp_counts[emp_id] = emp_counts.get(emp_id, 0) + 1
+
+        async def store(emp_id: str, count: int) -> None:
+            try:
+                await self.employees.mutate_in(emp_id, [SD.upsert("first_line_support_count", count)])
+                self._invalidate_employee(emp_id)
+            except DocumentNotFoundException:
+                logger.warning(f"Schedules reference unknown employee {emp_id}")
+
+        await asyncio.gather(*(store(emp_id, count) for emp_id, count in emp_counts.items()))
+
+        logger.info("Recounted employee first-line support counts")
+        return emp_counts
+
+    async def _check_plan_overlaps(self, shifts: List[Dict[str, Any]], shift_deletes: List[str]) -> None:
+        """
+        Check that storing a plan's shifts double-books no one, see apply_plan.
+
+        Each employee's stored shifts, minus the ones the plan rewrites or deletes, are
+        checked together with the plan's shifts; overlaps among stored shifts alone
+        don't count.
+
+        Raises:
+            ShiftConflictError: If a plan shift overlaps another shift of its employee
+        """
+        planned = defaultdict(list)
+        for doc in shifts:
+            interval = shift_interval(doc)
+            if interval is None:
+                raise ValueError(f"Invalid times for shift {doc['shift_id']}: {doc.get('start')} to {doc.get('end')}")
+            planned[doc["employee_number"]].append(interval)
+        if not planned:
+            return
+
+        replaced = {doc["shift_id"] for doc in shifts} | set(shift_deletes)
+        employees = list(planned)
+        loaded = await asyncio.gather(*(self._employee_intervals(number) for number in employees))
+        for employee_number, stored in zip(employees, loaded):
+            kept = [interval for interval in stored if interval[2] not in replaced]
+            for first, second in EmployeeIntervals(kept + planned[employee_number]).conflicts():
+                if first[2] in replaced:
+                    raise self._conflict(employee_number, second)
+                if second[2] in replaced:
+                    raise self._conflict(employee_number, first)
+
+    async def apply_plan(
+        self,
+        schedules: Dict[str, str],
+        shifts: List[Dict[str, Any]] = None,
+        shift_deletes: List[str] = None
+    ) -> Dict[str, int]:
+        """
+        Apply a set of schedule and shift changes in one multi-document transaction.
+
+        Either every change is committed or none is. First-line support counts are
+        adjusted inside the same transaction, once per employee by the net change.
+
+        Args:
+            schedules: First-line support employee number by date (YYYY-MM-DD)
+            shifts: Shift documents to store, each with a shift_id
+            shift_deletes: Ids of shifts to remove, missing ones are ignored
+
+        Returns:
+            The net first-line support count change by employee number
+
+        Raises:
+            ShiftConflictError: If a shift would overlap another shift of the same employee, nothing was applied
+            ValueError: If a shift's times are invalid, nothing was applied
+            TransactionFailed: If the transaction couldn't commit, nothing was applied
+        """
+        await self._require_collections()
+
+        shifts = shifts or []
+        shift_deletes = shift_deletes or []
+        deltas: Dict[str, int] = {}
+
+        async def upsert(ctx, collection, key: str, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            """Write a document in the transaction, returning what it replaced."""
+            try:
+                current = await ctx.get(collection, key)
+            except DocumentNotFoundException:
+                await ctx.insert(collection, key, doc)
+                return None
+            previous = current.content_as[dict]
+            await ctx.replace(current, doc)
+            return previous
+
+        async def txn_logic(ctx):
+            # Attempts can be retried, so start over each time
+            deltas.clear()
+
+            for date_str, employee_number in schedules.items():
+                previous = await upsert(ctx, self.schedules, date_str, {"date": date_str, "first_line_support": employee_number})
+                previous_number = previous.get("first_line_support") if previous else None
+                if previous_number != employee_number:
+                    deltas[employee_number] = deltas.get(employee_number, 0) + 1
+                    if previous_number:
+                        deltas[previous_number] = deltas.get(previous_number, 0) - 1
+
+            for employee_number, delta in deltas.items():
+                if not delta:
+                    continue
+                try:
+                    current = await ctx.get(self.employees, employee_number)
+                except DocumentNotFoundException:
+                    logger.warning(f"Cannot adjust support count, employee {employee_number} not found")
+                    continue
+                employee = current.content_as[dict]
+                employee["first_line_support_count"] = employee.get("first_line_support_count", 0) + delta
+                await ctx.replace(current, employee)
+
+            for doc in shifts:
+                await upsert(ctx, self.shifts, doc["shift_id"], doc)
+
+            for shift_id in shift_deletes:
+                try:
+                    current = await ctx.get(self.shifts, shift_id)
+                except DocumentNotFoundException:
+                    continue
+                await ctx.remove(current)
+
+        async with self._interval_locks({doc["employee_number"] for doc in shifts}):
+            await self._check_plan_overlaps(shifts, shift_deletes)
+            try:
+                await self.cluster.transactions.run(txn_logic)
+            except Exception:
+                logger.exception("Failed to apply plan, no changes were made")
+                raise
+            finally:
+                for employee_number in deltas:
+                    self._invalidate_employee(employee_number)
+                if shifts or shift_deletes:
+                    self._intervals.clear()
+
+        logger.info(f"Applied plan: {len(schedules)} schedules, {len(shifts)} shifts stored, {len(shift_deletes)} shifts removed")
+        return {employee_number: delta for employee_number, delta in deltas.items() if delta}
+
+    # Rules methods
+    async def get_rules(self) -> Dict[str, Any]:
+        """
+        Get the scheduling system rules.
+
+        Returns:
+            The rules
+        """
+        rules, _ = await self.get_rules_with_cas()
+        return rules
+
+    async def get_rules_with_cas(self) -> tuple[Dict[str, Any], Optional[int]]:
+        """
+        Get the scheduling system rules and the CAS to pass back for an optimistic update.
+
+        Returns:
+            The rules and their CAS; the default rules and None if they couldn't be read
+        """
+        await self._require_collections()
+
+        try:
+            found = await self._cached_read(self.rules, self.rules_coll, "system_rules", "max_days_per_week")
+            if not found:
+                # Initialize default rules if not found
+                await self._init_default_rules()
+                found = await self._cached_read(self.rules, self.rules_coll, "system_rules", "max_days_per_week")
+
+            return found or (dict(DEFAULT_RULES), None)
+        except Exception as e:
+            logger.warning(f"Failed to get rules: {str(e)}")
+            # Return default rules
+            return dict(DEFAULT_RULES), None
+
+    async def update_rules(self, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Update the scheduling system rules in place, without reading them first.
+
+        Args:
+            updates: The rule fields to update, None values are ignored
+            cas: Optional CAS the rules must still have (optimistic concurrency)
+
+        Returns:
+            The rules' new CAS if the update was successful, None otherwise
+
+        Raises:
+            ConcurrentUpdateError: If the rules changed since `cas`
+        """
+        await self._require_collections()
+
+        # Only update provided fields
+        updates = {key: value for key, value in updates.items() if value is not None}
+
+        try:
+            new_cas = await self._mutate_fields(self.rules, "system_rules", updates, cas)
+            if new_cas is None and cas is None:
+                # Rules document is missing, recreate the defaults and apply on top
+                await self._init_default_rules()
+                new_cas = await self._mutate_fields(self.rules, "system_rules", updates)
+
+            self._doc_cache.invalidate((self.rules_coll, "system_rules"))
+            if new_cas:
+                logger.info("Updated scheduling rules")
+            return new_cas
+        except ConcurrentUpdateError:
+            raise
+        except Exception:
+            logger.exception("Failed to update rules")
+            return None
+
+    # Shift methods
+    async def _employee_intervals(self, employee_number: str, refresh: bool = False) -> EmployeeIntervals:
+        """Get an employee's shift intervals, loading them with a shifts query unless indexed."""
+        intervals = None if refresh else self._intervals.get(employee_number)
+        if intervals is None:
+            await self._require_query_service()
+            # Overlap checks can't miss a shift written just before, so wait for the index
+            query, named_params = shifts_query(self, employee_number=employee_number)
+            shifts = [shift async for shift in self._stream("shift_intervals", query, named_params, consistent=True)]
+            intervals = EmployeeIntervals(filter(None, map(shift_interval, shifts)))
+            self._intervals.put(employee_number, intervals)
+        return intervals
+
+    @staticmethod
+    def _conflict(employee_number: str, other: tuple) -> ShiftConflictError:
+        other_start, other_end, other_id = other
+        return ShiftConflictError(
+            f"Employee {employee_number} already works shift {other_id} "
+            f"from {minutes_to_shift_time(other_start)} to {minutes_to_shift_time(other_end)}"
+        )
+
+    async def _check_overlap(self, employee_number: str, start: int, end: int, ignore: str = None) -> EmployeeIntervals:
+        """
+        Check that an employee has no shift overlapping [start, end) in epoch minutes.
+
+        Returns:
+            The employee's intervals, to add the new shift to once written
+
+        Raises:
+            ShiftConflictError: If a shift other than `ignore` overlaps
+        """
+        intervals = await self._employee_intervals(employee_number)
+        overlaps = intervals.overlapping(start, end, ignore)
+        if overlaps:
+            raise self._conflict(employee_number, overlaps[0])
+        return intervals
+
+    @asynccontextmanager
+    async def _interval_locks(self, employee_numbers: Iterable[str]):
+        """
+        Hold the locks serializing the overlap checks and shift writes of some employees.
+
+        Employees share a fixed set of lock stripes, taken in order so batches over
+        several employees can't deadlock.
+        """
+        stripes = sorted({hash(number) % len(self._interval_stripes) for number in employee_numbers if number})
+        async with AsyncExitStack() as stack:
+            for stripe in stripes:
+                await stack.enter_async_context(self._interval_stripes[stripe])
+            yield
+
+    async def create_shift(self, employee_number: str, start: str, end: str, type: str) -> str:
+        """
+        Create a shift in the first free slot for its hour and type.
+
+        Args:
+            employee_number: The employee number
+            start: Start time ("YYYY-MM-DD HH-MM")
+            end: End time ("YYYY-MM-DD HH-MM")
+            type: The shift type (cleaning, line1 etc.)
+
+        Returns:
+            The shift id (its slot key)
+
+        Raises:
+            ValueError: If the shift doesn't fit the slot grid, its times are invalid or all its slots are taken
+            ShiftConflictError: If the employee already has a shift overlapping it
+        """
+        await self._require_collections()
+
+        fields = shift_interval_fields(start, end)
+        async with self._interval_locks([employee_number]):
+            intervals = await self._check_overlap(employee_number, fields["start_minute"], fields["end_minute"])
+
+            for key in shift_slot_keys(start, type):
+                doc = new_shift_doc(employee_number, start, end, type, key)
+                try:
+                    await self.shifts.insert(key, doc)
+                    intervals.add(fields["start_minute"], fields["end_minute"], key)
+                    logger.info(f"Created shift with id: {key}")
+                    return key
+                except DocumentExistsException:
+                    continue
+                except Exception:
+                    logger.exception("Failed to create shift")
+                    raise
+
+        raise ValueError(f"All {type} slots starting {start} are taken")
+
+    async def get_shift_conflicts(self, employee_number: str) -> List[tuple]:
+        """
+        Get an employee's overlapping shifts, from freshly loaded intervals.
+
+        Returns:
+            Pairs of overlapping (start_minute, end_minute, shift_id) intervals, ordered by start
+        """
+        intervals = await self._employee_intervals(employee_number, refresh=True)
+        return intervals.conflicts()
+
+    async def get_shift(self, shift_id: str) -> Optional[Dict[str, Any]]:
+        await self._require_collections()
+
+        try:
+            return await self._get_value(self.shifts, shift_id)
+        except Exception as e:
+            logger.warning(f"Failed to get shift: {str(e)}")
+            return None
+
+    async def get_shift_with_cas(self, shift_id: str) -> tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Get a shift and the CAS to pass back for an optimistic update.
+
+        Returns:
+            The shift and its CAS, or (None, None) if not found
+        """
+        await self._require_collections()
+
+        try:
+            result = await self.shifts.get(shift_id)
+            return result.value, result.cas
+        except DocumentNotFoundException:
+            return None, None
+        except Exception as e:
+            logger.warning(f"Failed to get shift: {str(e)}")
+            return None, None
+
+    async def get_day_shifts(self, date: str) -> List[Dict[str, Any]]:
+        """
+        Get a day's shifts with concurrent gets of its slot keys, without the query service.
+
+        Args:
+            date: The date in ISO format (YYYY-MM-DD)
+
+        Returns:
+            List of shifts ordered by start time
+        """
+        await self._require_collections()
+
+        keys = day_shift_keys(date)
+        results = await asyncio.gather(*(self.shifts.get(key) for key in keys), return_exceptions=True)
+
+        shifts = []
+        for key, result in zip(keys, results):
+            if isinstance(result, DocumentNotFoundException):
+                continue
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to get shift {key}: {str(result)}")
+                continue
+            shifts.append(result.value)
+        return shifts
+
+    async def get_shifts(
+        self,
+        start: str = None,
+        end: str = None,
+        employee_number: str = None,
+        type: str = None,
+        limit: int = None,
+        after: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get shifts, optionally within a time window and for one employee or shift type.
+
+        Args:
+            start: Optional window start ("YYYY-MM-DD HH-MM" or "YYYY-MM-DD"), shifts ending after it match
+            end: Optional window end, shifts starting before it match
+            employee_number: Optional employee number
+            type: Optional shift type (cleaning, line1 etc.)
+            limit: Optional maximum number of shifts to return
+            after: Optional cursor of the last shift on the previous page
+
+        Returns:
+            List of shifts ordered by start time
+        """
+        return [row async for row in self.stream_shifts(start, end, employee_number, type, limit, after)]
+
+    async def stream_shifts(
+        self,
+        start: str = None,
+        end: str = None,
+        employee_number: str = None,
+        type: str = None,
+        limit: int = None,
+        after: str = None,
+        with_cas: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Like get_shifts, but yields shifts as the query produces them; with_cas adds each one's CAS as `cas`."""
+        # Fail fast if the collections or the query service aren't available
+        await self._require_query_service()
+
+        query, named_params = shifts_query(self, start, end, employee_number, type, limit, after, with_cas)
+        try:
+            async for row in self._stream("shifts", query, named_params):
+                yield row
+        except Exception:
+            logger.exception("Failed to get shifts.")
+            raise
+
+    async def update_shift(self, shift_id: str, updates: Dict[str, Any], cas: Optional[int] = None) -> Optional[int]:
+        """
+        Update a shift's fields in place.
+
+        The shift is only read first when the update changes its employee or times,
+        to check the result against the employee's other shifts.
+
+        Args:
+            shift_id: The shift id
+            updates: The fields to update
+            cas: Optional CAS the shift must still have (optimistic concurrency)
+
+        Returns:
+            The shift's new CAS if the update was successful, None otherwise
+
+        Raises:
+            ConcurrentUpdateError: If the shift changed since `cas`
+            ValueError: If the updates would move the shift to another slot, or its times are invalid
+            ShiftConflictError: If the employee already has another shift overlapping it
+        """
+        await self._require_collections()
+
+        check_shift_slot(shift_id, updates)
+        # The epoch-minute fields are derived from the display times, never taken as given
+        updates = {field: value for field, value in updates.items() if field not in ("start_minute", "end_minute")}
+
+        if not {"employee_number", "start", "end"} & updates.keys():
+            return await self._write_shift(shift_id, updates, cas)
+
+        current = await self._get_value(self.shifts, shift_id)
+        if current is None:
+            return None
+        shift = {**current, **updates}
+        updates = {**updates, **shift_interval_fields(shift["start"], shift["end"])}
+        employee_number = shift["employee_number"]
+
+        async with self._interval_locks([employee_number, current.get("employee_number")]):
+            intervals = await self._check_overlap(employee_number, updates["start_minute"], updates["end_minute"], shift_id)
+            new_cas = await self._write_shift(shift_id, updates, cas)
+            if new_cas:
+                intervals.add(updates["start_minute"], updates["end_minute"], shift_id)
+                if current.get("employee_number") != employee_number:
+                    self._intervals.discard(shift_id, current.get("employee_number"))
+            return new_cas
+
+    async def _write_shift(self, shift_id: str, updates: Dict[str, Any], cas: Optional[int]) -> Optional[int]:
+        """Write a shift update, see update_shift."""
+        try:
+            new_cas = await self._mutate_fields(self.shifts, shift_id, updates, cas)
+            if new_cas:
+                logger.info(f"Updated shift {shift_id}")
+            return new_cas
+        except ConcurrentUpdateError:
+            raise
+        except Exception:
+            logger.exception("Failed to update shift")
+            return None
+
+    async def delete_shift(self, shift_id: str) -> bool:
+        await self._require_collections()
+
+        try:
+            await self.shifts.remove(shift_id)
+            self._intervals.discard(shift_id)
+            logger.info(f"Deleted shift {shift_id}")
+            return True
+        except DocumentNotFoundException:
+            return False
+        except Exception:
+            logger.exception("Failed to delete shift")
+            return False
+
+    async def apply_shift_ops(self, ops: List[Dict[str, Any]]) -> tuple[List[BulkItemResult], List[Dict[str, Any]]]:
+        """
+        Apply a batch of shift creates, updates and deletes with a few waves of concurrent writes.
+
+        Runs under the interval locks of every employee involved. Deletes go first so
+        their slots and times can be reused by the same batch, then updates, then creates,
+        which take the first slot free after both. Creates and updates that change an
+        employee or times are checked for overlaps with the employee's other shifts,
+        freshly loaded after the deletes, and with earlier ops in the batch. Each op
+        succeeds or fails on its own.
+
+        Args:
+            ops: Operations, each with an "op" of "create" (employee_number, start, end, type),
+                "update" (shift_id and the fields to change) or "delete" (shift_id), and
+                optionally a "ref" reported as the id of creates that fail before getting a key
+
+        Returns:
+            One result per op in input order, and the created and updated shifts
+        """
+        await self._require_collections()
+
+        results: List[Optional[BulkItemResult]] = [None] * len(ops)
+
+        def settle(index: int, shift_id: str, outcome) -> None:
+            error = str(outcome) if isinstance(outcome, Exception) else None
+            results[index] = BulkItemResult(id=shift_id, success=error is None, error=error)
+
+        # Deletes: the shifts are read first, to lock and reindex their employees
+        deletes = [(i, op["shift_id"]) for i, op in enumerate(ops) if op["op"] == "delete"]
+
+        # Updates: the ones changing an employee or times are read first, to check the result
+        updates = []
+        for i, op in enumerate(ops):
+            if op["op"] != "update":
+                continue
+            fields = {
+                field: value for field, value in op.items()
+                if field not in ("op", "ref", "shift_id", "start_minute", "end_minute")
+            }
+            try:
+                check_shift_slot(op["shift_id"], fields)
+            except ValueError as e:
+                settle(i, op["shift_id"], e)
+                continue
+            updates.append((i, op["shift_id"], fields))
+        moving = [update for update in updates if {"employee_number", "start", "end"} & update[2].keys()]
+        reads = await asyncio.gather(
+            *(self._get_value(self.shifts, key) for key in [key for _, key in deletes] + [key for _, key, _ in moving]),
+            return_exceptions=True
+        )
+        deleted, currents = reads[:len(deletes)], reads[len(deletes):]
+
+        # Deletes to run: (op index, shift id, employee number if known)
+        removals = []
+        for (i, key), current in zip(deletes, deleted):
+            if current is None:
+                settle(i, key, LookupError(f"Shift with id {key} not found"))
+                continue
+            removals.append((i, key, None if isinstance(current, Exception) else current.get("employee_number")))
+
+        # Timed writes to check: (op index, shift id, employee number, previous employee number, fields)
+        checks = []
+        for (i, key, fields), current in zip(moving, currents):
+            if current is None:
+                settle(i, key, LookupError(f"Shift with id {key} not found"))
+                continue
+            if isinstance(current, Exception):
+                settle(i, key, current)
+                continue
+            shift = {**current, **fields}
+            try:
+                fields.update(shift_interval_fields(shift["start"], shift["end"]))
+            except ValueError as e:
+                settle(i, key, e)
+                continue
+            checks.append((i, key, shift["employee_number"], current.get("employee_number"), fields))
+
+        creates = []
+        for i, op in enumerate(ops):
+            if op["op"] != "create":
+                continue
+            try:
+                shift_interval_fields(op["start"], op["end"])
+                creates.append((i, op, shift_slot_keys(op["start"], op["type"])))
+            except ValueError as e:
+                settle(i, op.get("ref", f"op {i}"), e)
+
+        employees = (
+            {check[2] for check in checks} | {check[3] for check in checks if check[3]}
+            | {op["employee_number"] for _, op, _ in creates} | {removal[2] for removal in removals if removal[2]}
+        )
+        async with self._interval_locks(employees):
+            # Deletes go first so creates and updates can take their slots and times
+            outcomes = await asyncio.gather(*(self.shifts.remove(key) for _, key, _ in removals), return_exceptions=True)
+            for (i, key, employee_number), outcome in zip(removals, outcomes):
+                if isinstance(outcome, DocumentNotFoundException):
+                    outcome = LookupError(f"Shift with id {key} not found")
+                elif not isinstance(outcome, Exception):
+                    self._intervals.discard(key, employee_number)
+                settle(i, key, outcome)
+
+            # Creates: probe every candidate slot at once, then claim the free ones
+            candidates = list(dict.fromkeys(key for _, _, keys in creates for key in keys))
+            probes = await asyncio.gather(*(self.shifts.exists(key) for key in candidates), return_exceptions=True)
+            taken = {key for key, probe in zip(candidates, probes) if isinstance(probe, Exception) or probe.exists}
+
+            claims = {}
+            for i, op, keys in creates:
+                key = next((key for key in keys if key not in taken), None)
+                if key is None:
+                    settle(i, op.get("ref", f"op {i}"), ValueError(f"All {op['type']} slots starting {op['start']} are taken"))
+                    continue
+                taken.add(key)
+                doc = new_shift_doc(op["employee_number"], op["start"], op["end"], op["type"], key)
+                claims[i] = doc
+                checks.append((i, key, doc["employee_number"], None, doc))
+            checks.sort(key=lambda check: check[0])
+
+            # Check in op order against the stored shifts, after the deletes, and the ops accepted before
+            checked = list({check[2] for check in checks} | {check[3] for check in checks if check[3]})
+            loaded = await asyncio.gather(*(self._employee_intervals(number, refresh=True) for number in checked))
+            intervals = dict(zip(checked, loaded))
+            for i, key, employee_number, previous, fields in checks:
+                overlaps = intervals[employee_number].overlapping(fields["start_minute"], fields["end_minute"], key)
+                if overlaps:
+                    settle(i, key, self._conflict(employee_number, overlaps[0]))
+                    claims.pop(i, None)
+                    continue
+                if previous and previous != employee_number:
+                    intervals[previous].remove(key)
+                intervals[employee_number].add(fields["start_minute"], fields["end_minute"], key)
+
+            writes = [(i, key, fields) for i, key, fields in updates if results[i] is None]
+            outcomes = await asyncio.gather(
+                *(self._mutate_fields(self.shifts, key, fields) for _, key, fields in writes),
+                return_exceptions=True
+            )
+            for (i, key, _), outcome in zip(writes, outcomes):
+                settle(i, key, LookupError(f"Shift with id {key} not found") if outcome is None else outcome)
+
+            outcomes = await asyncio.gather(
+                *(self.shifts.insert(doc["shift_id"], doc) for doc in claims.values()),
+                return_exceptions=True
+            )
+            for (i, doc), outcome in zip(claims.items(), outcomes):
+                settle(i, doc["shift_id"], outcome)
+
+            # The checks added the accepted ops, failed writes included; reload from what was stored
+            for number in checked:
+                self._intervals.invalidate(number)
+
+        # Read back the shifts that were written
+        written = [item.id for item, op in zip(results, ops) if item.success and op["op"] != "delete"]
+        shifts = await asyncio.gather(*(self._get_value(self.shifts, key) for key in written), return_exceptions=True)
+
+        failed = sum(1 for item in results if not item.success)
+        logger.info(f"Applied {len(ops) - failed} shift operations, {failed} failed")
+        return results, [shift for shift in shifts if shift and not isinstance(shift, Exception)]
+
+    async def create_shifts(self, docs: List[Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> BulkWriteResult:
+        """
+        Store many shift documents with concurrent upserts, a batch at a time.
+
+        A failing document doesn't stop the rest of the batch; failures are reported
+        per shift in the result instead.
+
+        Args:
+            docs: Shift documents, each with a shift_id
+            batch_size: Number of upserts in flight at once
+
+        Returns:
+            Per-shift write results
+        """
+        await self._require_collections()
+
+        result = await self._upsert_batches(self.shifts, {doc["shift_id"]: doc for doc in docs}, batch_size, "shifts")
+        self._intervals.clear()
+        return result
+
+    async def _upsert_batches(self, collection, docs: Dict[str, Dict[str, Any]], batch_size: int, label: str) -> BulkWriteResult:
+        """
+        Upsert documents by key with concurrent upserts, a batch at a time.
+
+        A failing document doesn't stop the rest of the batch; failures are reported
+        per document in the result instead.
+        """
+        keys = list(docs)
+        results = []
+        for offset in range(0, len(keys), batch_size):
+            batch = keys[offset:offset + batch_size]
+            outcomes = await asyncio.gather(
+                *(collection.upsert(key, docs[key]) for key in batch),
+                return_exceptions=True
+            )
+            for outcome in outcomes:
+                if isinstance(outcome, Exception):
+                    self._record_failure(outcome)
+            results.extend(
+                BulkItemResult(
+                    id=key,
+                    success=not isinstance(outcome, Exception),
+                    error=str(outcome) if isinstance(outcome, Exception) else None
+                )
+                for key, outcome in zip(batch, outcomes)
+            )
+
+        result = BulkWriteResult(results=results)
+        if result.failed:
+            logger.warning(f"Stored {len(result.succeeded)} {label}, {len(result.failed)} failed")
+        else:
+            logger.info(f"Stored {len(result.succeeded)} {label}")
+        return result
+
+    async def create_daily_shifts(self, date: str, employee_numbers: List[str]) -> BulkWriteResult:
+        """
+        Create shifts for a day following the daily shift pattern, see daily_shift_roles.
+
+        Args:
+            date: The date in ISO format (YYYY-MM-DD)
+            employee_numbers: Employee numbers to assign, one per slot (at least 5)
+
+        Returns:
+            Per-shift write results
+        """
+        return await self.create_shifts(daily_shift_docs(date, employee_numbers))
+
+    async def close(self) -> None:
+        """Close the database connection."""
+        if self._attempt and not self._attempt.done():
+            self._attempt.cancel()
+            await asyncio.gather(self._attempt, return_exceptions=True)
+        self._state = ClientState.UNINITIALIZED
+        self.scope = None
+        self.employees = None
+        self._is_query_service_ready = False
+        if self.cluster:
+            await self.cluster.close()
+            self.cluster = None
+            logger.info("Database connection closed")
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -1,22 +1,25 @@
+import hashlib
 import json
 import os
+import socket
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import uvicorn
 from opperai import Opper
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
-from typing import Dict, List
+from typing import List, Optional
 
-from .clients.scheduling import SchedulingClient
-from .models import EmployeeInput, HrEvent, Shift
+from .clients.scheduling import SchedulingClient, ServiceUnavailableError
+from .clients.scheduling_async import AsyncSchedulingClient
+from .models import EmployeeInput, HrEvent
+from .planning.parallel import shutdown_pool, warm_pool
 from .routes import router
 from .utils import log
 from . import conf
 
-import uuid
-
 log.init(conf.get_log_level())
 logger = log.get_logger(__name__)
 
@@ -36,6 +39,9 @@ def load_generated_data() -> tuple[list[EmployeeInput], list[HrEvent], list[list
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Start the solver workers now, so the first solve doesn't wait for their interpreters
+    warm_pool()
+
     cb_conf = conf.get_couchbase_conf()
     app.state.db = SchedulingClient(
         url=cb_conf.url,
@@ -44,30 +50,100 @@ async def lifespan(app: FastAPI):
         bucket_name=cb_conf.bucket,
         scope=cb_conf.scope
     )
-    try:
-        app.state.db.connect()
-        logger.info("Connected to Couchbase database")
-
-    except Exception:
-        logger.warning("Couldn't connect to Couchbase - retrying on next request.")
+    app.state.async_db = AsyncSchedulingClient(
+        url=cb_conf.url,
+        username=cb_conf.username,
+        password=cb_conf.password,
+        bucket_name=cb_conf.bucket,
+        scope=cb_conf.scope
+    )
+    # Connect in the background so the app starts serving right away; requests
+    # share its connection attempts and get a 503 while the database is down
+    app.state.connect_task = asyncio.create_task(app.state.async_db.connect_until_ready())
 
-    # Run init_default_data as an async task
-    asyncio.create_task(init_default_data_async(app.state.db))
+    # Run init_default_data as an async task, the blocking client connects from its worker thread
+    app.state.seed_task = asyncio.create_task(init_default_data_async(app.state.db))
     app.state.opper = Opper(api_key=conf.get_opper_api_key())
 
     logger.info("Application initialized")
 
     yield
 
+    app.state.connect_task.cancel()
+    await app.state.async_db.close()
+    shutdown_pool()
+
+
+# Bump when the way demo data is derived from the HR file changes, to seed again
+SEED_VERSION = 1
+# Seconds a worker may hold the seeding lease before another one can take over
+SEED_LEASE_TTL = 300
+# Number of days of seeded shifts remembered in the seed state
+SEED_SHIFT_DAYS_KEPT = 31
+
+
+def seed_fingerprint(hr_file: str) -> str:
+    """Fingerprint of the demo dataset, changes whenever the seeded employees would."""
+    return hashlib.sha256(f"{SEED_VERSION}:{hr_file}".encode()).hexdigest()
+
 
 def init_default_data(db: SchedulingClient):
-    """Initialize default employees and schedules for demo purposes."""
-    # Check if we already have employees
-    # employees = db.get_employees()
+    """
+    Initialize default employees and shifts for demo purposes.
+
+    Runs once per dataset version: the seed state document records the fingerprint of
+    the seeded HR data and the days that got shifts, so warm restarts skip seeding.
+    A cluster-wide lease makes sure only one worker seeds when several start together.
+    """
+    # Wait for the database at startup, later calls fail fast while it's unavailable
+    db.connect()
+
+    fingerprint = seed_fingerprint(conf.hr_file)
+    today_str = datetime.now().date().isoformat()
+
+    state = db.get_seed_state()
+    if state and state.get("fingerprint") == fingerprint and today_str in state.get("shift_dates", []):
+        logger.info("Demo data is up to date, skipping seeding")
+        return
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    lease = db.acquire_lease("seed", owner, SEED_LEASE_TTL)
+    if lease is None:
+        logger.info("Another worker is seeding demo data, skipping")
+        return
 
-    # Define a fixed reference date for absences (January 1, 2024)
-    reference_date = datetime(2024, 1, 1).date()
-    today = datetime.now().date()
+    try:
+        # Read again, the previous holder of the lease may just have finished
+        state = db.get_seed_state() or {}
+        if state.get("fingerprint") != fingerprint:
+            employee_numbers = seed_employees(db)
+            if employee_numbers is None:
+                return
+            state = {"fingerprint": fingerprint, "employee_numbers": employee_numbers, "shift_dates": []}
+        else:
+            logger.info("Default employees are up to date")
+
+        if today_str not in state["shift_dates"]:
+            logger.info(f"Creating default shifts for {today_str}...")
+            result = db.create_daily_shifts(today_str, state["employee_numbers"])
+            if result.failed:
+                logger.warning(f"Failed to create {len(result.failed)} default shifts, will retry on next start")
+                return
+            state["shift_dates"] = sorted(state["shift_dates"] + [today_str])[-SEED_SHIFT_DAYS_KEPT:]
+
+        state["seeded_at"] = datetime.now().isoformat()
+        db.set_seed_state(state)
+    finally:
+        db.release_lease("seed", lease)
+
+
+def seed_employees(db: SchedulingClient) -> Optional[List[str]]:
+    """
+    Store the default employees from the HR file with bulk writes.
+
+    Returns:
+        The employee numbers, or None if some employees couldn't be stored
+    """
     # Load generated data from file if it exists
     try:
         loaded_employees, loaded_hr_events, loaded_performance_reviews = load_generated_data()
@@ -75,100 +151,19 @@ def init_default_data(db: SchedulingClient):
     except Exception as e:
         logger.warning(f"Could not load generated data: {str(e)}")
         loaded_employees = []
-        loaded_hr_events = []
-        loaded_performance_reviews = []
-
-    # Configure absence patterns (every Nth day from the reference date)
-    absence_patterns = {
-        # "EMP001": 3,  # Every 3rd day from reference date
-        # "EMP002": 5,  # Every 5th day from reference date
-        # "EMP004": 7   # Every 7th day from reference date
-    }
-
-    # Create/update employees
-    # default_employees = [
-    #     {"name": "Lars Larsson", "employee_number": "EMP001", "known_absences": []},
-    #     {"name": "Dagobert Dagobertsson", "employee_number": "EMP002", "known_absences": []},
-    #     {"name": "Karl-Gustav Karlgustavsson", "employee_number": "EMP003", "known_absences": []},
-    #     {"name": "Kerstin Kerstinsdotter", "employee_number": "EMP004", "known_absences": []},
-    #     {"name": "Maj-Britt Majbrittdotter", "employee_number": "EMP005", "known_absences": []}
-    # ]
+
     default_employees = [emp.model_dump() for emp in loaded_employees]
 
-    # Generate known absences for the next 30 days
-    # for emp in default_employees:
-    #     employee_id = emp["employee_number"]
-    #     if employee_id in absence_patterns:
-    #         pattern_days = absence_patterns[employee_id]
-    #         absences = []
-    #
-    #         for i in range(30):  # Look ahead 30 days
-    #             check_date = today + timedelta(days=i)
-    #             days_since_reference = (check_date - reference_date).days
-    #
-    #             if days_since_reference % pattern_days == 0:
-    #                 absences.append(check_date.strftime("%Y-%m-%d"))
-    #
-    #         emp["known_absences"] = absences
-
-    # if not employees:
     logger.info("Initializing default employees...")
 
     for i, emp in enumerate(default_employees):
-        try:
-            emp["employee_number"] = f'EMP{i:03d}'
-            db.create_employee(
-                employee_number=emp["employee_number"],
-                data=emp
-            )
-            logger.info(f"Created default employee: {emp['name']}")
-        except Exception as e:
-            logger.warning(f"Failed to create employee {emp['name']}: {str(e)}")
-    # else:
-    #     logger.info(f"Found {len(employees)} existing employees, updating absences...")
-    #
-    #     # Update existing employees with new absence patterns
-    #     for emp in default_employees:
-    #         try:
-    #             existing_employee = db.get_employee(emp["employee_number"])
-    #             if existing_employee:
-    #                 db.update_employee(emp["employee_number"], {"known_absences": emp["known_absences"]})
-    #                 logger.info(f"Updated absences for employee: {emp['name']}")
-    #         except Exception as e:
-    #             logger.warning(f"Failed to update employee {emp['name']}: {str(e)}")
-
-    # Always front-fill the next 7 days of schedules
-    logger.info("Front-filling schedules for the next 7 days...")
-
-    db.create_daily_shifts(today, [emp["employee_number"] for emp in default_employees])
-
-    # for i in range(7):
-    #     day = today + timedelta(days=i)
-    #     date_str = day.strftime("%Y-%m-%d")
-
-    #     # Check if schedule already exists for this date
-    #     existing_schedule = db.get_schedule(date_str)
-
-    #     if existing_schedule:
-    #         logger.info(f"Schedule for {date_str} already exists, skipping")
-    #         continue
-
-    #     # Assign an employee who's not absent on this day
-    #     available_employees = [e for e in default_employees if date_str not in e["known_absences"]]
-
-    #     if available_employees:
-    #         # Select employee based on index to distribute evenly
-    #         emp_number = available_employees[i % len(available_employees)]["employee_number"]
-    #     else:
-    #         # If all employees are absent, just use round-robin
-    #         emp_number = default_employees[i % len(default_employees)]["employee_number"]
-
-    #     try:
-    #         db.create_schedule(date_str=date_str, employee_number=emp_number)
-    #         logger.info(f"Created schedule for {date_str}")
-    #     except Exception as e:
-    #         logger.warning(f"Failed to create schedule for {date_str}: {str(e)}")
+        emp["employee_number"] = f'EMP{i:03d}'
+    result = db.create_employees({emp["employee_number"]: emp for emp in default_employees})
+    if result.failed:
+        logger.warning(f"Failed to create {len(result.failed)} default employees, will retry on next start")
+        return None
 
+    return [emp["employee_number"] for emp in default_employees]
 
 
 async def init_default_data_async(db: SchedulingClient):
@@ -191,6 +186,12 @@ app = FastAPI(
 )
 app.include_router(router, prefix="/api")
 
+
+@app.exception_handler(ServiceUnavailableError)
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailableError) -> JSONResponse:
+    """Fail fast with a 503 while the database is (re)connecting."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,6 +32,9 @@ class Shift(BaseModel):
     type: str # Type of shift (cleaning, line 1, line2 etc...)
     employee_number: str # Reference to Employee number
     score: float # How happy the employee is with this scheduling
+    start_minute: int | None = None # start in minutes since the Unix epoch, derived from start on write
+    end_minute: int | None = None # end in minutes since the Unix epoch, derived from end on write
+    etag: str | None = None # ETag of the stored shift in listings, never stored
 
 # Schedule Model
 class Schedule(BaseModel):
@@ -95,11 +98,39 @@ class FrontendEmployee(BaseModel):
     employee_number: str
     name: str
 
+class RosterEmployee(FrontendEmployee):
+    first_line_support_count: int = 0
+    known_absences: list[str] = Field(default_factory=list)  # ISO format dates
+
 # API Request/Response Models
 class MessageResponse(BaseModel):
     message: str
 
 
+class ReadinessResponse(BaseModel):
+    ready: bool
+    services: dict[str, bool]  # Readiness per service (kv, collections, query)
+
+
+# Bulk Write Models
+class BulkItemResult(BaseModel):
+    id: str  # Document key
+    success: bool
+    error: str | None = None
+
+
+class BulkWriteResult(BaseModel):
+    results: list[BulkItemResult] = Field(default_factory=list)
+
+    @property
+    def succeeded(self) -> list[str]:
+        return [item.id for item in self.results if item.success]
+
+    @property
+    def failed(self) -> list[BulkItemResult]:
+        return [item for item in self.results if not item.success]
+
+
 class ScheduleChangeRequest(BaseModel):
     request_text: str
     metadata: dict[str, Any] = Field(default_factory=dict)
@@ -108,6 +139,7 @@ class ScheduleChangeRequest(BaseModel):
 class ScheduleChangeResponse(BaseModel):
     request: str
     analysis: ScheduleChangeAnalysis
+    applied: bool = False  # Whether the approved changes were committed
 
 
 class EmployeeCreateRequest(BaseModel):
@@ -132,6 +164,142 @@ class ShiftCreateRequest(BaseModel):
     end: str
     type: str
 
+class ShiftOpType(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+class ShiftOp(BaseModel):
+    op: ShiftOpType
+    shift_id: str | None = None  # Required for update and delete
+    employee_number: str | None = None  # Create requires all of employee_number, start, end and type
+    start: str | None = None
+    end: str | None = None
+    type: str | None = None
+    score: float | None = None
+
+class ShiftBatchRequest(BaseModel):
+    ops: list[ShiftOp]
+
+class ShiftBatchResponse(BaseModel):
+    results: list[BulkItemResult]  # One per op, in request order
+    shifts: list[Shift]  # The created and updated shifts as stored
+
+class SolveRequest(BaseModel):
+    date: str  # ISO format date to staff, the first of the horizon
+    days: int = Field(default=1, ge=1, le=62, description="Number of days to staff from date on")
+    time_budget_ms: int = Field(default=500, ge=10, le=10_000, description="How long the solver may search")
+    seed: int | None = None  # Same inputs and seed give the same solution
+    workers: int = Field(default=1, ge=1, le=64, description="Independent restarts run in parallel processes, the best one wins")
+    persist: bool = False  # Store the solution, replacing the days' shifts
+
+class RepairRequest(BaseModel):
+    date: str  # ISO format date, the first of the planned horizon
+    days: int = Field(default=7, ge=1, le=62, description="Number of planned days from date on")
+    changed: list[str] = Field(default_factory=list)  # Dates affected by the change
+    employee_number: str | None = None  # An employee whose availability changed, adds the days they're scheduled
+    time_budget_ms: int = Field(default=200, ge=10, le=10_000, description="How long the solver may search")
+    seed: int | None = None
+    persist: bool = False  # Store the repaired days
+
+class SolveResponse(BaseModel):
+    solved_days: list[str]  # Days the solver (re)staffed, the shifts and unfilled slots are for these
+    shifts: list[Shift]
+    unfilled: list[str]  # Shift ids of slots no eligible and available employee was left for
+    loads: dict[str, int]  # Days worked by employee number
+    cost: float  # Objective value, lower is better
+    iterations: int
+    elapsed_ms: float
+    persisted: bool = False
+
+class ShiftDiffRequest(BaseModel):
+    start: str  # First date of the window (YYYY-MM-DD)
+    end: str | None = None  # Last date of the window, included; defaults to start
+    shifts: list[ShiftCreateRequest]  # Every shift the window should have
+
+class ShiftChange(BaseModel):
+    before: Shift
+    after: Shift
+
+class ShiftDiffResponse(BaseModel):
+    creates: list[Shift]
+    updates: list[ShiftChange]
+    deletes: list[Shift]
+    unchanged: int  # Proposed shifts already stored as they are
+    applied: bool = False
+
+class WhatIfPlan(BaseModel):
+    name: str | None = None
+    shifts: list[ShiftCreateRequest]  # Every shift the window would have
+
+class WhatIfRequest(BaseModel):
+    start: str  # First date of the window (YYYY-MM-DD)
+    end: str | None = None  # Last date of the window, included; defaults to start
+    plans: list[WhatIfPlan]
+
+class WhatIfResult(BaseModel):
+    rank: int  # 1 is the best plan
+    index: int  # Position of the plan in the request
+    name: str | None = None
+    unfilled: int  # Slots of the daily shift pattern left unstaffed
+    double_bookings: int  # Pairs of overlapping shifts of the same employee
+    changes: int  # Shift writes needed to store the plan, see POST /shifts/diff
+    employees: int
+    penalty: float  # Weighted violations and imbalance, lower is better
+    violations: dict[str, int]  # Count per rule
+    load_mean: float
+    load_std: float
+    max_consecutive_days: int
+    mean_roles_worked: float
+
+class WhatIfResponse(BaseModel):
+    start: str
+    end: str
+    scored_start: str  # Rules and fairness are scored over the window's calendar weeks
+    scored_end: str
+    results: list[WhatIfResult]  # Best first
+
+class EmployeeScore(BaseModel):
+    employee_number: str
+    days_worked: int
+    hours_worked: int
+    load_deviation: float  # Days worked minus the average
+    max_consecutive_days: int
+    roles_worked: int  # Number of distinct roles
+    violations: int  # Hard rule violations (max_days_per_week, absences, certifications)
+
+class ScheduleScoreResponse(BaseModel):
+    start: str
+    end: str
+    employees: int
+    penalty: float  # Weighted violations and imbalance, lower is better
+    violations: dict[str, int]  # Count per rule
+    load_mean: float
+    load_std: float
+    max_consecutive_days: int
+    mean_roles_worked: float
+    unknown_shifts: int  # Shifts of employees or roles the scoring doesn't know
+    per_employee: list[EmployeeScore]
+
+class AvailableEmployee(BaseModel):
+    employee_number: str
+    available_days: list[str]  # ISO format dates within the window without a known absence
+    fully_available: bool  # Available on every day of the window
+
+class ReplacementCandidate(BaseModel):
+    employee_number: str
+    load: int  # First-line support count for schedules, days worked that week for shifts
+    load_deviation: float  # Load minus the average load
+    within_balance: bool  # Whether taking over keeps the load within preferred_balance of the average
+    week_days: int  # Other days already taken that calendar week
+    headroom: int  # Days left before max_days_per_week
+
+class ShiftConflict(BaseModel):
+    shift_id: str  # The shift starting first
+    other_shift_id: str  # The shift overlapping it
+    overlap_start: str  # Start of the overlap ("YYYY-MM-DD HH-MM")
+    overlap_end: str  # End of the overlap ("YYYY-MM-DD HH-MM")
+
 class ShiftUpdateRequest(BaseModel):
     request_text: str
     metadata: dict[str, Any] = Field(default_factory=dict)
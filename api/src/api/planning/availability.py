@@ -0,0 +1,159 @@
+"""
+Availability index of the roster.
+
+Keeps, per employee, a bitmap of absence days (bit n is day n after AVAILABILITY_EPOCH)
+and a bitmask of the roles their certifications allow, so "who can work role X on
+these days" is answered with bitwise operations instead of comparing date strings.
+"""
+from dataclasses import dataclass
+from datetime import date as Date, timedelta
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..clients.scheduling import SHIFT_ROLES, eligible_roles
+
+# Day 0 of the absence bitmaps
+AVAILABILITY_EPOCH = Date(2020, 1, 1)
+
+# Bit of each role in the eligibility masks
+ROLE_BITS = {role: 1 << i for i, role in enumerate(SHIFT_ROLES)}
+
+#### Bitsets ####
+
+def day_bit(day: str) -> int:
+    """Get the bitmap position of a date (YYYY-MM-DD), negative before the epoch."""
+    return (Date.fromisoformat(day) - AVAILABILITY_EPOCH).days
+
+
+def days_mask(days: List[str]) -> int:
+    """Build a bitmap with the bits of the given dates set, dates before the epoch are ignored as no window reaches them."""
+    mask = 0
+    for day in days:
+        bit = day_bit(day)
+        if bit >= 0:
+            mask |= 1 << bit
+    return mask
+
+
+def window_mask(start: str, end: str) -> int:
+    """
+    Build a bitmap with the bits of every date from start to end (included) set.
+
+    Raises:
+        ValueError: If a date is invalid or start is before AVAILABILITY_EPOCH
+    """
+    first, last = day_bit(start), day_bit(end)
+    if first < 0:
+        raise ValueError(f"Dates before {AVAILABILITY_EPOCH.isoformat()} are not supported")
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def mask_days(mask: int) -> List[str]:
+    """Get the dates whose bits are set in a bitmap, in order."""
+    days = []
+    while mask:
+        low = mask & -mask
+        days.append((AVAILABILITY_EPOCH + timedelta(days=low.bit_length() - 1)).isoformat())
+        mask ^= low
+    return days
+
+
+def role_mask(certifications: List[str]) -> int:
+    """Get the bitmask of the roles the certifications allow, see ROLE_BITS."""
+    mask = 0
+    for role in eligible_roles(certifications):
+        mask |= ROLE_BITS[role]
+    return mask
+
+#### Index ####
+
+@dataclass
+class EmployeeAvailability:
+    absences: int  # Absence day bitmap
+    roles: int  # Role eligibility bitmask
+
+
+class AvailabilityIndex:
+    """
+    Thread-safe availability index keyed by employee number.
+
+    Built from the planning roster, kept current by the client's employee writes. As
+    other processes may write employees too, it reports itself stale after `ttl`
+    seconds so the owner can rebuild it.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._entries: Dict[str, EmployeeAvailability] = {}
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.ttl
+
+    def build(self, roster: List[Dict[str, Any]]) -> None:
+        """Replace the index with planning roster rows (employee_number, certifications, known_absences)."""
+        entries = {
+            row["employee_number"]: EmployeeAvailability(
+                days_mask(row.get("known_absences") or []),
+                role_mask(row.get("certifications") or [])
+            )
+            for row in roster
+        }
+        with self._lock:
+            self._entries = entries
+            self._built_at = time.monotonic()
+
+    def put(self, employee_number: str, employee: Dict[str, Any]) -> None:
+        """Index a created or replaced employee document."""
+        entry = EmployeeAvailability(
+            days_mask(employee.get("known_absences") or []),
+            role_mask(employee.get("certifications") or [])
+        )
+        with self._lock:
+            self._entries[employee_number] = entry
+
+    def update(self, employee_number: str, updates: Dict[str, Any]) -> None:
+        """Apply the fields of a partial employee update that the index cares about."""
+        with self._lock:
+            entry = self._entries.get(employee_number)
+            if entry is None:
+                return
+            if "known_absences" in updates:
+                entry.absences = days_mask(updates["known_absences"] or [])
+            if "certifications" in updates:
+                entry.roles = role_mask(updates["certifications"] or [])
+
+    def remove(self, employee_number: str) -> None:
+        with self._lock:
+            self._entries.pop(employee_number, None)
+
+    def available(self, start: str, end: str, role: Optional[str] = None) -> Dict[str, int]:
+        """
+        Get who can work within a window.
+
+        Args:
+            start: First date (YYYY-MM-DD)
+            end: Last date, included
+            role: Optional role the employees must be eligible for
+
+        Returns:
+            Bitmap of the available days in the window by employee number, for the
+            employees available on at least one of them
+
+        Raises:
+            ValueError: If a date is invalid or start is before AVAILABILITY_EPOCH
+        """
+        window = window_mask(start, end)
+        role_bit = ROLE_BITS[role] if role else 0
+        with self._lock:
+            entries = list(self._entries.items())
+        return {
+            employee_number: free
+            for employee_number, entry in entries
+            if entry.roles & role_bit == role_bit and (free := window & ~entry.absences)
+        }
@@ -0,0 +1,73 @@
+"""
+Deterministic replacement candidate ranking.
+
+Ranks who could take over a schedule or shift: only employees that are available
+and eligible and have max_days_per_week headroom left qualify; among them those
+within preferred_balance of the average load come first, then the least loaded,
+then the most headroom, then by employee number.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+from ..clients.scheduling import DEFAULT_RULES
+
+#### Types ####
+
+@dataclass
+class Candidate:
+    employee_number: str
+    load: int  # Current load, e.g. first-line support count or days worked
+    load_deviation: float  # Load minus the average load
+    within_balance: bool  # Whether the load is within preferred_balance of the average
+    week_days: int  # Days already taken in the calendar week
+    headroom: int  # Days left before max_days_per_week
+
+#### Ranking ####
+
+def rank_candidates(
+    available: Iterable[str],
+    loads: Dict[str, int],
+    week_days: Dict[str, int],
+    rules: Dict[str, Any] = None,
+    exclude: Iterable[str] = (),
+    limit: int = 5
+) -> List[Candidate]:
+    """
+    Rank replacement candidates.
+
+    Args:
+        available: Employee numbers available and eligible for the slot
+        loads: Current load by employee number, employees without one count as 0
+        week_days: Days taken in the slot's calendar week by employee number
+        rules: The scheduling rules (max_days_per_week, preferred_balance)
+        exclude: Employee numbers that can't take the slot, e.g. the one being replaced
+        limit: Number of candidates to return
+
+    Returns:
+        The best candidates, best first
+    """
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    max_days = int(rules["max_days_per_week"])
+    balance = float(rules["preferred_balance"])
+    mean = sum(loads.values()) / len(loads) if loads else 0.0
+    excluded = set(exclude)
+
+    candidates = []
+    for employee_number in set(available) - excluded:
+        taken = week_days.get(employee_number, 0)
+        if taken >= max_days:
+            continue
+        load = loads.get(employee_number, 0)
+        deviation = load - mean
+        candidates.append(Candidate(
+            employee_number=employee_number,
+            load=load,
+            load_deviation=round(deviation, 4),
+            # Taking the slot adds one to the load
+            within_balance=load + 1 - mean <= balance * mean,
+            week_days=taken,
+            headroom=max_days - taken,
+        ))
+
+    candidates.sort(key=lambda c: (not c.within_balance, c.load, -c.headroom, c.employee_number))
+    return candidates[:limit]
@@ -0,0 +1,128 @@
+"""
+Minimal change sets between stored and proposed shifts.
+
+Shifts are matched within their slot (date, start hour and role): first to a stored
+shift of the same employee and times, which is left alone, then of the same
+employee, then to any stored shift of the slot, which is updated in place. Only
+what is left over is created or deleted, so a re-plan writes just what changed.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+from ..clients.scheduling import new_shift_doc, parse_shift_time, shift_interval_fields, shift_slot_keys
+
+# Fields a matched shift may differ in, the slot fixes the rest
+DIFF_FIELDS = ("employee_number", "start", "end")
+
+#### Types ####
+
+@dataclass
+class ShiftDiff:
+    creates: List[Dict[str, Any]] = field(default_factory=list)  # New shift documents, with their slot keys
+    updates: List[Tuple[Dict[str, Any], Dict[str, Any]]] = field(default_factory=list)  # (stored, updated) documents
+    deletes: List[Dict[str, Any]] = field(default_factory=list)  # Stored shift documents to remove
+    unchanged: int = 0
+
+    def __len__(self) -> int:
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def writes(self) -> List[Dict[str, Any]]:
+        """Get the documents to store, created and updated."""
+        return self.creates + [updated for _, updated in self.updates]
+
+    def delete_ids(self) -> List[str]:
+        return [shift["shift_id"] for shift in self.deletes]
+
+#### Diffing ####
+
+def shift_slot(shift: Dict[str, Any]) -> tuple:
+    """Get the slot a shift fills, (date, hour, role); the raw start for times off the slot grid."""
+    try:
+        return (*parse_shift_time(shift["start"]), shift["type"])
+    except ValueError:
+        return (shift["start"], -1, shift["type"])
+
+
+def _pair(stored: List[Dict[str, Any]], proposed: List[Dict[str, Any]], key: Callable) -> List[tuple]:
+    """Pair off stored and proposed shifts with equal keys, removing them from the lists."""
+    by_key = defaultdict(list)
+    for shift in stored:
+        by_key[key(shift)].append(shift)
+
+    pairs, unmatched = [], []
+    for shift in proposed:
+        candidates = by_key.get(key(shift))
+        if candidates:
+            pairs.append((candidates.pop(0), shift))
+        else:
+            unmatched.append(shift)
+
+    paired = {id(old) for old, _ in pairs}
+    stored[:] = [shift for shift in stored if id(shift) not in paired]
+    proposed[:] = unmatched
+    return pairs
+
+
+def diff_shifts(stored: List[Dict[str, Any]], proposed: List[Dict[str, Any]]) -> ShiftDiff:
+    """
+    Get the minimal set of writes turning the stored shifts of a window into the proposed ones.
+
+    Args:
+        stored: The stored shift documents of the window
+        proposed: The shifts the window should have (employee_number, start, end, type),
+            optionally with a preferred shift_id for ones that end up created
+
+    Returns:
+        The creates, updates and deletes, with updates never moving a shift out of its slot
+
+    Raises:
+        ValueError: If a proposed shift's times are invalid or off the slot grid, or a
+            slot is proposed more shifts than it has room for
+    """
+    stored_by_slot, proposed_by_slot = defaultdict(list), defaultdict(list)
+    for shift in sorted(stored, key=lambda shift: shift["shift_id"]):
+        stored_by_slot[shift_slot(shift)].append(shift)
+    for shift in proposed:
+        shift_interval_fields(shift["start"], shift["end"])
+        shift_slot_keys(shift["start"], shift["type"])
+        proposed_by_slot[shift_slot(shift)].append(shift)
+
+    diff = ShiftDiff()
+    taken = {shift["shift_id"] for shift in stored}
+    for slot in sorted(set(stored_by_slot) | set(proposed_by_slot), key=str):
+        olds, news = stored_by_slot[slot], list(proposed_by_slot[slot])
+
+        pairs = []
+        for key in (
+            lambda shift: tuple(shift[name] for name in DIFF_FIELDS),
+            lambda shift: shift["employee_number"],
+            lambda shift: None,
+        ):
+            pairs += _pair(olds, news, key)
+
+        for old, new in pairs:
+            changes = {name: new[name] for name in DIFF_FIELDS if old.get(name) != new[name]}
+            if not changes:
+                diff.unchanged += 1
+                continue
+            updated = {**old, **changes, **shift_interval_fields(new["start"], new["end"])}
+            if "employee_number" in changes:
+                # The score is how happy the employee is with the shift, it doesn't carry over
+                updated["score"] = -1
+            diff.updates.append((old, updated))
+
+        diff.deletes.extend(olds)
+
+        for new in news:
+            keys = shift_slot_keys(new["start"], new["type"])
+            if new.get("shift_id") in keys and new["shift_id"] not in taken:
+                key = new["shift_id"]
+            else:
+                key = next((key for key in keys if key not in taken), None)
+            if key is None:
+                raise ValueError(f"More {new['type']} shifts starting {new['start']} than its {len(keys)} slots")
+            taken.add(key)
+            diff.creates.append(new_shift_doc(new["employee_number"], new["start"], new["end"], new["type"], key))
+
+    return diff
@@ -0,0 +1,114 @@
+"""
+Per-employee shift interval index.
+
+Shifts are kept as (start_minute, end_minute, shift_id) intervals sorted by start.
+Since the index also knows its longest interval, an overlap lookup only needs to
+look at the intervals starting between `start - longest` and `end`, found with two
+binary searches: O(log n) plus the (normally zero) overlaps found.
+"""
+from bisect import bisect_left, bisect_right, insort
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..clients.scheduling import shift_minutes
+
+Interval = Tuple[int, int, str]  # start_minute, end_minute, shift_id
+
+#### Intervals ####
+
+def shift_interval(shift: Dict[str, Any]) -> Optional[Interval]:
+    """
+    Get a shift document's interval, from its epoch-minute fields or, for shifts
+    stored before those existed, its display times. None if the times are invalid.
+    """
+    try:
+        start = shift.get("start_minute")
+        start = shift_minutes(shift["start"]) if start is None else int(start)
+        end = shift.get("end_minute")
+        end = shift_minutes(shift["end"]) if end is None else int(end)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (start, end, shift["shift_id"]) if end > start else None
+
+
+class EmployeeIntervals:
+    """The shift intervals of one employee."""
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._items: List[Interval] = sorted(intervals)
+        self._starts = [item[0] for item in self._items]
+        self._longest = max((end - start for start, end, _ in self._items), default=0)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Interval]:
+        return iter(self._items)
+
+    def overlapping(self, start: int, end: int, ignore: Optional[str] = None) -> List[Interval]:
+        """Get the intervals overlapping [start, end), except the shift `ignore`."""
+        # Intervals starting at or before start - longest have ended by start
+        low = bisect_right(self._starts, start - self._longest)
+        high = bisect_left(self._starts, end)
+        return [item for item in self._items[low:high] if item[1] > start and item[2] != ignore]
+
+    def add(self, start: int, end: int, shift_id: str) -> None:
+        self.remove(shift_id)
+        insort(self._items, (start, end, shift_id))
+        insort(self._starts, start)
+        self._longest = max(self._longest, end - start)
+
+    def remove(self, shift_id: str) -> None:
+        for index, item in enumerate(self._items):
+            if item[2] == shift_id:
+                del self._items[index]
+                del self._starts[index]
+                return
+
+    def conflicts(self) -> List[Tuple[Interval, Interval]]:
+        """Get every pair of overlapping intervals, with a sweep over the sorted starts."""
+        pairs = []
+        for index, first in enumerate(self._items):
+            for second in self._items[index + 1:bisect_left(self._starts, first[1])]:
+                pairs.append((first, second))
+        return pairs
+
+#### Index ####
+
+class IntervalIndex:
+    """
+    Shift intervals by employee number, loaded on demand by the owner.
+
+    Entries expire after `ttl` seconds so shifts written by other processes are
+    picked up on the next load.
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[EmployeeIntervals, float]] = {}
+
+    def get(self, employee_number: str) -> Optional[EmployeeIntervals]:
+        """Get an employee's intervals if loaded and not expired."""
+        entry = self._entries.get(employee_number)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def put(self, employee_number: str, intervals: EmployeeIntervals) -> None:
+        self._entries[employee_number] = (intervals, time.monotonic())
+
+    def discard(self, shift_id: str, employee_number: Optional[str] = None) -> None:
+        """Remove a shift from one employee's intervals, or from every employee's if unknown."""
+        if employee_number is not None:
+            entry = self._entries.get(employee_number)
+            entries = [entry] if entry else []
+        else:
+            entries = list(self._entries.values())
+        for intervals, _ in entries:
+            intervals.remove(shift_id)
+
+    def invalidate(self, employee_number: str) -> None:
+        self._entries.pop(employee_number, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
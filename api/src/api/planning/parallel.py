@@ -0,0 +1,196 @@
+"""
+Multi-start solving and what-if evaluation across a process pool.
+
+The solver and the plan evaluations are CPU bound, so threads don't help;
+independent randomized restarts run in separate processes instead, each with its
+own seed, and the best solution according to the scoring module wins. Candidate
+plans are likewise evaluated one per process.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .scoring import score_schedule
+from .solver import Solution, solve_days
+from .whatif import PlanEvaluation, evaluate_plan
+
+# Upper bound for the number of solver processes
+MAX_WORKERS = os.cpu_count() or 1
+
+# Workers are spawned rather than forked: the server has database and executor
+# threads running by the time it needs them, and forking those can deadlock
+START_METHOD = "spawn"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+#### Pool ####
+
+def get_pool() -> ProcessPoolExecutor:
+    """Get the shared solver process pool, creating it on first use; the server creates it at startup."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+        return _pool
+
+
+def _worker_pid(delay: float) -> int:
+    """Hold a worker for a moment, so each warm_pool round reaches every idle worker."""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def warm_pool(rounds: int = 10) -> int:
+    """
+    Start every worker process of the shared pool and wait until each has run a task.
+
+    The pool only spawns workers as tasks are submitted, and a spawned worker still has
+    to start an interpreter and import the solver, so the first solve would otherwise pay
+    for that. Rounds of short tasks are submitted until all the workers answered.
+
+    Args:
+        rounds: Maximum number of rounds of one task per worker
+
+    Returns:
+        The number of workers that answered
+    """
+    pool = get_pool()
+    pids = set()
+    for _ in range(rounds):
+        pids.update(future.result() for future in [pool.submit(_worker_pid, 0.05) for _ in range(MAX_WORKERS)])
+        if len(pids) >= MAX_WORKERS:
+            break
+    return len(pids)
+
+
+def shutdown_pool() -> None:
+    """Stop the solver processes, if they were started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+#### Solving ####
+
+def compact_roster(roster: List[Dict[str, Any]]) -> List[tuple]:
+    """Reduce roster rows to the tuples the solver needs, to keep what is sent to the workers small."""
+    return [
+        (row["employee_number"], tuple(row.get("certifications") or []), tuple(row.get("known_absences") or []))
+        for row in roster
+    ]
+
+
+def _solve_start(
+    roster: List[tuple],
+    days: List[str],
+    rules: Dict[str, Any],
+    worked: Dict[str, set[str]],
+    time_budget: float,
+    seed: int
+) -> Solution:
+    """Run one restart in a worker process."""
+    rows = [
+        {"employee_number": number, "certifications": list(certifications), "known_absences": list(absences)}
+        for number, certifications, absences in roster
+    ]
+    return solve_days(rows, days, rules, worked, time_budget, seed)
+
+
+def rank(solution: Solution, roster: List[Dict[str, Any]], days: List[str], rules: Dict[str, Any]) -> tuple:
+    """Sort key of solutions: fewest unstaffed positions first, then the lowest scoring penalty."""
+    score = score_schedule(roster, solution.shift_docs(), days, rules)
+    return len(solution.unfilled_keys()), score.penalty, solution.cost
+
+
+def solve_multi_start(
+    roster: List[Dict[str, Any]],
+    days: List[str],
+    rules: Dict[str, Any] = None,
+    worked: Dict[str, set[str]] = None,
+    time_budget: float = 0.5,
+    seed: Optional[int] = None,
+    workers: int = 1
+) -> Solution:
+    """
+    Solve with independent restarts in parallel and keep the best solution, see solve_days.
+
+    Args:
+        roster: Planning roster rows (employee_number, certifications, known_absences)
+        days: The dates to staff (YYYY-MM-DD)
+        rules: The scheduling rules
+        worked: Dates each employee already works outside `days`
+        time_budget: Seconds each restart may search
+        seed: Seed of the first restart, the others use the following ones
+        workers: Number of restarts, each in its own process; 1 solves in the calling process
+
+    Returns:
+        The best solution found
+    """
+    workers = max(1, min(workers, MAX_WORKERS))
+    seed = seed or 0
+    if workers == 1:
+        return solve_days(roster, days, rules, worked, time_budget, seed)
+
+    pool = get_pool()
+    compact = compact_roster(roster)
+    futures = [
+        pool.submit(_solve_start, compact, days, rules, worked, time_budget, seed + start)
+        for start in range(workers)
+    ]
+    solutions = [future.result() for future in futures]
+    return min(solutions, key=lambda solution: rank(solution, roster, days, rules))
+
+#### What-if ####
+
+def evaluate_plans(
+    plans: List[tuple[Optional[str], List[Dict[str, Any]]]],
+    roster: List[Dict[str, Any]],
+    stored: List[Dict[str, Any]],
+    window: List[str],
+    days: List[str],
+    rules: Dict[str, Any] = None
+) -> List[PlanEvaluation]:
+    """
+    Evaluate candidate plans in parallel, see whatif.evaluate_plan.
+
+    Args:
+        plans: (name, shifts) of each plan
+        roster: Planning roster rows (employee_number, certifications, known_absences)
+        stored: The stored shift documents of `days`
+        window: The dates the plans replace the stored shifts of
+        days: The consecutive dates to score
+        rules: The scheduling rules
+
+    Returns:
+        The evaluations in plan order; a single plan is evaluated in the calling process
+
+    Raises:
+        ValueError: If a plan has invalid shifts, naming the first such plan
+    """
+    if len(plans) == 1:
+        futures = None
+    else:
+        pool = get_pool()
+        futures = [
+            pool.submit(evaluate_plan, i, name, shifts, roster, stored, window, days, rules)
+            for i, (name, shifts) in enumerate(plans)
+        ]
+
+    evaluations = []
+    for i, (name, shifts) in enumerate(plans):
+        try:
+            if futures is None:
+                evaluations.append(evaluate_plan(i, name, shifts, roster, stored, window, days, rules))
+            else:
+                evaluations.append(futures[i].result())
+        except ValueError as e:
+            if futures:
+                for future in futures:
+                    future.cancel()
+            raise ValueError(f"Plan {i}: {e}")
+    return evaluations
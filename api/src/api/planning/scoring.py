@@ -0,0 +1,190 @@
+"""
+Vectorized schedule scoring.
+
+Loads shifts into an employees x days x roles array of hours worked and computes
+rule violations and fairness measures with NumPy, so long periods and large rosters
+score in milliseconds.
+"""
+from dataclasses import dataclass
+from datetime import date as Date, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ..clients.scheduling import DEFAULT_RULES, SHIFT_ROLES, eligible_roles
+
+# Weights of the measures in the overall penalty, see ScheduleScore.penalty
+VIOLATION_PENALTY = 100.0
+IMBALANCE_PENALTY = 10.0
+
+#### Types ####
+
+@dataclass
+class ScheduleArrays:
+    employee_numbers: List[str]
+    days: List[str]
+    hours: np.ndarray  # employees x days x roles, hours worked
+    absent: np.ndarray  # employees x days, known absences
+    eligible: np.ndarray  # employees x roles, certification eligibility
+    unknown_shifts: int  # Shifts of employees not in the roster, or outside the days or roles
+
+
+@dataclass
+class ScheduleScore:
+    employee_numbers: List[str]
+    days_worked: np.ndarray  # Per employee
+    hours_worked: np.ndarray  # Per employee
+    load_deviation: np.ndarray  # Days worked minus the mean, per employee
+    max_consecutive_days: np.ndarray  # Per employee
+    roles_worked: np.ndarray  # Number of distinct roles, per employee
+    week_violations: np.ndarray  # Days over max_days_per_week summed over the weeks, per employee
+    absence_violations: np.ndarray  # Days worked despite a known absence, per employee
+    certification_violations: np.ndarray  # Hours in roles not allowed by certifications, per employee
+    balance_violations: np.ndarray  # Whether the deviation is beyond preferred_balance, per employee
+    excess_deviation: np.ndarray  # Deviation beyond preferred_balance in days, per employee
+
+    @property
+    def violations(self) -> Dict[str, int]:
+        return {
+            "max_days_per_week": int(self.week_violations.sum()),
+            "known_absences": int(self.absence_violations.sum()),
+            "certifications": int(self.certification_violations.sum()),
+            "preferred_balance": int(self.balance_violations.sum()),
+        }
+
+    @property
+    def penalty(self) -> float:
+        """Single figure to compare schedules of the same period, lower is better."""
+        hard = self.week_violations.sum() + self.absence_violations.sum() + self.certification_violations.sum()
+        return float(VIOLATION_PENALTY * hard + IMBALANCE_PENALTY * np.square(self.excess_deviation).sum())
+
+    def summary(self) -> Dict[str, Any]:
+        days = self.days_worked.astype(float)
+        return {
+            "employees": len(self.employee_numbers),
+            "penalty": round(self.penalty, 4),
+            "violations": self.violations,
+            "load_mean": round(float(days.mean()), 4) if days.size else 0.0,
+            "load_std": round(float(days.std()), 4) if days.size else 0.0,
+            "max_consecutive_days": int(self.max_consecutive_days.max(initial=0)),
+            "mean_roles_worked": round(float(self.roles_worked.mean()), 4) if days.size else 0.0,
+        }
+
+    def per_employee(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "employee_number": employee_number,
+                "days_worked": int(self.days_worked[i]),
+                "hours_worked": int(self.hours_worked[i]),
+                "load_deviation": round(float(self.load_deviation[i]), 4),
+                "max_consecutive_days": int(self.max_consecutive_days[i]),
+                "roles_worked": int(self.roles_worked[i]),
+                "violations": int(self.week_violations[i] + self.absence_violations[i] + self.certification_violations[i]),
+            }
+            for i, employee_number in enumerate(self.employee_numbers)
+        ]
+
+#### Loading ####
+
+def date_range(start: str, end: str) -> List[str]:
+    """Get the dates from start to end, both included."""
+    first, last = Date.fromisoformat(start), Date.fromisoformat(end)
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+
+def load_arrays(roster: List[Dict[str, Any]], shifts: List[Dict[str, Any]], days: List[str]) -> ScheduleArrays:
+    """
+    Load shifts into arrays indexed by employee, day and role.
+
+    Args:
+        roster: Planning roster rows (employee_number, certifications, known_absences)
+        shifts: Shift documents
+        days: The consecutive dates to score (YYYY-MM-DD)
+    """
+    employee_numbers = [row["employee_number"] for row in roster]
+    employee_index = {number: i for i, number in enumerate(employee_numbers)}
+    day_index = {day: d for d, day in enumerate(days)}
+    role_index = {role: r for r, role in enumerate(SHIFT_ROLES)}
+
+    # Look up each shift's coordinates once (-1 when unknown), then count them in one vectorized call
+    shape = (len(employee_numbers), len(days), len(SHIFT_ROLES))
+    e = np.fromiter((employee_index.get(shift["employee_number"], -1) for shift in shifts), dtype=np.intp, count=len(shifts))
+    d = np.fromiter((day_index.get(shift["start"][:10], -1) for shift in shifts), dtype=np.intp, count=len(shifts))
+    r = np.fromiter((role_index.get(shift["type"], -1) for shift in shifts), dtype=np.intp, count=len(shifts))
+    known = (e >= 0) & (d >= 0) & (r >= 0)
+    flat = np.ravel_multi_index((e[known], d[known], r[known]), shape)
+    hours = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype(np.int16)
+
+    absent = np.zeros((len(employee_numbers), len(days)), dtype=bool)
+    eligible = np.zeros((len(employee_numbers), len(SHIFT_ROLES)), dtype=bool)
+    for i, row in enumerate(roster):
+        absences = [day_index[day] for day in row.get("known_absences") or [] if day in day_index]
+        absent[i, absences] = True
+        eligible[i, [role_index[role] for role in eligible_roles(row.get("certifications") or [])]] = True
+
+    return ScheduleArrays(employee_numbers, days, hours, absent, eligible, int((~known).sum()))
+
+#### Scoring ####
+
+def longest_runs(worked: np.ndarray) -> np.ndarray:
+    """Get the longest run of consecutive True values in each row of a boolean matrix."""
+    rows = worked.shape[0]
+    padded = np.zeros((rows, worked.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = worked
+    edges = np.diff(padded, axis=1)
+    # Run starts and ends come out in the same row-major order, so they pair up
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    longest = np.zeros(rows, dtype=np.int64)
+    np.maximum.at(longest, starts[:, 0], ends[:, 1] - starts[:, 1])
+    return longest
+
+
+def score_arrays(arrays: ScheduleArrays, rules: Dict[str, Any] = None) -> ScheduleScore:
+    """
+    Score a schedule loaded with load_arrays against the rules.
+
+    Args:
+        arrays: The schedule
+        rules: The scheduling rules (max_days_per_week, preferred_balance)
+    """
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    hours = arrays.hours
+    worked = hours.sum(axis=2) > 0  # employees x days
+
+    # Days worked per calendar week: sum the day columns of each ISO week
+    weeks = np.array([Date.fromisoformat(day).isocalendar()[:2] for day in arrays.days], dtype=np.int64).reshape(-1, 2)
+    _, week_ids = np.unique(weeks, axis=0, return_inverse=True)
+    week_days = np.zeros((worked.shape[0], int(week_ids.max(initial=-1)) + 1), dtype=np.int64)
+    np.add.at(week_days.T, week_ids.reshape(-1), worked.T)
+    week_violations = np.clip(week_days - int(rules["max_days_per_week"]), 0, None).sum(axis=1)
+
+    days_worked = worked.sum(axis=1)
+    mean = days_worked.mean() if days_worked.size else 0.0
+    load_deviation = days_worked - mean
+    excess_deviation = np.clip(np.abs(load_deviation) - float(rules["preferred_balance"]) * mean, 0, None)
+
+    role_hours = hours.sum(axis=1)  # employees x roles
+    return ScheduleScore(
+        employee_numbers=arrays.employee_numbers,
+        days_worked=days_worked,
+        hours_worked=hours.sum(axis=(1, 2)),
+        load_deviation=load_deviation,
+        max_consecutive_days=longest_runs(worked),
+        roles_worked=(role_hours > 0).sum(axis=1),
+        week_violations=week_violations,
+        absence_violations=(worked & arrays.absent).sum(axis=1),
+        certification_violations=np.where(arrays.eligible, 0, role_hours).sum(axis=1),
+        balance_violations=excess_deviation > 0,
+        excess_deviation=excess_deviation,
+    )
+
+
+def score_schedule(
+    roster: List[Dict[str, Any]],
+    shifts: List[Dict[str, Any]],
+    days: List[str],
+    rules: Dict[str, Any] = None
+) -> ScheduleScore:
+    """Score shifts over some consecutive days, see load_arrays and score_arrays."""
+    return score_arrays(load_arrays(roster, shifts, days), rules)
@@ -0,0 +1,467 @@
+"""
+Local search shift solver.
+
+Staffs the positions of the daily shift pattern (see daily_shift_roles) from the
+whole roster. An employee works all hours of one position on a day.
+
+Hard constraints, never violated:
+- availability: nobody is scheduled on one of their known_absences
+- eligibility: every role of the position is allowed by the employee's certifications
+- nobody works two positions on the same day
+- nobody works more than max_days_per_week days in a calendar week
+
+Soft objective, minimized: positions left unstaffed (heavily), and every employee's
+number of days deviating from the average by more than preferred_balance.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date as Date
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from ..clients.scheduling import (
+    DAILY_POSITIONS, DAILY_SHIFT_HOURS, DEFAULT_RULES,
+    daily_position_keys, daily_shift_docs, daily_shift_roles, eligible_roles
+)
+
+# Cost of leaving a position unstaffed, outweighs any imbalance
+UNFILLED_COST = 1000.0
+# Cost per squared day of deviation beyond the preferred balance
+IMBALANCE_COST = 10.0
+# Cost per squared day of any deviation from the average, spreads work evenly within the balance
+SPREAD_COST = 0.1
+# Cost of changing a position's employee when repairing an existing plan, keeps repairs minimal
+CHANGE_COST = 5.0
+# Stop early after this many moves without finding a better solution, or this many per
+# position the solver may change when there are few of them
+MAX_STALE_MOVES = 20_000
+STALE_MOVES_PER_POSITION = 200
+
+# Roles of each position of the daily shift pattern over the day
+POSITION_ROLES = [{daily_shift_roles(hour)[position] for hour in DAILY_SHIFT_HOURS} for position in range(DAILY_POSITIONS)]
+
+#### Types ####
+
+@dataclass
+class SolverEmployee:
+    employee_number: str
+    positions: set[int]  # Positions the employee's certifications allow
+    known_absences: set[str]
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "SolverEmployee":
+        """Build from a planning roster row (employee_number, certifications, known_absences)."""
+        roles = set(eligible_roles(row.get("certifications") or []))
+        return cls(
+            employee_number=row["employee_number"],
+            positions={position for position, needed in enumerate(POSITION_ROLES) if needed <= roles},
+            known_absences=set(row.get("known_absences") or []),
+        )
+
+
+@dataclass
+class Solution:
+    assignments: Dict[str, List[Optional[str]]]  # Employee number per position, by date
+    cost: float
+    iterations: int
+    elapsed_ms: float
+    loads: Dict[str, int] = field(default_factory=dict)  # Days worked in the horizon by employee number
+    solved_days: List[str] = field(default_factory=list)  # Days the solver could change, all unless repairing
+
+    def shift_docs(self) -> List[Dict[str, Any]]:
+        """Build the shift documents of the staffed positions on the solved days."""
+        return [doc for day in self.solved_days for doc in daily_shift_docs(day, self.assignments[day])]
+
+    def unfilled_keys(self) -> List[str]:
+        """Get the shift keys of the positions left unstaffed on the solved days."""
+        return [
+            key
+            for day in self.solved_days
+            for position, employee_number in enumerate(self.assignments[day]) if employee_number is None
+            for key in daily_position_keys(day, position)
+        ]
+
+#### Solver ####
+
+def week_of(day: str) -> tuple[int, int]:
+    """Get the ISO (year, week) of a date."""
+    year, week, _ = Date.fromisoformat(day).isocalendar()
+    return year, week
+
+
+def plan_from_shifts(day: str, shifts: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """
+    Get who works each position of a day from its stored shifts.
+
+    A position is attributed to the employee holding most of its hourly slots, see
+    daily_position_keys; positions without any stored slot are None.
+    """
+    holders = {shift["shift_id"]: shift["employee_number"] for shift in shifts}
+    staff = []
+    for position in range(DAILY_POSITIONS):
+        counts = Counter(holders[key] for key in daily_position_keys(day, position) if key in holders)
+        staff.append(counts.most_common(1)[0][0] if counts else None)
+    return staff
+
+
+def repair_neighborhood(days: List[str], changed: List[str]) -> List[str]:
+    """
+    Get the days a repair may change: the changed days and the rest of their calendar
+    weeks, which share their max_days_per_week budgets.
+    """
+    weeks = {week_of(day) for day in changed}
+    return [day for day in days if week_of(day) in weeks]
+
+
+class ShiftSolver:
+    """
+    Assigns employees to the daily positions of a set of days.
+
+    Builds a greedy solution (scarcest positions first, least loaded employee first)
+    and improves it with simulated annealing over replace and swap moves until the
+    time budget runs out or no better solution turns up for a while. Every move keeps
+    the hard constraints, so any intermediate solution is valid.
+    """
+
+    def __init__(
+        self,
+        employees: List[SolverEmployee],
+        days: List[str],
+        rules: Dict[str, Any] = None,
+        worked: Dict[str, set[str]] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            employees: The roster
+            days: The dates to staff (YYYY-MM-DD)
+            rules: The scheduling rules (max_days_per_week, preferred_balance)
+            worked: Dates each employee already works outside `days`, counted towards max_days_per_week
+            seed: Random seed, the same inputs and seed give the same solution
+        """
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        self.max_days = int(rules["max_days_per_week"])
+        self.balance = float(rules["preferred_balance"])
+        self.days = sorted(days)
+        self.employees = sorted(employees, key=lambda emp: emp.employee_number)
+        self.rng = random.Random(seed if seed is not None else 0)
+
+        count = len(self.employees)
+        self.index = {emp.employee_number: i for i, emp in enumerate(self.employees)}
+        self.weeks = [week_of(day) for day in self.days]
+        # Employees that may work position p on day d: candidates[d][p]
+        self.candidates = [
+            [[i for i, emp in enumerate(self.employees) if position in emp.positions and day not in emp.known_absences]
+             for position in range(DAILY_POSITIONS)]
+            for day in self.days
+        ]
+
+        # Mutable state, see _assign and _unassign
+        self.staff: List[List[Optional[int]]] = [[None] * DAILY_POSITIONS for _ in self.days]
+        self.working: List[set[int]] = [set() for _ in self.days]
+        self.loads = [0] * count
+        self.week_loads: Dict[tuple[int, tuple[int, int]], int] = {}
+        self.filled = 0
+        for employee_number, dates in (worked or {}).items():
+            if employee_number in self.index:
+                for day in set(dates) - set(self.days):
+                    key = (self.index[employee_number], week_of(day))
+                    self.week_loads[key] = self.week_loads.get(key, 0) + 1
+        # Positions kept as they are, see fix
+        self.fixed: set[tuple[int, int]] = set()
+        # Employee each position had before a repair, see warm_start
+        self.previous: Dict[tuple[int, int], int] = {}
+
+    #### State ####
+
+    def _assign(self, d: int, p: int, i: int) -> None:
+        self.staff[d][p] = i
+        self.working[d].add(i)
+        self.loads[i] += 1
+        key = (i, self.weeks[d])
+        self.week_loads[key] = self.week_loads.get(key, 0) + 1
+        self.filled += 1
+
+    def _unassign(self, d: int, p: int) -> Optional[int]:
+        i = self.staff[d][p]
+        if i is None:
+            return None
+        self.staff[d][p] = None
+        self.working[d].discard(i)
+        self.loads[i] -= 1
+        self.week_loads[(i, self.weeks[d])] -= 1
+        self.filled -= 1
+        return i
+
+    def _can_take(self, d: int, p: int, i: int) -> bool:
+        """Whether employee i could be added to position p on day d without breaking a hard constraint."""
+        return i not in self.working[d] and self.week_loads.get((i, self.weeks[d]), 0) < self.max_days
+
+    def fix(self, day: str, staff: List[Optional[str]]) -> None:
+        """
+        Keep a day's staffing as given, e.g. the days a repair doesn't touch.
+
+        Every position of the day is pinned, so the day is left out of the search and
+        the solved days. Employees that are unknown or no longer allowed on their
+        position don't count towards the loads, their positions stay unstaffed.
+        """
+        d = self.days.index(day)
+        self._keep(d, staff)
+        self.fixed.update((d, p) for p in range(DAILY_POSITIONS))
+
+    def warm_start(self, day: str, staff: List[Optional[str]]) -> None:
+        """
+        Start a day from its existing staffing, which the solver may change at CHANGE_COST per position.
+
+        Like fix, invalid assignments are dropped.
+        """
+        d = self.days.index(day)
+        for p in self._keep(d, staff):
+            self.previous[(d, p)] = self.staff[d][p]
+
+    def _keep(self, d: int, staff: List[Optional[str]]) -> List[int]:
+        """Assign the valid part of a day's staffing, returning the positions that were assigned."""
+        kept = []
+        for p, employee_number in enumerate(staff):
+            i = self.index.get(employee_number)
+            if i is None or i not in self.candidates[d][p] or not self._can_take(d, p, i):
+                continue
+            self._unassign(d, p)
+            self._assign(d, p, i)
+            kept.append(p)
+        return kept
+
+    #### Objective ####
+
+    def _employee_cost(self, load: float, mean: float) -> float:
+        deviation = abs(load - mean)
+        excess = max(0.0, deviation - self.balance * mean)
+        return IMBALANCE_COST * excess * excess + SPREAD_COST * deviation * deviation
+
+    def cost(self) -> float:
+        """The objective value of the current state, lower is better."""
+        unfilled = len(self.days) * DAILY_POSITIONS - self.filled
+        mean = self.filled / len(self.employees) if self.employees else 0.0
+        changes = sum(self._change_cost(d, p, self.staff[d][p]) for d, p in self.previous)
+        return UNFILLED_COST * unfilled + changes + sum(self._employee_cost(load, mean) for load in self.loads)
+
+    def _change_cost(self, d: int, p: int, i: Optional[int]) -> float:
+        previous = self.previous.get((d, p))
+        return CHANGE_COST if previous is not None and i != previous else 0.0
+
+    def _replace_delta(self, old: int, new: int) -> float:
+        """Cost change of moving a day from employee `old` to `new`, the total stays the same."""
+        mean = self.filled / len(self.employees)
+        before = self._employee_cost(self.loads[old], mean) + self._employee_cost(self.loads[new], mean)
+        after = self._employee_cost(self.loads[old] - 1, mean) + self._employee_cost(self.loads[new] + 1, mean)
+        return after - before
+
+    #### Search ####
+
+    @staticmethod
+    def _accept(delta: float, temperature: float, rng: random.Random) -> bool:
+        """Simulated annealing acceptance: always take improvements, worse moves with falling odds."""
+        return delta <= 0 or (temperature > 0 and rng.random() < math.exp(-delta / temperature))
+
+    def _construct(self) -> None:
+        """Greedily staff the free positions, scarcest first, giving each to the least loaded candidate."""
+        for d in range(len(self.days)):
+            free = [p for p in range(DAILY_POSITIONS) if self.staff[d][p] is None and (d, p) not in self.fixed]
+            free.sort(key=lambda p: len(self.candidates[d][p]))
+            for p in free:
+                options = [i for i in self.candidates[d][p] if self._can_take(d, p, i)]
+                if options:
+                    self._assign(d, p, min(options, key=lambda i: (self.loads[i], self.rng.random())))
+
+    def _try_fill(self, d: int, p: int) -> bool:
+        """Staff an empty position, directly or by moving someone over from another position that day."""
+        options = [i for i in self.candidates[d][p] if self._can_take(d, p, i)]
+        if options:
+            self._assign(d, p, min(options, key=lambda i: (self.loads[i], self.rng.random())))
+            return True
+
+        # Ejection chain: move a colleague eligible for p over, and backfill their position
+        for q in range(DAILY_POSITIONS):
+            moved = self.staff[d][q]
+            if moved is None or (d, q) in self.fixed or moved not in self.candidates[d][p]:
+                continue
+            self._unassign(d, q)
+            backfill = [i for i in self.candidates[d][q] if i != moved and self._can_take(d, q, i)]
+            if backfill:
+                self._assign(d, p, moved)
+                self._assign(d, q, self.rng.choice(backfill))
+                return True
+            self._assign(d, q, moved)
+        return False
+
+    def _move(self, temperature: float) -> Optional[float]:
+        """Try one random move, returning the cost change if it was applied or None."""
+        d, p = self.rng.choice(self.movable)
+
+        old = self.staff[d][p]
+        if old is None:
+            # Changes the average load, so recompute the whole cost
+            before = self.cost()
+            return self.cost() - before if self._try_fill(d, p) else None
+
+        if self.rng.random() < 0.5:
+            # Replace the employee with another candidate
+            new = self.rng.choice(self.candidates[d][p])
+            if new == old or not self._can_take(d, p, new):
+                return None
+            delta = self._replace_delta(old, new) + self._change_cost(d, p, new) - self._change_cost(d, p, old)
+            if self._accept(delta, temperature, self.rng):
+                self._unassign(d, p)
+                self._assign(d, p, new)
+                return delta
+            return None
+
+        # Swap positions with a colleague, loads don't change but it can open up positions for others
+        q = self.rng.randrange(DAILY_POSITIONS)
+        other = self.staff[d][q]
+        if q == p or other is None or (d, q) in self.fixed:
+            return None
+        if old not in self.candidates[d][q] or other not in self.candidates[d][p]:
+            return None
+        delta = (self._change_cost(d, p, other) + self._change_cost(d, q, old)
+                 - self._change_cost(d, p, old) - self._change_cost(d, q, other))
+        if not self._accept(delta, temperature, self.rng):
+            return None
+        self._unassign(d, p)
+        self._unassign(d, q)
+        self._assign(d, p, other)
+        self._assign(d, q, old)
+        return delta
+
+    def solve(self, time_budget: float = 0.5) -> Solution:
+        """
+        Staff the days within a time budget.
+
+        Args:
+            time_budget: Seconds the search may run
+
+        Returns:
+            The best solution found
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget
+
+        self._construct()
+        self.movable = [(d, p) for d in range(len(self.days)) for p in range(DAILY_POSITIONS) if (d, p) not in self.fixed]
+        max_stale = min(MAX_STALE_MOVES, STALE_MOVES_PER_POSITION * len(self.movable))
+        best_cost = current_cost = self.cost()
+        best = [row[:] for row in self.staff]
+
+        iterations = 0
+        stale = 0
+        initial_temperature = IMBALANCE_COST
+        while stale < max_stale and self.employees:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            iterations += 1
+            temperature = initial_temperature * (deadline - now) / time_budget
+            delta = self._move(temperature)
+            if delta is None:
+                stale += 1
+                continue
+
+            current_cost += delta
+            if current_cost < best_cost - 1e-9:
+                best_cost = current_cost
+                best = [row[:] for row in self.staff]
+                stale = 0
+            else:
+                stale += 1
+
+        return self._solution(best, best_cost, iterations, (time.perf_counter() - started) * 1000)
+
+    def _solution(self, staff: List[List[Optional[int]]], cost: float, iterations: int, elapsed_ms: float) -> Solution:
+        loads: Dict[str, int] = {}
+        for row in staff:
+            for i in row:
+                if i is not None:
+                    employee_number = self.employees[i].employee_number
+                    loads[employee_number] = loads.get(employee_number, 0) + 1
+        return Solution(
+            assignments={
+                day: [self.employees[i].employee_number if i is not None else None for i in row]
+                for day, row in zip(self.days, staff)
+            },
+            cost=round(cost, 4),
+            iterations=iterations,
+            elapsed_ms=round(elapsed_ms, 3),
+            loads=loads,
+            solved_days=sorted({self.days[d] for d, _ in self.movable}),
+        )
+
+
+def solve_days(
+    roster: List[Dict[str, Any]],
+    days: List[str],
+    rules: Dict[str, Any] = None,
+    worked: Dict[str, set[str]] = None,
+    time_budget: float = 0.5,
+    seed: Optional[int] = None
+) -> Solution:
+    """
+    Staff the daily shift pattern for some days, see ShiftSolver.
+
+    Args:
+        roster: Planning roster rows (employee_number, certifications, known_absences)
+        days: The dates to staff (YYYY-MM-DD)
+        rules: The scheduling rules
+        worked: Dates each employee already works outside `days`
+        time_budget: Seconds the search may run
+        seed: Random seed
+
+    Returns:
+        The best solution found
+    """
+    employees = [SolverEmployee.from_row(row) for row in roster]
+    return ShiftSolver(employees, days, rules, worked, seed).solve(time_budget)
+
+
+def repair_days(
+    roster: List[Dict[str, Any]],
+    plan: Dict[str, List[Optional[str]]],
+    changed: List[str],
+    rules: Dict[str, Any] = None,
+    worked: Dict[str, set[str]] = None,
+    time_budget: float = 0.5,
+    seed: Optional[int] = None
+) -> Solution:
+    """
+    Repair an existing plan after a change, e.g. an employee calling in sick.
+
+    Only the neighborhood of the changed days (see repair_neighborhood) is re-solved,
+    starting from its current staffing and changing as few positions as it can; the
+    other days are kept exactly as they are, unstaffed positions included. Assignments
+    in the neighborhood that became invalid (absences, certifications,
+    max_days_per_week) are dropped and re-staffed.
+
+    Args:
+        roster: Planning roster rows (employee_number, certifications, known_absences)
+        plan: Current employee number per position, by date; the horizon
+        changed: The days affected by the change
+        rules: The scheduling rules
+        worked: Dates each employee works outside the horizon
+        time_budget: Seconds the search may run
+        seed: Random seed
+
+    Returns:
+        The repaired plan, its solved_days being the neighborhood
+    """
+    employees = [SolverEmployee.from_row(row) for row in roster]
+    solver = ShiftSolver(employees, list(plan), rules, worked, seed)
+
+    affected = set(repair_neighborhood(list(plan), changed))
+    # Fixed days first, so they keep their share of the weekly budgets
+    for day in sorted(plan, key=lambda day: day in affected):
+        if day in affected:
+            solver.warm_start(day, plan[day])
+        else:
+            solver.fix(day, plan[day])
+    return solver.solve(time_budget)
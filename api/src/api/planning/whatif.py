@@ -0,0 +1,105 @@
+"""
+What-if evaluation of candidate plans.
+
+Scores alternative shifts for a window in memory, as if each had replaced the stored
+shifts of the window: rule and availability violations and fairness come from the
+scoring module over the window's whole calendar weeks, next to how many pattern
+slots stay unstaffed, how many shifts double-book an employee and how many writes
+the plan would take.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..clients.scheduling import DAILY_SHIFT_HOURS, daily_shift_roles, parse_shift_time
+from .diff import diff_shifts
+from .intervals import EmployeeIntervals, shift_interval
+from .scoring import ScheduleScore, score_schedule
+
+#### Types ####
+
+@dataclass
+class PlanEvaluation:
+    index: int  # Position of the plan in the request
+    name: Optional[str]
+    score: ScheduleScore
+    unfilled: int  # Slots of the daily pattern left unstaffed in the window
+    double_bookings: int  # Pairs of overlapping shifts of the same employee
+    changes: int  # Creates, updates and deletes needed to store the plan
+
+    @property
+    def rank_key(self) -> tuple:
+        """Sort key of plans: fewest unstaffed slots and double bookings, then the lowest penalty, then the fewest writes."""
+        return self.unfilled, self.double_bookings, self.score.penalty, self.changes, self.index
+
+#### Evaluation ####
+
+def unfilled_slots(shifts: List[Dict[str, Any]], window: List[str]) -> int:
+    """Count the slots of the daily shift pattern on the window's dates that no shift staffs."""
+    staffed = Counter()
+    for shift in shifts:
+        try:
+            staffed[(*parse_shift_time(shift["start"]), shift["type"])] += 1
+        except ValueError:
+            continue
+
+    unfilled = 0
+    for day in window:
+        for hour in DAILY_SHIFT_HOURS:
+            for role, needed in Counter(daily_shift_roles(hour)).items():
+                unfilled += max(0, needed - staffed[(day, hour, role)])
+    return unfilled
+
+
+def double_bookings(shifts: List[Dict[str, Any]]) -> int:
+    """Count the pairs of shifts that overlap in time and have the same employee."""
+    by_employee = defaultdict(list)
+    for i, shift in enumerate(shifts):
+        interval = shift_interval({**shift, "shift_id": str(i)})
+        if interval:
+            by_employee[shift["employee_number"]].append(interval)
+    return sum(len(EmployeeIntervals(intervals).conflicts()) for intervals in by_employee.values())
+
+
+def evaluate_plan(
+    index: int,
+    name: Optional[str],
+    shifts: List[Dict[str, Any]],
+    roster: List[Dict[str, Any]],
+    stored: List[Dict[str, Any]],
+    window: List[str],
+    days: List[str],
+    rules: Dict[str, Any] = None
+) -> PlanEvaluation:
+    """
+    Evaluate a candidate plan for a window without storing anything.
+
+    Args:
+        index: Position of the plan among the compared ones
+        name: Optional label of the plan
+        shifts: The plan's shifts (employee_number, start, end, type)
+        roster: Planning roster rows (employee_number, certifications, known_absences)
+        stored: The stored shift documents of `days`
+        window: The dates the plan replaces the stored shifts of
+        days: The consecutive dates to score, the window's calendar weeks
+        rules: The scheduling rules
+
+    Returns:
+        The plan's evaluation
+
+    Raises:
+        ValueError: If a shift's times are invalid or off the slot grid, or a slot
+            has more shifts than it has room for
+    """
+    in_window = set(window)
+    kept = [shift for shift in stored if shift["start"][:10] not in in_window]
+    replaced = [shift for shift in stored if shift["start"][:10] in in_window]
+
+    return PlanEvaluation(
+        index=index,
+        name=name,
+        score=score_schedule(roster, kept + shifts, days, rules),
+        unfilled=unfilled_slots(shifts, window),
+        double_bookings=double_bookings(kept + shifts),
+        changes=len(diff_shifts(replaced, shifts)),
+    )
@@ -1,38 +1,181 @@
+import asyncio
+from datetime import date as Date, timedelta
 import json
 
-from fastapi import APIRouter, Path, Depends, HTTPException, Request
-from typing import Annotated, List, Dict, Optional
+from fastapi import APIRouter, Path, Query, Header, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Annotated, AsyncIterator, Callable, List, Dict, Optional
 from uuid import UUID
 
 from opperai import Opper, trace
 
 from . import conf
-from .clients.scheduling import SchedulingClient
+from .clients.scheduling import (
+    BULK_BATCH_SIZE, SHIFT_ROLES, ConcurrentUpdateError, ServiceUnavailableError, ShiftConflictError,
+    employee_cursor, minutes_to_shift_time, schedule_cursor, shift_cursor, shift_interval_fields
+)
+from .clients.scheduling_async import AsyncSchedulingClient
 from .utils import log
 from .models import (
     Employee, Schedule, Rules,
     ScheduleChangeRequest, ScheduleChangeResponse, ScheduleChangeAnalysis,
     MessageResponse, EmployeeCreateRequest, ScheduleCreateRequest, RulesUpdateRequest, Shift, ShiftCreateRequest,
-    FrontendEmployee, ShiftReview
+    FrontendEmployee, RosterEmployee, ShiftReview, ReadinessResponse, BulkItemResult, BulkWriteResult,
+    ShiftBatchRequest, ShiftBatchResponse, ShiftOpType, SolveRequest, SolveResponse, RepairRequest,
+    EmployeeScore, ScheduleScoreResponse, AvailableEmployee, ReplacementCandidate, ShiftConflict,
+    ShiftDiffRequest, ShiftDiffResponse, ShiftChange, WhatIfRequest, WhatIfResponse, WhatIfResult
 )
+from .planning.candidates import rank_candidates
+from .planning.diff import ShiftDiff, diff_shifts
+from .planning.intervals import shift_interval
+from .planning.availability import mask_days, window_mask
+from .planning.scoring import date_range, load_arrays, score_arrays
+from .planning.parallel import evaluate_plans, solve_multi_start
+from .planning.solver import Solution, plan_from_shifts, repair_days
 
 logger = log.get_logger(__name__)
 
 router = APIRouter()
 
-def get_db_handle(request: Request) -> SchedulingClient:
-    """Util for getting the Couchbase client from the request state."""
-    return request.app.state.db
+def get_db_handle(request: Request) -> AsyncSchedulingClient:
+    """Util for getting the asyncio Couchbase client from the request state."""
+    return request.app.state.async_db
 
 def get_opper_handle(request: Request) -> Opper:
     """Util for getting the Opper client from the request state."""
     return request.app.state.opper
 
-DbHandle = Annotated[SchedulingClient, Depends(get_db_handle)]
+DbHandle = Annotated[AsyncSchedulingClient, Depends(get_db_handle)]
 OpperHandle = Annotated[Opper, Depends(get_opper_handle)]
 
+# Upper bound for the `limit` query parameter of listing endpoints
+MAX_PAGE_SIZE = 1000
+
+PageLimit = Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items to return")]
+PageAfter = Annotated[Optional[str], Query(description="Cursor from X-Next-Cursor of the previous page")]
+StreamRows = Annotated[bool, Query(description="Stream items as NDJSON as they are read")]
+# Upper bound for the number of rows in one bulk import
+MAX_IMPORT_ROWS = 50_000
+
+# Longest period GET /shifts/score accepts, in days
+MAX_SCORE_DAYS = 366
+
+# Longest window GET /availability accepts, in days
+MAX_AVAILABILITY_DAYS = 366
+
+# Longest window the shift diff and what-if endpoints accept, in days
+MAX_DIFF_DAYS = 31
+
+# Upper bound for the number of plans POST /shifts/what-if compares
+MAX_WHAT_IF_PLANS = 20
+
+# Upper bound for the number of operations in one shift batch
+MAX_BATCH_OPS = 1000
+
+# Fields each kind of shift batch operation needs
+SHIFT_OP_FIELDS = {
+    ShiftOpType.CREATE: ("employee_number", "start", "end", "type"),
+    ShiftOpType.UPDATE: ("shift_id",),
+    ShiftOpType.DELETE: ("shift_id",),
+}
+
+IfMatch = Annotated[Optional[str], Header(description="ETag of the version being updated, rejects the update with 409 if it changed")]
+
 #### Helper Functions ####
 
+def etag(cas: int) -> str:
+    """Format a document CAS as an ETag header value."""
+    return f'"{cas}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Parse an If-Match header holding an ETag from `etag` back into a CAS."""
+    if not if_match:
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid If-Match header: {if_match}")
+
+async def list_response(
+    response: Response,
+    rows: AsyncIterator[Dict],
+    model: type[BaseModel],
+    limit: Optional[int],
+    cursor_of: Callable[[Dict], str],
+    stream: bool
+):
+    """
+    Build a listing response from a row stream.
+
+    Either streams the rows as NDJSON, or returns them as a list; both carry the cursor
+    for the next page in the X-Next-Cursor header when the page is full.
+    """
+    # Read the first row up front so bad cursors and query errors surface before any output
+    try:
+        first = await anext(rows, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        # A page is at most `limit` rows, so it's read before streaming to know the cursor;
+        # without a limit there is no next page and the rows stream as the query yields them
+        page = [first] if first is not None else []
+        if limit:
+            page += [row async for row in rows]
+        headers = {"X-Next-Cursor": cursor_of(page[-1])} if limit and len(page) == limit else {}
+
+        async def ndjson():
+            for row in page:
+                yield model(**row).model_dump_json() + "\n"
+            if not limit:
+                async for row in rows:
+                    yield model(**row).model_dump_json() + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=headers)
+
+    items = []
+    last = first
+    if first is not None:
+        items.append(model(**first))
+        async for row in rows:
+            items.append(model(**row))
+            last = row
+
+    if limit and len(items) == limit:
+        response.headers["X-Next-Cursor"] = cursor_of(last)
+    return items
+
+async def read_import_rows(request: Request) -> AsyncIterator[tuple[int, bytes | Dict]]:
+    """
+    Read the rows of a bulk import body, numbered from 0.
+
+    NDJSON bodies (application/x-ndjson) are read line by line as they arrive and
+    yield the raw lines; anything else must be a JSON array and yields its items.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type:
+        row = 0
+        buffer = b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield row, line
+                    row += 1
+        if buffer.strip():
+            yield row, buffer
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or an NDJSON body")
+    for row, item in enumerate(items):
+        yield row, item
+
 @trace
 def process_schedule_change(
     opper: Opper,
@@ -65,12 +208,140 @@ def process_schedule_change(
     logger.info(f"Schedule change request analysis: {analysis_result.dict()}")
     return analysis_result
 
+async def worked_days(db: AsyncSchedulingClient, days: List[str]) -> Dict[str, set[str]]:
+    """Get the dates each employee has shifts on, over the calendar weeks of the given days."""
+    first, last = Date.fromisoformat(min(days)), Date.fromisoformat(max(days))
+    week_start = first - timedelta(days=first.weekday())
+    week_end = last + timedelta(days=7 - last.weekday())
+
+    worked: Dict[str, set[str]] = {}
+    async for shift in db.stream_shifts(start=week_start.isoformat(), end=week_end.isoformat()):
+        worked.setdefault(shift["employee_number"], set()).add(shift["start"][:10])
+    return worked
+
+def week_of_date(date: str) -> tuple[str, str]:
+    """Get the first and last date of a date's calendar week (Monday to Sunday)."""
+    try:
+        day = Date.fromisoformat(date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date {date}, expected YYYY-MM-DD")
+    monday = day - timedelta(days=day.weekday())
+    return monday.isoformat(), (monday + timedelta(days=6)).isoformat()
+
+def horizon(start: str, days: int) -> List[str]:
+    """Get the dates of a planning horizon."""
+    try:
+        first = Date.fromisoformat(start)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date {start}, expected YYYY-MM-DD")
+    return [(first + timedelta(days=i)).isoformat() for i in range(days)]
+
+def solve_response(solution: Solution, persisted: bool) -> SolveResponse:
+    return SolveResponse(
+        solved_days=solution.solved_days,
+        shifts=[Shift(**doc) for doc in solution.shift_docs()],
+        unfilled=solution.unfilled_keys(),
+        loads=solution.loads,
+        cost=solution.cost,
+        iterations=solution.iterations,
+        elapsed_ms=solution.elapsed_ms,
+        persisted=persisted
+    )
+
+async def stored_day_shifts(db: AsyncSchedulingClient, days: List[str]) -> List[Dict]:
+    """
+    Get the stored shifts starting on some days, in date order.
+
+    Slot key shifts are read with concurrent gets, so just written ones aren't missed
+    while the index catches up; the shift window query adds the ones stored under
+    other (legacy uuid) keys.
+    """
+    day_after = (Date.fromisoformat(days[-1]) + timedelta(days=1)).isoformat()
+    day_shifts, window = await asyncio.gather(
+        asyncio.gather(*(db.get_day_shifts(day) for day in days)),
+        db.get_shifts(start=days[0], end=day_after)
+    )
+    dates = set(days)
+    stored = {shift["shift_id"]: shift for shift in window if shift["start"][:10] in dates}
+    stored.update((shift["shift_id"], shift) for shifts in day_shifts for shift in shifts)
+    return list(stored.values())
+
+async def persist_solution(db: AsyncSchedulingClient, solution: Solution) -> ShiftDiff:
+    """Store a solution's days in one transaction, writing only the shifts that changed."""
+    stored = await stored_day_shifts(db, solution.solved_days)
+    diff = diff_shifts(stored, solution.shift_docs())
+    if diff:
+        try:
+            await db.apply_plan({}, shifts=diff.writes(), shift_deletes=diff.delete_ids())
+        except ShiftConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Persisted solution: {len(diff)} shifts changed, {diff.unchanged} unchanged")
+    return diff
+
+def window_days(start: str, end: Optional[str]) -> List[str]:
+    """Get the dates of a diff or what-if window, end defaulting to start."""
+    try:
+        days = date_range(start, end or start)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start or end, expected YYYY-MM-DD")
+    if not days or len(days) > MAX_DIFF_DAYS:
+        raise HTTPException(status_code=400, detail=f"The window must span 1 to {MAX_DIFF_DAYS} days")
+    return days
+
+def check_in_window(shifts: List[ShiftCreateRequest], days: List[str], label: str = "Shifts") -> None:
+    """Reject shifts starting outside a window."""
+    outside = [shift.start for shift in shifts if shift.start[:10] not in days]
+    if outside:
+        raise HTTPException(status_code=400, detail=f"{label} starting outside the window: {', '.join(outside[:10])}")
+
+async def check_employees_exist(db: AsyncSchedulingClient, employee_numbers: List[str]) -> None:
+    """Reject requests referencing unknown employees, checked with one multi-get."""
+    numbers = set(employee_numbers)
+    employees = await db.get_employees_by_number(list(numbers))
+    missing = sorted(numbers - employees.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Employees not found: {', '.join(missing)}")
+
+async def window_diff(db: AsyncSchedulingClient, request: ShiftDiffRequest) -> ShiftDiff:
+    """Diff the proposed shifts of a diff request against the stored shifts of its window."""
+    days = window_days(request.start, request.end)
+    check_in_window(request.shifts, days)
+
+    await check_employees_exist(db, [shift.employee_number for shift in request.shifts])
+
+    stored = await stored_day_shifts(db, days)
+    try:
+        return diff_shifts(stored, [shift.model_dump() for shift in request.shifts])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def diff_response(diff: ShiftDiff, applied: bool) -> ShiftDiffResponse:
+    return ShiftDiffResponse(
+        creates=[Shift(**doc) for doc in diff.creates],
+        updates=[ShiftChange(before=Shift(**before), after=Shift(**after)) for before, after in diff.updates],
+        deletes=[Shift(**doc) for doc in diff.deletes],
+        unchanged=diff.unchanged,
+        applied=applied
+    )
+
 #### Routes ####
 
 @router.get("", response_model=MessageResponse)
 async def hello() -> MessageResponse:
     return MessageResponse(message="Hello from the Employee Scheduling API!")
 
+@router.get("/health/ready", response_model=ReadinessResponse)
+async def ready(
+    db: DbHandle,
+    response: Response
+) -> ReadinessResponse:
+    """Report per-service database readiness, with a 503 until everything is ready."""
+    services = db.readiness()
+    is_ready = all(services.values())
+    if not is_ready:
+        response.status_code = 503
+    return ReadinessResponse(ready=is_ready, services=services)
+
 # Employee Routes
 @router.post("/employees", response_model=Employee)
 async def create_employee(
@@ -88,46 +359,124 @@ async def create_employee(
     # return Employee(**employee)
     raise RuntimeError('STALE FUNCTION CALLED')
 
+@router.post("/employees/bulk", response_model=BulkWriteResult)
+async def import_employees(
+    db: DbHandle,
+    request: Request
+) -> BulkWriteResult:
+    """
+    Create or replace employees in bulk from a JSON array or NDJSON body of employees.
+
+    Every row is validated before anything is written, then the valid rows are stored
+    with concurrent upserts. The result has one entry per row in input order, keyed by
+    employee number (or "row N" for rows that couldn't be parsed).
+    """
+    results: List[Optional[BulkItemResult]] = []
+    docs: Dict[str, Dict] = {}
+    rows_of: Dict[str, int] = {}
+
+    async for row, raw in read_import_rows(request):
+        if row >= MAX_IMPORT_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_IMPORT_ROWS} employees per import")
+        try:
+            employee = Employee.model_validate_json(raw) if isinstance(raw, bytes) else Employee.model_validate(raw)
+        except ValidationError as e:
+            results.append(BulkItemResult(id=f"row {row}", success=False, error=str(e)))
+            continue
+        if employee.employee_number in docs:
+            duplicate_of = rows_of[employee.employee_number]
+            results.append(BulkItemResult(id=employee.employee_number, success=False, error=f"Duplicate of row {duplicate_of}"))
+            continue
+        docs[employee.employee_number] = employee.model_dump()
+        rows_of[employee.employee_number] = row
+        results.append(None)
+
+    written = await db.create_employees(docs, batch_size=BULK_BATCH_SIZE)
+    for item in written.results:
+        results[rows_of[item.id]] = item
+
+    logger.info(f"Imported {len(written.succeeded)} of {len(results)} employees")
+    return BulkWriteResult(results=results)
+
 @router.get("/employees", response_model=List[FrontendEmployee])
 async def get_employees(
-    db: DbHandle
+    db: DbHandle,
+    response: Response,
+    limit: PageLimit = None,
+    after: PageAfter = None,
+    stream: StreamRows = False
 ) -> List[FrontendEmployee]:
-    """Get all employees."""
-    employees = db.get_employees()
-    print('employees: ', employees)
-    return [FrontendEmployee(**emp) for emp in employees]
+    """Get employees ordered by employee number, optionally a page at a time."""
+    employees = db.stream_employees(limit, after)
+    return await list_response(response, employees, FrontendEmployee, limit, employee_cursor, stream)
+
+@router.get("/employees/roster", response_model=List[RosterEmployee])
+async def get_roster(
+    db: DbHandle
+) -> List[RosterEmployee]:
+    """Get every employee's scheduling fields (support count, absences) from the covering index."""
+    roster = await db.get_roster()
+    return [RosterEmployee(**emp) for emp in roster]
 
 @router.get("/employees/{employee_number}", response_model=Employee)
 async def get_employee(
     db: DbHandle,
+    response: Response,
     employee_number: str = Path(..., description="The employee number")
 ) -> Employee:
     """Get an employee by employee number."""
-    employee = db.get_employee(employee_number)
+    employee, cas = await db.get_employee_with_cas(employee_number)
     if not employee:
         raise HTTPException(status_code=404, detail=f"Employee with number {employee_number} not found")
+    response.headers["ETag"] = etag(cas)
     return Employee(**employee)
 
 @router.put("/employees/{employee_number}", response_model=Employee)
 async def update_employee(
     db: DbHandle,
     request: EmployeeCreateRequest,
+    response: Response,
+    if_match: IfMatch = None,
     employee_number: str = Path(..., description="The employee number")
 ) -> Employee:
     """Update an employee."""
     # Check if employee exists
-    if not db.get_employee(employee_number):
+    if not await db.get_employee(employee_number):
         raise HTTPException(status_code=404, detail=f"Employee with number {employee_number} not found")
 
     updates = request.dict(exclude_unset=True)
-    success = db.update_employee(employee_number, updates)
+    try:
+        cas = await db.update_employee(employee_number, updates, cas=parse_if_match(if_match))
+    except ConcurrentUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-    if not success:
+    if not cas:
         raise HTTPException(status_code=500, detail="Failed to update employee")
 
-    employee = db.get_employee(employee_number)
+    employee = await db.get_employee(employee_number)
+    response.headers["ETag"] = etag(cas)
     return Employee(**employee)
 
+@router.get("/employees/{employee_number}/conflicts", response_model=List[ShiftConflict])
+async def get_employee_conflicts(
+    db: DbHandle,
+    employee_number: str = Path(..., description="The employee number")
+) -> List[ShiftConflict]:
+    """Get the pairs of an employee's shifts that overlap in time, ordered by start."""
+    if not await db.get_employee(employee_number):
+        raise HTTPException(status_code=404, detail=f"Employee with number {employee_number} not found")
+
+    conflicts = await db.get_shift_conflicts(employee_number)
+    return [
+        ShiftConflict(
+            shift_id=first_id,
+            other_shift_id=second_id,
+            overlap_start=minutes_to_shift_time(second_start),
+            overlap_end=minutes_to_shift_time(min(first_end, second_end))
+        )
+        for (_, first_end, first_id), (second_start, second_end, second_id) in conflicts
+    ]
+
 @router.delete("/employees/{employee_number}", response_model=MessageResponse)
 async def delete_employee(
     db: DbHandle,
@@ -135,10 +484,10 @@ async def delete_employee(
 ) -> MessageResponse:
     """Delete an employee."""
     # Check if employee exists
-    if not db.get_employee(employee_number):
+    if not await db.get_employee(employee_number):
         raise HTTPException(status_code=404, detail=f"Employee with number {employee_number} not found")
 
-    success = db.delete_employee(employee_number)
+    success = await db.delete_employee(employee_number)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete employee")
@@ -153,26 +502,30 @@ async def create_schedule(
 ) -> Schedule:
     """Create a new schedule entry."""
     # Check if employee exists
-    if not db.get_employee(request.first_line_support):
+    if not await db.get_employee(request.first_line_support):
         raise HTTPException(status_code=404, detail=f"Employee with number {request.first_line_support} not found")
 
-    date_str = db.create_schedule(
+    date_str = await db.create_schedule(
         date_str=request.date,
         employee_number=request.first_line_support
     )
 
-    schedule = db.get_schedule(date_str)
+    schedule = await db.get_schedule(date_str)
     return Schedule(**schedule)
 
 @router.get("/schedules", response_model=List[Schedule])
 async def get_schedules(
     db: DbHandle,
+    response: Response,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    limit: PageLimit = None,
+    after: PageAfter = None,
+    stream: StreamRows = False
 ) -> List[Schedule]:
-    """Get schedules within a date range."""
-    schedules = db.get_schedules(start_date, end_date)
-    return [Schedule(**schedule) for schedule in schedules]
+    """Get schedules within a date range, optionally a page at a time."""
+    schedules = db.stream_schedules(start_date, end_date, limit, after)
+    return await list_response(response, schedules, Schedule, limit, schedule_cursor, stream)
 
 @router.get("/schedules/{date}", response_model=Schedule)
 async def get_schedule(
@@ -180,11 +533,47 @@ async def get_schedule(
     date: str = Path(..., description="The date in ISO format (YYYY-MM-DD)")
 ) -> Schedule:
     """Get a schedule by date."""
-    schedule = db.get_schedule(date)
+    schedule = await db.get_schedule(date)
     if not schedule:
         raise HTTPException(status_code=404, detail=f"Schedule for date {date} not found")
     return Schedule(**schedule)
 
+@router.get("/schedules/{date}/candidates", response_model=List[ReplacementCandidate])
+async def get_schedule_candidates(
+    db: DbHandle,
+    date: str = Path(..., description="The date in ISO format (YYYY-MM-DD)"),
+    limit: int = Query(5, ge=1, le=100, description="Number of candidates to return")
+) -> List[ReplacementCandidate]:
+    """
+    Rank who could take over first-line support on a date, best first.
+
+    Candidates must be free that day and have max_days_per_week headroom left in its
+    week; they are ranked by first-line support count against preferred_balance.
+    """
+    monday, sunday = week_of_date(date)
+    schedule, roster, rules, available, week = await asyncio.gather(
+        db.get_schedule(date),
+        db.get_roster(),
+        db.get_rules(),
+        db.get_availability(date, date),
+        db.get_schedules(start_date=monday, end_date=sunday)
+    )
+
+    week_days: Dict[str, int] = {}
+    for other in week:
+        if other["date"] != date:
+            week_days[other["first_line_support"]] = week_days.get(other["first_line_support"], 0) + 1
+
+    candidates = rank_candidates(
+        available,
+        loads={emp["employee_number"]: emp["first_line_support_count"] for emp in roster},
+        week_days=week_days,
+        rules=rules,
+        exclude=[schedule["first_line_support"]] if schedule else [],
+        limit=limit
+    )
+    return [ReplacementCandidate(**vars(candidate)) for candidate in candidates]
+
 @router.put("/schedules/{date}", response_model=Schedule)
 async def update_schedule(
     db: DbHandle,
@@ -193,19 +582,19 @@ async def update_schedule(
 ) -> Schedule:
     """Update a schedule entry."""
     # Check if schedule exists
-    if not db.get_schedule(date):
+    if not await db.get_schedule(date):
         raise HTTPException(status_code=404, detail=f"Schedule for date {date} not found")
 
     # Check if employee exists
-    if not db.get_employee(request.first_line_support):
+    if not await db.get_employee(request.first_line_support):
         raise HTTPException(status_code=404, detail=f"Employee with number {request.first_line_support} not found")
 
-    success = db.update_schedule(date, request.first_line_support)
+    success = await db.update_schedule(date, request.first_line_support)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update schedule")
 
-    schedule = db.get_schedule(date)
+    schedule = await db.get_schedule(date)
     return Schedule(**schedule)
 
 @router.delete("/schedules/{date}", response_model=MessageResponse)
@@ -215,16 +604,23 @@ async def delete_schedule(
 ) -> MessageResponse:
     """Delete a schedule entry."""
     # Check if schedule exists
-    if not db.get_schedule(date):
+    if not await db.get_schedule(date):
         raise HTTPException(status_code=404, detail=f"Schedule for date {date} not found")
 
-    success = db.delete_schedule(date)
+    success = await db.delete_schedule(date)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete schedule")
 
     return MessageResponse(message=f"Schedule for date {date} deleted successfully")
 
+@router.post("/schedules/recount", response_model=Dict[str, int])
+async def recount_schedules(
+    db: DbHandle
+) -> Dict[str, int]:
+    """Recompute first-line support counts for all employees from the stored schedules."""
+    return await db.recount_employee_counts()
+
 # Shift Routes
 @router.post("/shifts", response_model=Shift)
 async def create_shift(
@@ -233,44 +629,356 @@ async def create_shift(
 ) -> Shift:
     """Create a new shift entry."""
     # Check if employee exists
-    if not db.get_employee(request.employee_number):
+    if not await db.get_employee(request.employee_number):
         raise HTTPException(status_code=404, detail=f"Employee with number {request.employee_number} not found")
 
-    shift_id = db.create_shift(
-        employee_number=request.employee_number,
-        start=request.start,
-        end=request.end,
-        type=request.type
-    )
+    try:
+        shift_id = await db.create_shift(
+            employee_number=request.employee_number,
+            start=request.start,
+            end=request.end,
+            type=request.type
+        )
+    except ShiftConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    shift = db.get_shift(shift_id)
+    shift = await db.get_shift(shift_id)
     return Shift(**shift)
 
 @router.put("/shifts", response_model=Shift)
 async def update_shift(
     db: DbHandle,
-    request: Shift
+    request: Shift,
+    response: Response,
+    if_match: IfMatch = None
 ) -> Shift:
-    """Update an employee."""
-    # Check if employee exists
-    if not db.get_shift(request.shift_id):
+    """Update a shift."""
+    updates = request.dict(exclude_unset=True, exclude={"etag"})
+    try:
+        cas = await db.update_shift(request.shift_id, updates, cas=parse_if_match(if_match))
+    except (ConcurrentUpdateError, ShiftConflictError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not cas:
         raise HTTPException(status_code=404, detail=f"Shift with id {request.shift_id} not found")
 
-    updates = request.dict(exclude_unset=True)
-    success = db.update_shift(request.shift_id, updates)
+    # Every field of the shift was written, so the request plus the derived times is the stored shift
+    response.headers["ETag"] = etag(cas)
+    return request.copy(update={**shift_interval_fields(request.start, request.end), "etag": etag(cas)})
 
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to update shift")
+@router.post("/shifts/batch", response_model=ShiftBatchResponse)
+async def apply_shift_batch(
+    db: DbHandle,
+    request: ShiftBatchRequest
+) -> ShiftBatchResponse:
+    """
+    Create, update and delete many shifts in one request.
+
+    Referenced employees are checked with one multi-get, then the writes are applied
+    in concurrent waves (deletes, updates, creates). Each operation succeeds or fails
+    on its own; the response has a result per operation and the resulting shifts.
+    """
+    if len(request.ops) > MAX_BATCH_OPS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_OPS} operations per batch")
+
+    employees = await db.get_employees_by_number([op.employee_number for op in request.ops if op.employee_number])
+
+    results: List[Optional[BulkItemResult]] = [None] * len(request.ops)
+    ops, positions = [], []
+    for i, op in enumerate(request.ops):
+        missing = [field for field in SHIFT_OP_FIELDS[op.op] if getattr(op, field) is None]
+        if missing:
+            error = f"{op.op.value} requires {', '.join(missing)}"
+        elif op.employee_number and op.employee_number not in employees:
+            error = f"Employee with number {op.employee_number} not found"
+        else:
+            ops.append({"op": op.op.value, "ref": f"op {i}", **op.model_dump(exclude={"op"}, exclude_none=True)})
+            positions.append(i)
+            continue
+        results[i] = BulkItemResult(id=op.shift_id or f"op {i}", success=False, error=error)
+
+    applied, shifts = await db.apply_shift_ops(ops)
+    for position, item in zip(positions, applied):
+        results[position] = item
+
+    return ShiftBatchResponse(results=results, shifts=[Shift(**shift) for shift in shifts])
+
+@router.post("/shifts/diff", response_model=ShiftDiffResponse)
+async def preview_shift_diff(
+    db: DbHandle,
+    request: ShiftDiffRequest
+) -> ShiftDiffResponse:
+    """
+    Preview the minimal changes turning the stored shifts of a window into the proposed ones.
+
+    Proposed shifts are matched to stored ones of the same slot (start hour and role),
+    preferring the same employee; matches are left alone or updated in place, and
+    only the rest is created or deleted.
+    """
+    return diff_response(await window_diff(db, request), applied=False)
+
+@router.post("/shifts/diff/apply", response_model=ShiftDiffResponse)
+async def apply_shift_diff(
+    db: DbHandle,
+    request: ShiftDiffRequest
+) -> ShiftDiffResponse:
+    """Replace the shifts of a window with the proposed ones, writing only the changes in one transaction."""
+    diff = await window_diff(db, request)
+    if diff:
+        try:
+            await db.apply_plan({}, shifts=diff.writes(), shift_deletes=diff.delete_ids())
+        except ShiftConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    return diff_response(diff, applied=True)
+
+@router.post("/shifts/what-if", response_model=WhatIfResponse)
+async def compare_plans(
+    db: DbHandle,
+    request: WhatIfRequest
+) -> WhatIfResponse:
+    """
+    Compare alternative plans for a window without storing any of them.
+
+    Each plan is scored as if it replaced the stored shifts of the window: against
+    the rules, absences and certifications and for fairness over the window's calendar
+    weeks, plus unstaffed slots, double bookings and the writes it would take. The
+    plans are evaluated in parallel processes and returned best first.
+    """
+    if not request.plans:
+        raise HTTPException(status_code=400, detail="No plans to compare")
+    if len(request.plans) > MAX_WHAT_IF_PLANS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_WHAT_IF_PLANS} plans per comparison")
+
+    window = window_days(request.start, request.end)
+    for i, plan in enumerate(request.plans):
+        check_in_window(plan.shifts, window, label=f"Plan {i}: shifts")
+
+    first, last = Date.fromisoformat(window[0]), Date.fromisoformat(window[-1])
+    days = date_range(
+        (first - timedelta(days=first.weekday())).isoformat(),
+        (last + timedelta(days=6 - last.weekday())).isoformat()
+    )
+    await check_employees_exist(db, [shift.employee_number for plan in request.plans for shift in plan.shifts])
+    roster, rules, stored = await asyncio.gather(db.get_planning_roster(), db.get_rules(), stored_day_shifts(db, days))
 
-    shift = db.get_shift(request.shift_id)
-    return Shift(**shift)
+    # Scoring is CPU bound, the plans are evaluated in the solver's process pool
+    plans = [(plan.name, [shift.model_dump() for shift in plan.shifts]) for plan in request.plans]
+    try:
+        outcomes = await asyncio.to_thread(evaluate_plans, plans, roster, stored, window, days, rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    ranked = sorted(outcomes, key=lambda evaluation: evaluation.rank_key)
+    return WhatIfResponse(
+        start=window[0],
+        end=window[-1],
+        scored_start=days[0],
+        scored_end=days[-1],
+        results=[
+            WhatIfResult(
+                rank=rank,
+                index=evaluation.index,
+                name=evaluation.name,
+                unfilled=evaluation.unfilled,
+                double_bookings=evaluation.double_bookings,
+                changes=evaluation.changes,
+                **evaluation.score.summary()
+            )
+            for rank, evaluation in enumerate(ranked, start=1)
+        ]
+    )
+
+@router.post("/shifts/solve", response_model=SolveResponse)
+async def solve_shifts(
+    db: DbHandle,
+    request: SolveRequest
+) -> SolveResponse:
+    """
+    Staff the shift pattern of one or more days from the whole roster with the local solver.
+
+    Respects absences, certifications and max_days_per_week (counting shifts already
+    stored for the rest of the weeks), and balances days worked per preferred_balance.
+    With workers > 1, that many randomized restarts run in parallel processes and the
+    one scoring best is kept. With persist the days' shifts are replaced by the
+    solution in one transaction, writing only the shifts that changed.
+    """
+    days = horizon(request.date, request.days)
+    roster = await db.get_planning_roster()
+    rules = await db.get_rules()
+    worked = await worked_days(db, days)
+
+    # The search is CPU bound, keep it off the event loop
+    solution = await asyncio.to_thread(
+        solve_multi_start, roster, days, rules, worked, request.time_budget_ms / 1000, request.seed, request.workers
+    )
+
+    if request.persist:
+        await persist_solution(db, solution)
+
+    return solve_response(solution, request.persist)
+
+@router.post("/shifts/repair", response_model=SolveResponse)
+async def repair_shifts(
+    db: DbHandle,
+    request: RepairRequest
+) -> SolveResponse:
+    """
+    Repair a stored plan after a change, e.g. a sick call, without re-solving all of it.
+
+    Only the changed days and the rest of their weeks are re-solved, changing as few
+    positions as possible; with persist just the changed shifts of those days are stored.
+    """
+    days = horizon(request.date, request.days)
+    day_shifts = await asyncio.gather(*(db.get_day_shifts(day) for day in days))
+    plan = {day: plan_from_shifts(day, shifts) for day, shifts in zip(days, day_shifts)}
+
+    changed = [day for day in request.changed if day in plan]
+    if request.employee_number:
+        changed += [day for day, staff in plan.items() if request.employee_number in staff]
+    if not changed:
+        raise HTTPException(status_code=400, detail="No changed days within the horizon")
+
+    roster = await db.get_planning_roster()
+    rules = await db.get_rules()
+    worked = await worked_days(db, days)
+
+    solution = await asyncio.to_thread(
+        repair_days, roster, plan, changed, rules, worked, request.time_budget_ms / 1000, request.seed
+    )
+
+    if request.persist:
+        await persist_solution(db, solution)
+
+    return solve_response(solution, request.persist)
+
+@router.get("/shifts/score", response_model=ScheduleScoreResponse)
+async def score_shifts(
+    db: DbHandle,
+    start: str = Query(..., description="First date to score (YYYY-MM-DD)"),
+    end: str = Query(..., description="Last date to score, included (YYYY-MM-DD)")
+) -> ScheduleScoreResponse:
+    """Score the stored shifts of a period against the rules and for fairness."""
+    try:
+        days = date_range(start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start or end, expected YYYY-MM-DD")
+    if not days or len(days) > MAX_SCORE_DAYS:
+        raise HTTPException(status_code=400, detail=f"The period must span 1 to {MAX_SCORE_DAYS} days")
+
+    roster = await db.get_planning_roster()
+    rules = await db.get_rules()
+    day_after = (Date.fromisoformat(end) + timedelta(days=1)).isoformat()
+    shifts = await db.get_shifts(start=start, end=day_after)
+
+    def score():
+        arrays = load_arrays(roster, shifts, days)
+        return arrays, score_arrays(arrays, rules)
+
+    arrays, result = await asyncio.to_thread(score)
+    return ScheduleScoreResponse(
+        start=start,
+        end=end,
+        unknown_shifts=arrays.unknown_shifts,
+        per_employee=[EmployeeScore(**row) for row in result.per_employee()],
+        **result.summary()
+    )
+
+@router.get("/shifts/{shift_id}/candidates", response_model=List[ReplacementCandidate])
+async def get_shift_candidates(
+    db: DbHandle,
+    shift_id: str = Path(..., description="The shift id"),
+    limit: int = Query(5, ge=1, le=100, description="Number of candidates to return")
+) -> List[ReplacementCandidate]:
+    """
+    Rank who could take over a shift, best first.
+
+    Candidates must be free that day, certified for the shift's role, not already on a
+    shift overlapping it and have max_days_per_week headroom left in its week; they
+    are ranked by days worked that week against preferred_balance.
+    """
+    shift = await db.get_shift(shift_id)
+    if not shift:
+        raise HTTPException(status_code=404, detail=f"Shift with id {shift_id} not found")
+
+    interval = shift_interval(shift)
+    if interval is None:
+        raise HTTPException(status_code=400, detail=f"Shift {shift_id} has invalid times")
+
+    date = shift["start"][:10]
+    monday, _ = week_of_date(date)
+    roster, rules, available, worked, overlapping = await asyncio.gather(
+        db.get_planning_roster(),
+        db.get_rules(),
+        db.get_availability(date, date, shift["type"] if shift["type"] in SHIFT_ROLES else None),
+        worked_days(db, [date]),
+        db.get_shifts(start=shift["start"], end=shift["end"])
+    )
+    # worked_days covers the whole week, keep the days of this one
+    week = {(Date.fromisoformat(monday) + timedelta(days=i)).isoformat() for i in range(7)}
+    # Whoever works a shift overlapping this one, whatever its start, the shift's own employee included
+    busy = [
+        other["employee_number"] for other in overlapping
+        if (other_interval := shift_interval(other)) and other_interval[0] < interval[1] and interval[0] < other_interval[1]
+    ]
+
+    candidates = rank_candidates(
+        available,
+        loads={emp["employee_number"]: len(worked.get(emp["employee_number"], set()) & week) for emp in roster},
+        week_days={number: len((dates & week) - {date}) for number, dates in worked.items()},
+        rules=rules,
+        exclude=busy,
+        limit=limit
+    )
+    return [ReplacementCandidate(**vars(candidate)) for candidate in candidates]
 
 @router.get("/shifts", response_model=List[Shift])
 async def get_shifts(
-    db: DbHandle
+    db: DbHandle,
+    response: Response,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    employee_number: Optional[str] = None,
+    type: Optional[str] = None,
+    limit: PageLimit = None,
+    after: PageAfter = None,
+    stream: StreamRows = False
 ) -> List[Shift]:
-    """Get shifts within a date range."""
-    shifts = db.get_shifts()
+    """
+    Get shifts overlapping a time window, optionally for one employee or shift type and a page at a time.
+
+    Each shift carries its ETag, to send as If-Match when updating it.
+    """
+    async def with_etags() -> AsyncIterator[Dict]:
+        async for row in db.stream_shifts(start, end, employee_number, type, limit, after, with_cas=True):
+            cas = row.pop("cas", None)
+            yield {**row, "etag": etag(cas)} if cas else row
+
+    return await list_response(response, with_etags(), Shift, limit, shift_cursor, stream)
+
+@router.get("/shifts/{shift_id}", response_model=Shift)
+async def get_shift(
+    db: DbHandle,
+    response: Response,
+    shift_id: str = Path(..., description="The shift id")
+) -> Shift:
+    """Get a shift by id."""
+    shift, cas = await db.get_shift_with_cas(shift_id)
+    if not shift:
+        raise HTTPException(status_code=404, detail=f"Shift with id {shift_id} not found")
+    response.headers["ETag"] = etag(cas)
+    return Shift(**shift)
+
+@router.get("/shifts/day/{date}", response_model=List[Shift])
+async def get_day_shifts(
+    db: DbHandle,
+    date: str = Path(..., description="The date in ISO format (YYYY-MM-DD)")
+) -> List[Shift]:
+    """Get a day's shifts by their slot keys, without a query."""
+    shifts = await db.get_day_shifts(date)
     return [Shift(**shift) for shift in shifts]
 
 @router.get("/evaluate", response_model=ShiftReview)
@@ -278,7 +986,7 @@ async def evaluate_shifts(
         db: DbHandle,
         opper: OpperHandle
 ) -> ShiftReview:
-    shifts = db.get_shifts()
+    shifts = await db.get_shifts()
     hr_record = json.loads(conf.hr_file)
     analysis_result, _ = opper.call(
         name="evaluate_shift_scheduling",
@@ -304,10 +1012,10 @@ async def delete_schedule(
 ) -> MessageResponse:
     """Delete a shift entry."""
     # Check if shift exists
-    if not db.get_shift(shift_id):
+    if not await db.get_shift(shift_id):
         raise HTTPException(status_code=404, detail=f"Shift for id {shift_id} not found")
 
-    success = db.delete_shift(shift_id)
+    success = await db.delete_shift(shift_id)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete shift")
@@ -315,19 +1023,66 @@ async def delete_schedule(
     return MessageResponse(message=f"Shift with id {shift_id} deleted successfully")
 
 
+@router.get("/cache/stats", response_model=Dict[str, int])
+async def get_cache_stats(
+    db: DbHandle
+) -> Dict[str, int]:
+    """Get the document cache's size and hit/miss counters."""
+    return db.cache_stats()
+
+@router.get("/queries/stats", response_model=Dict[str, Dict[str, float]])
+async def get_query_stats(
+    db: DbHandle
+) -> Dict[str, Dict[str, float]]:
+    """Get per-statement N1QL call counts, row counts and latencies."""
+    return db.query_stats()
+
+# Availability Routes
+@router.get("/availability", response_model=List[AvailableEmployee])
+async def get_availability(
+    db: DbHandle,
+    start: str = Query(..., description="First date (YYYY-MM-DD)"),
+    end: str = Query(..., description="Last date, included (YYYY-MM-DD)"),
+    role: Optional[str] = Query(None, description="Only employees whose certifications allow this role")
+) -> List[AvailableEmployee]:
+    """Get the employees available on at least one day of a window, with the days they are free."""
+    try:
+        days = (Date.fromisoformat(end) - Date.fromisoformat(start)).days + 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start or end, expected YYYY-MM-DD")
+    if not 1 <= days <= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(status_code=400, detail=f"The window must span 1 to {MAX_AVAILABILITY_DAYS} days")
+    if role and role not in SHIFT_ROLES:
+        raise HTTPException(status_code=400, detail=f"Unknown role {role}, expected one of {', '.join(SHIFT_ROLES)}")
+    try:
+        window = window_mask(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    available = await db.get_availability(start, end, role)
+    return [
+        AvailableEmployee(employee_number=number, available_days=mask_days(free), fully_available=free == window)
+        for number, free in sorted(available.items())
+    ]
+
 # Rules Routes
 @router.get("/rules", response_model=Rules)
 async def get_rules(
-    db: DbHandle
+    db: DbHandle,
+    response: Response
 ) -> Rules:
     """Get the scheduling system rules."""
-    rules = db.get_rules()
+    rules, cas = await db.get_rules_with_cas()
+    if cas:
+        response.headers["ETag"] = etag(cas)
     return Rules(**rules)
 
 @router.put("/rules", response_model=Rules)
 async def update_rules(
     db: DbHandle,
-    request: RulesUpdateRequest
+    request: RulesUpdateRequest,
+    response: Response,
+    if_match: IfMatch = None
 ) -> Rules:
     """Update the scheduling system rules."""
     updates = {k: v for k, v in request.dict().items() if v is not None}
@@ -335,12 +1090,16 @@ async def update_rules(
     if not updates:
         raise HTTPException(status_code=400, detail="No valid updates provided")
 
-    success = db.update_rules(updates)
+    try:
+        cas = await db.update_rules(updates, cas=parse_if_match(if_match))
+    except ConcurrentUpdateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-    if not success:
+    if not cas:
         raise HTTPException(status_code=500, detail="Failed to update rules")
 
-    rules = db.get_rules()
+    rules = await db.get_rules()
+    response.headers["ETag"] = etag(cas)
     return Rules(**rules)
 
 # Schedule Change Request
@@ -353,23 +1112,17 @@ async def process_schedule_change_request(
     """Process a natural language schedule change request."""
     # Get all employees
     try:
-        employees = db.get_employees()
-        formatted_employees = [
-            {
-                "name": emp["name"],
-                "employee_number": emp["employee_number"],
-                "first_line_support_count": emp["first_line_support_count"],
-                "known_absences": emp["known_absences"]
-            }
-            for emp in employees
-        ]
+        employees = await db.get_roster()
+        formatted_employees = [RosterEmployee(**emp).model_dump() for emp in employees]
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching employees: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching employees: {str(e)}")
 
     # Get all schedules
     try:
-        schedules = db.get_schedules()
+        schedules = await db.get_schedules()
         formatted_schedules = [
             {
                 "date": schedule["date"],
@@ -377,13 +1130,17 @@ async def process_schedule_change_request(
             }
             for schedule in schedules
         ]
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching schedules: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching schedules: {str(e)}")
 
     # Get rules
     try:
-        rules = db.get_rules()
+        rules = await db.get_rules()
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching rules: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching rules: {str(e)}")
@@ -402,48 +1159,33 @@ async def process_schedule_change_request(
         logger.error(f"Error in schedule change analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing schedule change: {str(e)}")
 
-    # Apply changes to the schedule if recommended
-    try:
-        if (analysis.recommendation == "approve"):
-            for change in analysis.changes:
-                target_date = change.target_date
-                suggested_replacement = change.suggested_replacement
-
-                # Find the employee number for the suggested replacement
-                replacement_employee = next(
-                    (emp for emp in employees if emp["name"] == suggested_replacement),
-                    None
-                )
-
-                if replacement_employee:
-                    # Check if the schedule exists for that date
-                    existing_schedule = db.get_schedule(target_date)
-
-                    if existing_schedule:
-                        # Update the existing schedule
-                        success = db.update_schedule(
-                            target_date,
-                            replacement_employee["employee_number"]
-                        )
-                        logger.info(
-                            f"Schedule change applied: Date {target_date}, "
-                            f"New employee: {suggested_replacement}, "
-                            f"Success: {success}"
-                        )
-                    else:
-                        # Create a new schedule if it doesn't exist
-                        db.create_schedule(
-                            target_date,
-                            replacement_employee["employee_number"]
-                        )
-                        logger.info(
-                            f"New schedule created: Date {target_date}, "
-                            f"Employee: {suggested_replacement}"
-                        )
-    except Exception as e:
-        logger.error(f"Error applying schedule changes: {str(e)}")
+    # Apply changes to the schedule if recommended, all of them or none
+    applied = False
+    if analysis.recommendation == "approve":
+        plan = {}
+        for change in analysis.changes:
+            # Find the employee number for the suggested replacement
+            replacement_employee = next(
+                (emp for emp in employees if emp["name"] == change.suggested_replacement),
+                None
+            )
+            if replacement_employee:
+                plan[change.target_date] = replacement_employee["employee_number"]
+            else:
+                logger.warning(f"Unknown replacement {change.suggested_replacement} for {change.target_date}, skipping")
+
+        try:
+            if plan:
+                await db.apply_plan(plan)
+                applied = True
+                logger.info(f"Schedule changes applied: {plan}")
+        except ServiceUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"Error applying schedule changes: {str(e)}")
 
     return ScheduleChangeResponse(
         request=request.request_text,
-        analysis=analysis
+        analysis=analysis,
+        applied=applied
     )
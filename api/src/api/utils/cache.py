@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+#### Types ####
+
+@dataclass
+class CacheEntry:
+    value: Any
+    cas: Optional[int]
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+#### Cache ####
+
+class DocumentCache:
+    """
+    Thread-safe LRU cache of documents with a time-to-live.
+
+    Entries keep the CAS they were read with. Once an entry's TTL has passed it is
+    still returned by `get`, so the caller can revalidate it against the server's
+    current CAS (cheap) instead of re-reading the whole document, and `refresh` it.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """Get the entry for a key, fresh or stale, or None. Only fresh entries count as hits."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.is_fresh:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, value: Any, cas: Optional[int] = None) -> None:
+        """Store a document read with the given CAS, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = CacheEntry(value, cas, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: Hashable) -> None:
+        """Mark a stale entry whose CAS still matches the server as fresh again."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = time.monotonic() + self.ttl
+                self.revalidations += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+            }
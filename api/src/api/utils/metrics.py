@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+import threading
+
+#### Types ####
+
+@dataclass
+class StatementStats:
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+#### Registry ####
+
+class QueryMetrics:
+    """Thread-safe per-statement latency and row count counters."""
+
+    def __init__(self):
+        self._stats: dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed_ms: float, rows: int, failed: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, StatementStats())
+            stats.calls += 1
+            stats.errors += int(failed)
+            stats.rows += rows
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
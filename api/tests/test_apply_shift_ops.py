@@ -0,0 +1,87 @@
+import asyncio
+import copy
+
+from couchbase.exceptions import DocumentExistsException, DocumentNotFoundException
+
+from api.clients.scheduling import ClientState, new_shift_doc, shift_key
+from api.clients.scheduling_async import AsyncSchedulingClient
+
+
+class Result:
+    def __init__(self, value=None, exists=None):
+        self.value = value
+        self.exists = exists
+
+
+class FakeShifts:
+    """In-memory stand-in for the shifts collection, with the calls apply_shift_ops makes."""
+
+    def __init__(self, docs):
+        self.docs = {doc["shift_id"]: copy.deepcopy(doc) for doc in docs}
+
+    async def get(self, key):
+        if key not in self.docs:
+            raise DocumentNotFoundException()
+        return Result(value=copy.deepcopy(self.docs[key]))
+
+    async def exists(self, key):
+        return Result(exists=key in self.docs)
+
+    async def insert(self, key, doc):
+        if key in self.docs:
+            raise DocumentExistsException()
+        self.docs[key] = copy.deepcopy(doc)
+        return Result()
+
+    async def remove(self, key):
+        if self.docs.pop(key, None) is None:
+            raise DocumentNotFoundException()
+        return Result()
+
+
+def make_client(docs):
+    client = AsyncSchedulingClient()
+    client.employees = object()
+    client.shifts = FakeShifts(docs)
+    client._is_query_service_ready = True
+    client._state = ClientState.READY
+
+    async def stream(name, query, named_params=None, prepared=True, consistent=False):
+        for doc in list(client.shifts.docs.values()):
+            if doc["employee_number"] == named_params["employee_number"]:
+                yield copy.deepcopy(doc)
+
+    client._stream = stream
+    return client
+
+
+def test_delete_then_create_over_the_same_time():
+    stored = new_shift_doc("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line1", shift_key("2025-03-03", 8, "line1", 0))
+    client = make_client([stored])
+
+    async def run():
+        # Warm the interval index, so a stale entry would still hold the deleted shift
+        await client._employee_intervals("EMP001")
+        return await client.apply_shift_ops([
+            {"op": "delete", "shift_id": stored["shift_id"]},
+            {"op": "create", "employee_number": "EMP001", "start": "2025-03-03 09-00", "end": "2025-03-03 15-00", "type": "packing"},
+        ])
+
+    results, shifts = asyncio.run(run())
+
+    assert [item.success for item in results] == [True, True], [item.error for item in results]
+    assert stored["shift_id"] not in client.shifts.docs
+    assert [shift["employee_number"] for shift in shifts] == ["EMP001"]
+
+
+def test_create_overlapping_a_kept_shift_fails():
+    stored = new_shift_doc("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line1", shift_key("2025-03-03", 8, "line1", 0))
+    client = make_client([stored])
+
+    results, shifts = asyncio.run(client.apply_shift_ops([
+        {"op": "create", "employee_number": "EMP001", "start": "2025-03-03 09-00", "end": "2025-03-03 15-00", "type": "packing"},
+    ]))
+
+    assert not results[0].success
+    assert stored["shift_id"] in results[0].error
+    assert shifts == []
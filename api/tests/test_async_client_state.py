@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from couchbase.exceptions import TimeoutException
+
+from api.clients.scheduling import ClientState, ServiceUnavailableError
+from api.clients.scheduling_async import AsyncSchedulingClient
+
+
+def make_client(up=True):
+    """A client whose connection steps are counted, and fail unless `up`."""
+    client = AsyncSchedulingClient()
+    client.attempts = 0
+
+    async def open_(max_retries=30, initial_delay=1.0, max_delay=10.0):
+        client.attempts += 1
+        await asyncio.sleep(0.01)
+        if client.up:
+            client.scope = object()
+        return client.up
+
+    async def init(max_retries=30, initial_delay=1.0, max_delay=10.0):
+        client.employees = object()
+
+    async def await_up(max_retries=30, initial_delay=1.0, max_delay=10.0):
+        client._is_query_service_ready = True
+
+    client.up = up
+    client._open, client.init, client.await_up = open_, init, await_up
+    return client
+
+
+def test_concurrent_calls_share_one_attempt():
+    client = make_client()
+
+    async def run():
+        await asyncio.gather(*(client._require_query_service() for _ in range(10)))
+
+    asyncio.run(run())
+    assert client.attempts == 1
+    assert client.state is ClientState.READY
+    assert all(client.readiness().values())
+
+
+def test_degraded_client_fails_fast_until_the_retry_interval():
+    client = make_client(up=False)
+
+    async def run():
+        results = await asyncio.gather(*(client._require_collections() for _ in range(10)), return_exceptions=True)
+        assert all(isinstance(result, ServiceUnavailableError) for result in results)
+        assert client.state is ClientState.DEGRADED
+
+        client.up = True
+        with pytest.raises(ServiceUnavailableError):
+            await client._require_collections()
+        assert client.attempts == 1
+
+        client._retry_at = 0.0
+        await client._require_collections()
+
+    asyncio.run(run())
+    assert client.attempts == 2
+    assert client.state is ClientState.READY
+
+
+def test_lost_connection_degrades_a_ready_client():
+    client = make_client()
+
+    async def run():
+        await client._require_query_service()
+        client._record_failure(TimeoutException())
+        assert client.state is ClientState.DEGRADED
+        assert not any(client.readiness().values())
+        # The next call probes the connection again
+        await client._require_query_service()
+
+    asyncio.run(run())
+    assert client.state is ClientState.READY
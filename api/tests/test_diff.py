@@ -0,0 +1,83 @@
+import pytest
+
+from api.clients.scheduling import new_shift_doc, shift_key
+from api.planning.diff import diff_shifts
+
+
+def stored(employee_number, start, end, type, slot=0):
+    date, hour = start[:10], int(start[11:13])
+    return new_shift_doc(employee_number, start, end, type, shift_key(date, hour, type, slot))
+
+
+def proposed(employee_number, start, end, type):
+    return {"employee_number": employee_number, "start": start, "end": end, "type": type}
+
+
+def test_identical_shifts_are_left_alone():
+    old = stored("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line1")
+
+    diff = diff_shifts([old], [proposed("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line1")])
+
+    assert len(diff) == 0
+    assert diff.unchanged == 1
+
+
+def test_same_employee_in_the_slot_is_updated_in_place():
+    old = stored("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line1")
+
+    diff = diff_shifts([old], [proposed("EMP001", "2025-03-03 08-00", "2025-03-03 12-00", "line1")])
+
+    assert diff.creates == [] and diff.deletes == []
+    [(before, after)] = diff.updates
+    assert before["shift_id"] == after["shift_id"] == old["shift_id"]
+    assert after["end"] == "2025-03-03 12-00"
+    assert after["end_minute"] - after["start_minute"] == 4 * 60
+
+
+def test_pairing_prefers_the_same_employee_within_a_slot():
+    first = stored("EMP001", "2025-03-03 09-00", "2025-03-03 17-00", "line1", slot=0)
+    second = stored("EMP002", "2025-03-03 09-00", "2025-03-03 17-00", "line1", slot=1)
+
+    diff = diff_shifts([first, second], [
+        proposed("EMP002", "2025-03-03 09-00", "2025-03-03 13-00", "line1"),
+        proposed("EMP003", "2025-03-03 09-00", "2025-03-03 17-00", "line1"),
+    ])
+
+    updates = {before["shift_id"]: after for before, after in diff.updates}
+    assert updates[second["shift_id"]]["employee_number"] == "EMP002"
+    assert updates[first["shift_id"]]["employee_number"] == "EMP003"
+    # A reassigned shift doesn't keep the previous employee's score
+    assert updates[first["shift_id"]]["score"] == -1
+    assert diff.creates == [] and diff.deletes == []
+
+
+def test_shifts_are_never_moved_to_another_slot():
+    old = stored("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line1")
+
+    diff = diff_shifts([old], [proposed("EMP001", "2025-03-03 08-00", "2025-03-03 16-00", "line2")])
+
+    assert diff.delete_ids() == [old["shift_id"]]
+    assert [doc["shift_id"] for doc in diff.creates] == [shift_key("2025-03-03", 8, "line2", 0)]
+    assert diff.updates == []
+
+
+def test_creates_take_free_slots_after_the_stored_ones():
+    old = stored("EMP001", "2025-03-03 10-00", "2025-03-03 18-00", "packing", slot=0)
+
+    diff = diff_shifts([old], [
+        proposed("EMP001", "2025-03-03 10-00", "2025-03-03 18-00", "packing"),
+        proposed("EMP002", "2025-03-03 10-00", "2025-03-03 18-00", "packing"),
+    ])
+
+    assert diff.unchanged == 1
+    assert [doc["shift_id"] for doc in diff.creates] == [shift_key("2025-03-03", 10, "packing", 1)]
+
+
+def test_more_shifts_than_slots_is_an_error():
+    with pytest.raises(ValueError):
+        diff_shifts([], [proposed(f"EMP00{i}", "2025-03-03 10-00", "2025-03-03 18-00", "packing") for i in range(3)])
+
+
+def test_invalid_times_are_an_error():
+    with pytest.raises(ValueError):
+        diff_shifts([], [proposed("EMP001", "2025-03-03 10-00", "2025-03-03 09-00", "packing")])
@@ -0,0 +1,75 @@
+from api.clients.scheduling import shift_minutes
+from api.planning.intervals import EmployeeIntervals, IntervalIndex, shift_interval
+
+
+def interval(start, end, shift_id):
+    return shift_minutes(start), shift_minutes(end), shift_id
+
+
+def test_shift_interval_prefers_minute_fields_and_falls_back_to_times():
+    assert shift_interval({"shift_id": "a", "start_minute": 60, "end_minute": 120, "start": "x", "end": "y"}) == (60, 120, "a")
+    assert shift_interval({"shift_id": "b", "start": "2025-03-03 08-00", "end": "2025-03-03 16-00"}) == \
+        interval("2025-03-03 08-00", "2025-03-03 16-00", "b")
+    assert shift_interval({"shift_id": "c", "start": "2025-03-03 16-00", "end": "2025-03-03 08-00"}) is None
+    assert shift_interval({"shift_id": "d", "start": "bad", "end": "2025-03-03 08-00"}) is None
+
+
+def test_overlapping_finds_shifts_with_a_different_start():
+    intervals = EmployeeIntervals([interval("2025-03-03 06-00", "2025-03-03 14-00", "early")])
+
+    start, end, _ = interval("2025-03-03 08-00", "2025-03-03 16-00", "new")
+    assert [item[2] for item in intervals.overlapping(start, end)] == ["early"]
+    assert intervals.overlapping(start, end, ignore="early") == []
+
+
+def test_touching_shifts_do_not_overlap():
+    intervals = EmployeeIntervals([interval("2025-03-03 08-00", "2025-03-03 12-00", "morning")])
+
+    start, end, _ = interval("2025-03-03 12-00", "2025-03-03 16-00", "afternoon")
+    assert intervals.overlapping(start, end) == []
+
+
+def test_long_shift_starting_well_before_is_found():
+    # The lookup window reaches back by the longest interval, not just the latest start
+    intervals = EmployeeIntervals([
+        interval("2025-03-02 20-00", "2025-03-03 12-00", "night"),
+        interval("2025-03-03 06-00", "2025-03-03 07-00", "short"),
+    ])
+
+    start, end, _ = interval("2025-03-03 09-00", "2025-03-03 10-00", "new")
+    assert [item[2] for item in intervals.overlapping(start, end)] == ["night"]
+
+
+def test_add_replaces_and_remove_drops_a_shift():
+    intervals = EmployeeIntervals()
+    intervals.add(*interval("2025-03-03 08-00", "2025-03-03 16-00", "a"))
+    intervals.add(*interval("2025-03-04 08-00", "2025-03-04 16-00", "a"))
+    assert [item[2] for item in intervals] == ["a"]
+
+    start, end, _ = interval("2025-03-03 09-00", "2025-03-03 10-00", "new")
+    assert intervals.overlapping(start, end) == []
+
+    intervals.remove("a")
+    assert len(intervals) == 0
+
+
+def test_conflicts_lists_each_overlapping_pair():
+    intervals = EmployeeIntervals([
+        interval("2025-03-03 08-00", "2025-03-03 16-00", "a"),
+        interval("2025-03-03 10-00", "2025-03-03 12-00", "b"),
+        interval("2025-03-03 15-00", "2025-03-03 18-00", "c"),
+        interval("2025-03-03 18-00", "2025-03-03 20-00", "d"),
+    ])
+
+    assert {(first[2], second[2]) for first, second in intervals.conflicts()} == {("a", "b"), ("a", "c")}
+
+
+def test_index_discards_a_shift_from_its_employee():
+    index = IntervalIndex()
+    index.put("EMP001", EmployeeIntervals([interval("2025-03-03 08-00", "2025-03-03 16-00", "a")]))
+
+    index.discard("a", "EMP001")
+    assert len(index.get("EMP001")) == 0
+
+    index.invalidate("EMP001")
+    assert index.get("EMP001") is None